@@ -0,0 +1,44 @@
+"""
+Throughput of the csv parsers
+
+Reads a generated csv file of trades with each parser of moon.model.trade_csv.CSV_PARSERS and prints the number of rows
+parsed by second. rows is the row by row reading of csv.reader (the reader used before the parsers), vectorized converts
+the file column by column.
+
+    python -m benchmarks.bench_csv_parsers [nb_trades] [chunk_size]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_db_profiles import write_csv_file
+from moon.model.trade import CSV_CHUNK_SIZE
+from moon.model.trade_csv import CSV_PARSERS, iter_csv_file
+
+
+def bench_parser(parser: str, csv_file: str, chunk_size: int) -> float:
+    """
+    :return: the duration of the read of the file in seconds (best of 3)
+    """
+    durations = []
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in iter_csv_file(csv_file, chunk_size, parser):
+            pass
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main(nb_trades: int = 200000, chunk_size: int = CSV_CHUNK_SIZE) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = os.path.join(tmp_dir, 'trades.csv')
+        write_csv_file(csv_file, nb_trades)
+        print(f"{nb_trades} trades, chunks of {chunk_size} trades")
+        for parser in CSV_PARSERS:
+            duration = bench_parser(parser, csv_file, chunk_size)
+            print(f"{parser:10} {duration:8.2f} s {nb_trades / duration:10.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
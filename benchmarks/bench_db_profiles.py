@@ -0,0 +1,79 @@
+"""
+Import throughput of the db profiles
+
+Imports a generated csv file of trades in a new file db for each profile of moon.db.db.DB_PROFILES and prints the
+number of trades imported by second, in two modes :
+- transaction : the trades are saved by chunks in one transaction (as Wallet.import_trades_from_csv_file), the
+  synchronous and journal_mode settings only apply to the final commit
+- chunks : each chunk is committed (Trade.import_trades outside of a transaction), as many commits as chunks
+
+    python -m benchmarks.bench_db_profiles [nb_trades] [chunk_size]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from moon.db.db import ConnectionDB, DB_PROFILES
+from moon.model.trade import Trade
+from moon.model.wallet import Wallet
+
+PAIRS = ['BTCEUR', 'ETHEUR', 'BNBEUR', 'ADAEUR', 'ETHBTC', 'BNBBTC']
+MODES = ('transaction', 'chunks')
+
+
+def write_csv_file(filename: str, nb_trades: int) -> None:
+    rnd = random.Random(1)
+    date = datetime(2021, 1, 1)
+    with open(filename, 'w') as f:
+        for _ in range(nb_trades):
+            date += timedelta(seconds=rnd.randint(1, 3600))
+            price = round(rnd.uniform(1, 1000), 2)
+            qty = round(rnd.uniform(0.01, 10), 4)
+            f.write(f"{date:%Y-%m-%d %H:%M:%S};{rnd.choice(PAIRS)};{rnd.choice(['BUY', 'SELL'])};{price};{qty};"
+                    f"{round(price * qty, 6)};0.001;BNB\n")
+
+
+def import_trades(id_wallet: int, csv_file: str, chunk_size: int) -> None:
+    seen: dict[str, int] = {}
+    for trades in Trade.iter_trades_from_csv_file(csv_file, chunk_size):
+        Trade.import_trades(id_wallet, trades, seen)
+
+
+def bench_profile(name: str, mode: str, csv_file: str, chunk_size: int, tmp_dir: str) -> float:
+    """
+    :param mode: transaction or chunks
+    :return: the duration of the import in seconds
+    """
+    ConnectionDB.set_db(os.path.join(tmp_dir, f"{name}-{mode}.db"), DB_PROFILES[name])
+    ConnectionDB.create_schema_if_empty()
+    wallet = Wallet(None, name)
+    wallet.save()
+    ConnectionDB.commit()
+    start = time.perf_counter()
+    if mode == 'transaction':
+        with ConnectionDB.transaction():
+            import_trades(wallet.id, csv_file, chunk_size)  # type: ignore
+    else:
+        import_trades(wallet.id, csv_file, chunk_size)  # type: ignore
+    ConnectionDB.commit()
+    return time.perf_counter() - start
+
+
+def main(nb_trades: int = 50000, chunk_size: int = 500) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = os.path.join(tmp_dir, 'trades.csv')
+        write_csv_file(csv_file, nb_trades)
+        print(f"{nb_trades} trades, chunks of {chunk_size} trades")
+        for name, profile in DB_PROFILES.items():
+            print(f"{name:10} {profile}")
+            for mode in MODES:
+                duration = bench_profile(name, mode, csv_file, chunk_size, tmp_dir)
+                print(f"{'':10} {mode:12} {duration:8.2f} s {nb_trades / duration:10.0f} trades/s")
+        ConnectionDB.close_all()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
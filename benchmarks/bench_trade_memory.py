@@ -0,0 +1,58 @@
+"""
+Memory of the trades : a list of Trade compared to a TradeBatch
+
+Reads a generated csv file of trades as a list of Trade and as a TradeBatch and prints the memory allocated (tracemalloc)
+by trade for each.
+
+    python -m benchmarks.bench_trade_memory [nb_trades]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from benchmarks.bench_db_profiles import write_csv_file
+from moon.model.trade import Trade, TradeBatch
+
+
+def read_trades(csv_file: str) -> list[Trade]:
+    return Trade.get_trades_from_csv_file(csv_file)
+
+
+def read_batch(csv_file: str) -> TradeBatch:
+    batch = TradeBatch()
+    for trades in TradeBatch.iter_from_csv_file(csv_file):
+        batch.extend(trades)
+    return batch
+
+
+def bench(read: Callable[[str], Any], csv_file: str) -> tuple[int, float]:
+    """
+    :return: the memory (bytes) allocated by the trades read and the duration of the read in seconds
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    trades = read(csv_file)
+    duration = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del trades
+    return size, duration
+
+
+def main(nb_trades: int = 100000) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = os.path.join(tmp_dir, 'trades.csv')
+        write_csv_file(csv_file, nb_trades)
+        print(f"{nb_trades} trades")
+        for name, read in (('list[Trade]', read_trades), ('TradeBatch', read_batch)):
+            size, duration = bench(read, csv_file)
+            print(f"{name:12} {size / nb_trades:8.0f} bytes/trade {duration:8.2f} s")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -1,7 +1,23 @@
 import json
 import os
+from typing import Any, Union
 
-conf = json.load(open(os.path.join(os.path.dirname(__file__), '..', 'moon_config.json')))
+MOON_CONFIG_FILE = os.path.join(os.path.dirname(__file__), '..', 'moon_config.json')
+
+
+def load(filename: str = MOON_CONFIG_FILE) -> dict[str, Any]:
+    """
+    Load the config file
+    :return: the config, empty if the file doesn't exist
+    """
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+conf = load()
 
 
 def mail_user() -> str:
@@ -38,3 +54,10 @@ def api_key() -> str:
 
 def api_secret() -> str:
     return str(conf['api-secret'])
+
+
+def db_profile() -> Union[str, dict[str, Any], None]:
+    """
+    Profile of the db connections : a profile name or a dict of settings, see moon.db.db.DbProfile.from_config
+    """
+    return conf.get('db-profile')
@@ -0,0 +1,66 @@
+import threading
+from typing import Any, Callable, Optional
+
+from moon.exceptions.exceptions import BusinessError
+
+
+class TaskCancelled(Exception):
+    """
+    Raised in a task when it has been cancelled
+    """
+
+    def __init__(self):
+        super().__init__("La tâche a été annulée.")
+
+
+def error_message(error: Exception) -> str:
+    """
+    Message of the error of a task shown to the user : the labels of the errors of a BusinessError (its str is empty),
+    str(error) otherwise
+    """
+    if isinstance(error, BusinessError) and error.errors:
+        return "\n".join(e.label for e in error.errors)
+    return str(error) or type(error).__name__
+
+
+class TaskProgress:
+    """
+    Progress and cancellation of a task run in a worker thread : the task reports its progress (report), the UI thread
+    cancels it (cancel), the task then stops at its next report with TaskCancelled (its transaction is rolled back)
+    """
+
+    def __init__(self, on_progress: Optional[Callable[[int], Any]] = None):
+        """
+        TaskProgress constructor
+        :param on_progress: called (in the worker thread) with the number of items done at each report
+        """
+        self.on_progress = on_progress
+        self.cancelled = threading.Event()
+        self.done = 0
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled.is_set()
+
+    def check(self) -> None:
+        """
+        :raises TaskCancelled: if the task has been cancelled
+        """
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+
+    def report(self, done: int) -> None:
+        """
+        Report the number of items done
+        :raises TaskCancelled: if the task has been cancelled
+        """
+        self.check()
+        self.done = done
+        if self.on_progress is not None:
+            self.on_progress(done)
+
+    def __call__(self, done: int) -> None:
+        # a TaskProgress is a progress callback of the imports
+        self.report(done)
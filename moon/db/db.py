@@ -1,33 +1,430 @@
+import itertools
+import os
+import queue
 import sqlite3
-from typing import Optional
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Iterator, Optional, Union
+
+from moon.db.migrations import migrate
+
+MEMORY_DB = ':memory:'
+
+SQL_SELECT_DB_IDENTITY = "select uuid from db_identity"
+
+# schema of the last version, see moon.db.migrations
+DB_SQL_FILE = os.path.join(os.path.dirname(__file__), 'db.sql')
+
+# max number of idle reader connections kept in the pool
+READER_POOL_SIZE = 4
+
+# time (seconds) a connection waits for a lock held by another connection
+BUSY_TIMEOUT = 30.0
+
+# the amounts (Decimal) are stored as exact text in the columns declared DECIMAL_TEXT (TEXT affinity) and read back as
+# Decimal by the connections, without conversion in the models
+DECIMAL_TYPE = 'DECIMAL_TEXT'
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter(DECIMAL_TYPE, lambda value: Decimal(value.decode()))
+
+# the dates are stored as epoch milliseconds (UTC) in the columns declared EPOCH_MS, so that the date filters compare
+# integers, and read back as naive datetime (UTC)
+DATE_TYPE = 'EPOCH_MS'
+EPOCH = datetime(1970, 1, 1)
+MILLISECOND = timedelta(milliseconds=1)
+
+
+def to_epoch_ms(date: datetime) -> int:
+    """
+    Epoch milliseconds of a date, a naive date is UTC
+    """
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return (date - EPOCH) // MILLISECOND
+
+
+def from_epoch_ms(epoch_ms: int) -> datetime:
+    """
+    Naive date (UTC) of epoch milliseconds
+    """
+    return EPOCH + epoch_ms * MILLISECOND
+
+
+def to_datetime(date: Union[datetime, str]) -> datetime:
+    """
+    Date of a datetime or of an ISO 8601 string (as 2021-05-03 14:00:00)
+    """
+    return datetime.fromisoformat(date) if isinstance(date, str) else date
+
+
+sqlite3.register_adapter(datetime, to_epoch_ms)
+sqlite3.register_converter(DATE_TYPE, lambda value: from_epoch_ms(int(value)))
+
+JOURNAL_MODES = ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')
+SYNCHRONOUS_LEVELS = ('off', 'normal', 'full', 'extra')
+TEMP_STORES = ('default', 'file', 'memory')
+
+
+@dataclass(frozen=True)
+class DbProfile:
+    """
+    Settings (pragmas) of the connections to the db
+    journal_mode : the readers of the pool only read the last committed data without waiting for the writers in wal mode
+    synchronous : normal is durable in wal mode except for the last transactions on a power loss, off doesn't wait for
+    the disk at all (fastest, a crash of the os can corrupt the db)
+    cache_size : in pages if positive, in KiB if negative (as the cache_size pragma)
+    mmap_size : max size in bytes of the db file read with memory mapped io, 0 to disable it
+    temp_store : where the temporary tables and indexes are stored
+    """
+    journal_mode: str = 'wal'
+    synchronous: str = 'normal'
+    cache_size: int = -64000
+    mmap_size: int = 256 * 1024 * 1024
+    temp_store: str = 'memory'
+
+    def __post_init__(self):
+        for name, values in (('journal_mode', JOURNAL_MODES), ('synchronous', SYNCHRONOUS_LEVELS),
+                             ('temp_store', TEMP_STORES)):
+            if getattr(self, name) not in values:
+                raise ValueError(f"{name} {getattr(self, name)!r} invalide, valeurs possibles : {', '.join(values)}")
+        for name in ('cache_size', 'mmap_size'):
+            if type(getattr(self, name)) is not int:
+                raise ValueError(f"{name} {getattr(self, name)!r} invalide, un entier est attendu")
+
+    @staticmethod
+    def from_config(config: Union[str, dict[str, Any], None]) -> 'DbProfile':
+        """
+        Profile of the moon config
+        :param config: a profile name of DB_PROFILES, or {'profile': name, 'synchronous': 'full', ...} to override the
+        settings of a profile (the default profile if there is no name), the keys can use - instead of _
+        :return: the profile
+        """
+        if not config:
+            return DB_PROFILES['default']
+        if isinstance(config, str):
+            config = {'profile': config}
+        config = {key.replace('-', '_'): value for key, value in config.items()}
+        name = config.pop('profile', 'default')
+        if name not in DB_PROFILES:
+            raise ValueError(f"Profil de db {name!r} inconnu, profils possibles : {', '.join(DB_PROFILES)}")
+        unknown = set(config) - {field.name for field in fields(DbProfile)}
+        if unknown:
+            raise ValueError(f"Paramètres de profil de db inconnus : {', '.join(sorted(unknown))}")
+        return replace(DB_PROFILES[name], **config)
+
+    def pragmas(self, memory: bool = False) -> list[str]:
+        """
+        The pragmas of the profile (the journal mode of a memory db can't be changed)
+        """
+        pragmas = [] if memory else [f"pragma journal_mode = {self.journal_mode}"]
+        return pragmas + [f"pragma synchronous = {self.synchronous}",
+                          f"pragma cache_size = {self.cache_size}",
+                          f"pragma mmap_size = {self.mmap_size}",
+                          f"pragma temp_store = {self.temp_store}"]
+
+
+DB_PROFILES = {
+    # every commit is on disk before returning
+    'durable': DbProfile(synchronous='full'),
+    'default': DbProfile(),
+    # no wait for the disk, bigger cache : for the bulk imports of a db which can be rebuilt
+    'fast': DbProfile(synchronous='off', cache_size=-256000),
+}
+
+
+class Transaction:
+    """
+    Scope of a transaction (or of a savepoint nested in a transaction) opened by ConnectionDB.transaction
+    The models report the rows they write with ConnectionDB.count_writes : rows_written counts them by table, the rows
+    of a savepoint released are added to its parent, the rows of a savepoint rolled back are not counted
+    """
+
+    def __init__(self, conn: sqlite3.Connection, savepoint: Optional[str] = None,
+                 parent: Optional['Transaction'] = None):
+        self.conn = conn
+        self.savepoint = savepoint
+        self.parent = parent
+        self.rows_written: Counter[str] = Counter()
+
+    def __repr__(self):
+        return f"Transaction(savepoint={self.savepoint!r}, rows_written={dict(self.rows_written)!r})"
 
 
 class ConnectionDB:
+    """
+    Connections to the db
+    The connections are set by the profile of the db (journal mode, synchronous...), see DbProfile.
+    Each thread has its own connection (get_connection), used for the writes and the reads of the thread.
+    The reads which must not wait for the writes of the other threads (ie the UI while an import runs in background)
+    can borrow a connection of the reader pool with the reader() context manager : in WAL mode the readers see the
+    last committed data while a writer is writing. The transaction() context manager serializes the writes of the
+    threads and commits them at once, a transaction() opened in a transaction is a savepoint.
+    A :memory: db is opened as a shared cache memory db so that all the connections (threads) use the same db, it lives
+    until set_db or close_all.
+    """
     db: str = ''
-    conn: Optional[sqlite3.Connection] = None
-    cur: Optional[sqlite3.Cursor] = None
+    profile: DbProfile = DB_PROFILES['default']
+    _uri: str = ''
+    _generation = 0
+    _migrated_generation = -1
+    _memory_ids = itertools.count()
+    _lock = threading.Lock()
+    _migrate_lock = threading.Lock()
+    _write_lock = threading.RLock()
+    _connections: list[sqlite3.Connection] = []
+    _readers: queue.SimpleQueue = queue.SimpleQueue()
+    _local = threading.local()
 
     @staticmethod
-    def set_db(db: str):
-        ConnectionDB.db = db
+    def set_db(db: str, profile: Optional[DbProfile] = None):
+        """
+        Set the db used, the connections to the previous db are closed
+        :param db: db filename or :memory:
+        :param profile: settings of the connections, the default profile if None
+        """
+        ConnectionDB.close_all()
+        with ConnectionDB._lock:
+            ConnectionDB.db = db
+            ConnectionDB.profile = profile if profile is not None else DB_PROFILES['default']
+            if db == MEMORY_DB:
+                ConnectionDB._uri = f"file:moon-memory-{next(ConnectionDB._memory_ids)}?mode=memory&cache=shared"
+            else:
+                ConnectionDB._uri = ''
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        if ConnectionDB._uri:
+            conn = sqlite3.connect(ConnectionDB._uri, uri=True, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        else:
+            conn = sqlite3.connect(ConnectionDB.db, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        for pragma in ConnectionDB.profile.pragmas(memory=bool(ConnectionDB._uri)):
+            conn.execute(pragma)
+        with ConnectionDB._lock:
+            ConnectionDB._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _get_local() -> threading.local:
+        local = ConnectionDB._local
+        if getattr(local, 'generation', None) != ConnectionDB._generation:
+            local.conn = None
+            local.readers = []
+            local.transactions = []
+            local.after_commit = []
+            local.generation = ConnectionDB._generation
+        return local
+
+    @staticmethod
+    def _get_thread_connection() -> sqlite3.Connection:
+        local = ConnectionDB._get_local()
+        if local.conn is None:
+            conn = ConnectionDB._connect()
+            # the db is migrated by the first connection
+            with ConnectionDB._migrate_lock:
+                if ConnectionDB._migrated_generation != local.generation:
+                    migrate(conn)
+                    ConnectionDB._migrated_generation = local.generation
+            local.conn = conn
+        return local.conn
 
     @staticmethod
     def get_connection() -> sqlite3.Connection:
-        if ConnectionDB.conn is None:
-            ConnectionDB.conn = sqlite3.connect(ConnectionDB.db)
-            ConnectionDB.cur = ConnectionDB.conn.cursor()
-        return ConnectionDB.conn
+        """
+        Connection of the current thread : the reader connection borrowed in a reader() block, the connection of the
+        thread otherwise
+        """
+        readers = ConnectionDB._get_local().readers
+        return readers[-1] if readers else ConnectionDB._get_thread_connection()
 
     @staticmethod
     def get_cursor() -> sqlite3.Cursor:
-        if ConnectionDB.cur is None:
-            ConnectionDB.get_connection()
-        return ConnectionDB.cur # type: ignore
+        """
+        A new cursor of the connection of the current thread
+        """
+        return ConnectionDB.get_connection().cursor()
+
+    @staticmethod
+    @contextmanager
+    def reader() -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a read only connection of the pool, used by the models in the block
+        """
+        local = ConnectionDB._get_local()
+        generation = local.generation
+        if ConnectionDB._migrated_generation != generation:
+            ConnectionDB._get_thread_connection()
+        try:
+            conn = ConnectionDB._readers.get_nowait()
+        except queue.Empty:
+            conn = ConnectionDB._connect()
+            conn.execute("pragma query_only = 1")
+        local.readers.append(conn)
+        try:
+            yield conn
+        finally:
+            local.readers.pop()
+            if conn.in_transaction:
+                conn.rollback()
+            if generation == ConnectionDB._generation and ConnectionDB._readers.qsize() < READER_POOL_SIZE:
+                ConnectionDB._readers.put(conn)
+            else:
+                ConnectionDB._close(conn)
+
+    @staticmethod
+    @contextmanager
+    def writer() -> Iterator[sqlite3.Connection]:
+        """
+        Write with the connection of the thread in a transaction, see transaction()
+        """
+        with ConnectionDB.transaction() as transaction:
+            yield transaction.conn
+
+    @staticmethod
+    @contextmanager
+    def transaction(name: Optional[str] = None) -> Iterator[Transaction]:
+        """
+        Unit of work : the writes of the block (with the connection of the thread) are committed at once at the end of
+        the block or rolled back if an exception is raised, ConnectionDB.commit() is deferred to the end of the block.
+        The transactions of the threads are serialized.
+        A transaction opened in the block is a savepoint : an exception raised in it only rolls back its writes, so that
+        they can be retried without rolling back the whole transaction
+        :param name: name of the savepoint, generated if None
+        :return: the transaction, with the rows written by table
+        """
+        local = ConnectionDB._get_local()
+        if local.transactions:
+            with ConnectionDB.savepoint(name) as transaction:
+                yield transaction
+            return
+        with ConnectionDB._write_lock:
+            conn = ConnectionDB._get_thread_connection()
+            if not conn.in_transaction:
+                conn.execute("begin")
+            transaction = Transaction(conn)
+            local.transactions.append(transaction)
+            try:
+                yield transaction
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            finally:
+                local.transactions.pop()
+                ConnectionDB._run_after_commit(local)
+
+    @staticmethod
+    @contextmanager
+    def savepoint(name: Optional[str] = None) -> Iterator[Transaction]:
+        """
+        Savepoint : the writes of the block are rolled back if an exception is raised, they are committed by the
+        transaction (or by the commit) of the caller
+        :param name: name of the savepoint, generated if None
+        :return: the savepoint, with the rows written by table
+        """
+        local = ConnectionDB._get_local()
+        conn = ConnectionDB.get_connection()
+        parent = local.transactions[-1] if local.transactions else None
+        transaction = Transaction(conn, name or f"savepoint_{len(local.transactions)}", parent)
+        conn.execute(f'savepoint "{transaction.savepoint}"')
+        local.transactions.append(transaction)
+        try:
+            yield transaction
+        except BaseException:
+            conn.execute(f'rollback to "{transaction.savepoint}"')
+            raise
+        else:
+            if parent is not None:
+                parent.rows_written.update(transaction.rows_written)
+        finally:
+            local.transactions.pop()
+            conn.execute(f'release "{transaction.savepoint}"')
+
+    @staticmethod
+    def count_writes(table: str, nb_rows: int) -> None:
+        """
+        Count rows written in the table by the current transaction (no effect outside a transaction)
+        """
+        transactions = ConnectionDB._get_local().transactions
+        if transactions and nb_rows > 0:
+            transactions[-1].rows_written[table] += nb_rows
+
+    @staticmethod
+    def create_schema_if_empty() -> bool:
+        """
+        Create the schema (db.sql) if the db has no schema (new db), a db with a schema is migrated at connection
+        :return: True if the schema has been created
+        """
+        conn = ConnectionDB.get_connection()
+        if conn.execute("select 1 from sqlite_master where type = 'table' and name = 'trade'").fetchone() is not None:
+            return False
+        with open(DB_SQL_FILE, 'r') as f:
+            conn.executescript(f.read())
+        return True
+
+    @staticmethod
+    def get_identity() -> str:
+        """
+        Identity of the db : a random uuid created with the schema, it changes if the db file is replaced by another db
+        """
+        return str(ConnectionDB.get_connection().execute(SQL_SELECT_DB_IDENTITY).fetchone()[0])
 
     @staticmethod
     def commit():
-        ConnectionDB.conn.commit()
+        """
+        Commit the writes of the thread, deferred to the end of the transaction in a transaction() block
+        """
+        local = ConnectionDB._get_local()
+        if not local.transactions:
+            ConnectionDB.get_connection().commit()
+            ConnectionDB._run_after_commit(local)
+
+    @staticmethod
+    def after_commit(callback: Callable[[], Any]) -> None:
+        """
+        Call callback once the writes of the thread are committed or rolled back : at the end of the transaction()
+        block, at the next commit() outside a transaction
+        """
+        ConnectionDB._get_local().after_commit.append(callback)
+
+    @staticmethod
+    def _run_after_commit(local: threading.local) -> None:
+        callbacks, local.after_commit = local.after_commit, []
+        for callback in callbacks:
+            callback()
+
+    @staticmethod
+    def _close(conn: sqlite3.Connection) -> None:
+        with ConnectionDB._lock:
+            if conn in ConnectionDB._connections:
+                ConnectionDB._connections.remove(conn)
+        conn.close()
 
     @staticmethod
     def close():
-        ConnectionDB.conn.close()
+        """
+        Close the connection of the current thread
+        """
+        local = ConnectionDB._get_local()
+        if local.conn is not None:
+            ConnectionDB._close(local.conn)
+            local.conn = None
+
+    @staticmethod
+    def close_all():
+        """
+        Close all the connections (of all the threads and of the reader pool)
+        """
+        with ConnectionDB._lock:
+            connections = ConnectionDB._connections
+            ConnectionDB._connections = []
+            ConnectionDB._readers = queue.SimpleQueue()
+            ConnectionDB._generation += 1
+        for conn in connections:
+            conn.close()
@@ -7,8 +7,6 @@ CREATE TABLE wallet(
     description TEXT
 );
 
-CREATE INDEX wallet_id_index ON wallet (id ASC);
-
 -- trade
 
 DROP TABLE IF EXISTS trade;
@@ -18,17 +16,20 @@ CREATE TABLE trade(
     id_wallet INTEGER REFERENCES wallet (id),
     pair TEXT,
     type TEXT,
-    qty NUMERIC,
-    price NUMERIC,
-    total NUMERIC,
-    date DATETIME,
-    fee NUMERIC,
+    qty DECIMAL_TEXT,
+    price DECIMAL_TEXT,
+    total DECIMAL_TEXT,
+    date EPOCH_MS,
+    fee DECIMAL_TEXT,
     fee_asset TEXT,
     origin_id TEXT,
-    origin TEXT
+    origin TEXT,
+    fingerprint TEXT
 );
 
-CREATE INDEX trade_id_index ON trade (id ASC);
+CREATE INDEX trade_fingerprint_index ON trade (id_wallet, fingerprint);
+CREATE INDEX trade_wallet_date_index ON trade (id_wallet, date);
+CREATE INDEX trade_wallet_pair_date_index ON trade (id_wallet, pair, date);
 
 -- asset_wallet
 
@@ -38,12 +39,12 @@ CREATE TABLE asset_wallet(
     id INTEGER PRIMARY KEY,
     id_wallet INTEGER REFERENCES wallet (id),
     asset TEXT,
-    qty NUMERIC,
-    pru NUMERIC,
+    qty DECIMAL_TEXT,
+    pru DECIMAL_TEXT,
     currency TEXT
 );
 
-CREATE INDEX asset_wallet_id_index ON asset_wallet (id ASC);
+CREATE UNIQUE INDEX asset_wallet_wallet_asset_index ON asset_wallet (id_wallet, asset);
 
 
 -- pnl
@@ -53,13 +54,14 @@ DROP TABLE IF EXISTS pnl;
 CREATE TABLE pnl(
     id INTEGER PRIMARY KEY,
     id_wallet INTEGER REFERENCES wallet (id),
-    date DATETIME,
+    date EPOCH_MS,
     asset TEXT,
-    value NUMERIC,
+    value DECIMAL_TEXT,
     currency TEXT
 );
 
-CREATE INDEX pnl_id_index ON pnl (id ASC);
+CREATE INDEX pnl_wallet_date_index ON pnl (id_wallet, date);
+CREATE INDEX pnl_wallet_asset_date_index ON pnl (id_wallet, asset, date);
 
 
 -- total_pnl
@@ -70,11 +72,50 @@ CREATE TABLE pnl_total(
     id INTEGER PRIMARY KEY,
     id_wallet INTEGER REFERENCES wallet (id),
     asset TEXT,
-    value NUMERIC,
+    value DECIMAL_TEXT,
     currency TEXT
 );
 
-CREATE INDEX pnl_total_id_index ON pnl_total (id ASC);
+CREATE INDEX pnl_total_wallet_asset_index ON pnl_total (id_wallet, asset, currency);
+
+
+-- checkpoint
+
+DROP TABLE IF EXISTS checkpoint;
+
+CREATE TABLE checkpoint(
+    id_wallet INTEGER PRIMARY KEY REFERENCES wallet (id),
+    last_trade_date EPOCH_MS,
+    last_trade_id INTEGER,
+    assets TEXT,
+    pnl_total TEXT
+);
+
+
+-- trade_generation
+
+DROP TABLE IF EXISTS trade_generation;
+
+CREATE TABLE trade_generation(
+    id_wallet INTEGER PRIMARY KEY REFERENCES wallet (id),
+    generation INTEGER
+);
+
+
+-- db_identity : random uuid of the db created with the schema
+
+DROP TABLE IF EXISTS db_identity;
+
+CREATE TABLE db_identity(
+    uuid TEXT
+);
+
+INSERT INTO db_identity(uuid) VALUES (lower(hex(randomblob(16))));
+
+
+-- schema version, see moon.db.migrations
+
+PRAGMA user_version = 8;
 
 
 --sqlite3
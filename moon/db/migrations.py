@@ -0,0 +1,194 @@
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Union
+
+# A migration step is either a SQL statement or a function applied on the connection
+MigrationStep = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    steps: list[MigrationStep] = field(default_factory=list)
+
+
+def _backfill_trade_fingerprints(conn: sqlite3.Connection) -> None:
+    """
+    Compute the fingerprint of the existing trades
+    The trades of a wallet with the same fingerprint are kept : identical fills are legitimate trades
+    """
+    from moon.model.trade import Trade, TradeOrigin, TradeType
+
+    rows = conn.execute("select id, pair, type, qty, price, total, date, fee, fee_asset, origin_id, origin "
+                        "from trade where fingerprint is null order by id").fetchall()
+    updated_trades = []
+    for id_, pair, type_, qty, price, total, date, fee, fee_asset, origin_id, origin in rows:
+        fingerprint = Trade(id_, pair, TradeType(type_), Decimal(str(qty)), Decimal(str(price)), Decimal(str(total)),
+                            date, Decimal(str(fee)), fee_asset, origin_id, TradeOrigin(origin)).get_fingerprint()
+        updated_trades.append((fingerprint, id_))
+    conn.executemany("update trade set fingerprint = ? where id = ?", updated_trades)
+
+
+def _amount_as_text(value: Any) -> str:
+    """
+    Amount stored as float as exact text (as it was read by the models : Decimal(str(float)))
+    """
+    return str(Decimal(str(value)))
+
+
+def _date_as_epoch_ms(value: Any) -> int:
+    """
+    Date stored as text (as 2021-05-03 14:00:00) as epoch milliseconds
+    """
+    from moon.db.db import to_epoch_ms
+
+    return to_epoch_ms(datetime.fromisoformat(value))
+
+
+def _copy_rows(table: str, old_table: str, converters: dict[int, Callable[[Any], Any]]) -> MigrationStep:
+    """
+    Copy the rows of the old table (the table renamed) in the new table
+    :param table: the new table
+    :param old_table: the old table
+    :param converters: the converters of the values (not null) of the columns by column index
+    """
+    def copy(conn: sqlite3.Connection) -> None:
+        cur = conn.execute(f"select * from {old_table} order by rowid")
+        placeholders = ', '.join('?' * len(cur.description))
+        conn.executemany(f"insert into {table} values ({placeholders})",
+                         (tuple(converters[i](value) if i in converters and value is not None else value
+                                for i, value in enumerate(row)) for row in cur))
+    return copy
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, 'trade fingerprint and wallet checkpoint', [
+        "alter table trade add column fingerprint TEXT",
+        _backfill_trade_fingerprints,
+        "create index trade_fingerprint_index on trade (id_wallet, fingerprint)",
+        "create table if not exists checkpoint(id_wallet INTEGER PRIMARY KEY REFERENCES wallet (id), "
+        "last_trade_date DATETIME, last_trade_id INTEGER, assets TEXT, pnl_total TEXT)",
+    ]),
+    Migration(2, 'composite indexes for the finders', [
+        # indexes on the primary keys are redundant
+        "drop index if exists wallet_id_index",
+        "drop index if exists trade_id_index",
+        "drop index if exists asset_wallet_id_index",
+        "drop index if exists pnl_id_index",
+        "drop index if exists pnl_total_id_index",
+        "create index trade_wallet_date_index on trade (id_wallet, date)",
+        "create index trade_wallet_pair_date_index on trade (id_wallet, pair, date)",
+        "create index asset_wallet_wallet_asset_index on asset_wallet (id_wallet, asset)",
+        "create index pnl_wallet_date_index on pnl (id_wallet, date)",
+        "create index pnl_wallet_asset_date_index on pnl (id_wallet, asset, date)",
+        "create index pnl_total_wallet_asset_index on pnl_total (id_wallet, asset, currency)",
+    ]),
+    Migration(3, 'unique asset of a wallet for the upsert of the assets', [
+        # only the last row of an asset of a wallet is kept
+        "delete from asset_wallet where id not in (select max(id) from asset_wallet group by id_wallet, asset)",
+        "drop index if exists asset_wallet_wallet_asset_index",
+        "create unique index asset_wallet_wallet_asset_index on asset_wallet (id_wallet, asset)",
+    ]),
+    Migration(4, 'trade fingerprint index not unique', [
+        # the identical trades of a wallet are legitimate, the fingerprint is only used to look up the imported trades
+        "drop index if exists trade_fingerprint_index",
+        "create index trade_fingerprint_index on trade (id_wallet, fingerprint)",
+    ]),
+    Migration(5, 'amounts stored as exact text', [
+        # the declared type of a column can't be altered : the tables are rebuilt
+        "alter table trade rename to trade_v4",
+        "create table trade(id INTEGER PRIMARY KEY, id_wallet INTEGER REFERENCES wallet (id), pair TEXT, type TEXT, "
+        "qty DECIMAL_TEXT, price DECIMAL_TEXT, total DECIMAL_TEXT, date DATETIME, fee DECIMAL_TEXT, fee_asset TEXT, "
+        "origin_id TEXT, origin TEXT, fingerprint TEXT)",
+        _copy_rows('trade', 'trade_v4', dict.fromkeys((4, 5, 6, 8), _amount_as_text)),
+        "drop table trade_v4",
+        "create index trade_fingerprint_index on trade (id_wallet, fingerprint)",
+        "create index trade_wallet_date_index on trade (id_wallet, date)",
+        "create index trade_wallet_pair_date_index on trade (id_wallet, pair, date)",
+        "alter table asset_wallet rename to asset_wallet_v4",
+        "create table asset_wallet(id INTEGER PRIMARY KEY, id_wallet INTEGER REFERENCES wallet (id), asset TEXT, "
+        "qty DECIMAL_TEXT, pru DECIMAL_TEXT, currency TEXT)",
+        _copy_rows('asset_wallet', 'asset_wallet_v4', dict.fromkeys((3, 4), _amount_as_text)),
+        "drop table asset_wallet_v4",
+        "create unique index asset_wallet_wallet_asset_index on asset_wallet (id_wallet, asset)",
+        "alter table pnl rename to pnl_v4",
+        "create table pnl(id INTEGER PRIMARY KEY, id_wallet INTEGER REFERENCES wallet (id), date DATETIME, "
+        "asset TEXT, value DECIMAL_TEXT, currency TEXT)",
+        _copy_rows('pnl', 'pnl_v4', {4: _amount_as_text}),
+        "drop table pnl_v4",
+        "create index pnl_wallet_date_index on pnl (id_wallet, date)",
+        "create index pnl_wallet_asset_date_index on pnl (id_wallet, asset, date)",
+        "alter table pnl_total rename to pnl_total_v4",
+        "create table pnl_total(id INTEGER PRIMARY KEY, id_wallet INTEGER REFERENCES wallet (id), asset TEXT, "
+        "value DECIMAL_TEXT, currency TEXT)",
+        _copy_rows('pnl_total', 'pnl_total_v4', {3: _amount_as_text}),
+        "drop table pnl_total_v4",
+        "create index pnl_total_wallet_asset_index on pnl_total (id_wallet, asset, currency)",
+    ]),
+    Migration(6, 'dates stored as epoch milliseconds', [
+        "alter table trade rename to trade_v5",
+        "create table trade(id INTEGER PRIMARY KEY, id_wallet INTEGER REFERENCES wallet (id), pair TEXT, type TEXT, "
+        "qty DECIMAL_TEXT, price DECIMAL_TEXT, total DECIMAL_TEXT, date EPOCH_MS, fee DECIMAL_TEXT, fee_asset TEXT, "
+        "origin_id TEXT, origin TEXT, fingerprint TEXT)",
+        _copy_rows('trade', 'trade_v5', {7: _date_as_epoch_ms}),
+        "drop table trade_v5",
+        "create index trade_fingerprint_index on trade (id_wallet, fingerprint)",
+        "create index trade_wallet_date_index on trade (id_wallet, date)",
+        "create index trade_wallet_pair_date_index on trade (id_wallet, pair, date)",
+        "alter table pnl rename to pnl_v5",
+        "create table pnl(id INTEGER PRIMARY KEY, id_wallet INTEGER REFERENCES wallet (id), date EPOCH_MS, "
+        "asset TEXT, value DECIMAL_TEXT, currency TEXT)",
+        _copy_rows('pnl', 'pnl_v5', {2: _date_as_epoch_ms}),
+        "drop table pnl_v5",
+        "create index pnl_wallet_date_index on pnl (id_wallet, date)",
+        "create index pnl_wallet_asset_date_index on pnl (id_wallet, asset, date)",
+        "alter table checkpoint rename to checkpoint_v5",
+        "create table checkpoint(id_wallet INTEGER PRIMARY KEY REFERENCES wallet (id), last_trade_date EPOCH_MS, "
+        "last_trade_id INTEGER, assets TEXT, pnl_total TEXT)",
+        _copy_rows('checkpoint', 'checkpoint_v5', {1: _date_as_epoch_ms}),
+        "drop table checkpoint_v5",
+    ]),
+    Migration(7, 'generation of the trades of a wallet', [
+        "create table trade_generation(id_wallet INTEGER PRIMARY KEY REFERENCES wallet (id), generation INTEGER)",
+    ]),
+    Migration(8, 'identity of the db', [
+        # random uuid, tells the files built from the db (see moon.model.trade_cache) from those of another db
+        "create table db_identity(uuid TEXT)",
+        "insert into db_identity(uuid) values (lower(hex(randomblob(16))))",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("pragma user_version").fetchone()[0])
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    """
+    Apply on the db the migrations of a version greater than the db version (pragma user_version)
+    Each migration is applied in its own transaction
+    A db without schema (db.sql not loaded) is not migrated, db.sql creates the schema of the last version
+    """
+    if conn.execute("select 1 from sqlite_master where type = 'table' and name = 'trade'").fetchone() is None:
+        return
+    version = get_schema_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        try:
+            conn.execute("begin")
+            for step in migration.steps:
+                if isinstance(step, str):
+                    conn.execute(step)
+                else:
+                    step(conn)
+            conn.execute(f"pragma user_version = {migration.version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
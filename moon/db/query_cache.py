@@ -0,0 +1,170 @@
+"""
+Cache of the results of the queries of the models (Trade.find, Pnl.find, Trade.get_pairs...)
+
+The results are the rows read in db, kept in a LRU cache keyed by the table, the wallet, the generation of the table for
+the wallet and the query with its parameters (the normalized criteria). The models invalidate a table for a wallet when
+they write it (save, save_all, delete) : its generation changes so the results read before are no longer found, and
+they are evicted as the least recently used. The cache is bounded by its number of results and by its number of rows,
+a result with more rows than max_result_rows (ie the whole trade history of a wallet) is not kept. The rows are converted to the models at each read, so the results
+returned can be modified without changing the cache.
+A write of a thread is seen by the other threads when it's committed : the generation is changed at the write and again
+at the commit (see ConnectionDB.after_commit), and the reads of a thread with uncommitted writes are not cached.
+The generations are kept in memory, the writes of another process are not seen.
+"""
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from moon.db.db import ConnectionDB
+
+# max number of results kept
+QUERY_CACHE_SIZE = 256
+# max number of rows of all the results kept
+QUERY_CACHE_ROWS = 100000
+# max number of rows of a result kept
+QUERY_CACHE_RESULT_ROWS = 10000
+
+
+@dataclass(frozen=True)
+class QueryCacheStats:
+    """
+    Statistics of a QueryCache : hits and misses since it was created (or cleared), number of results and of rows kept
+    """
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+    rows: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+
+class QueryCache:
+    """
+    LRU cache of the rows of the queries, invalidated by table and wallet
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, max_rows: int = QUERY_CACHE_ROWS,
+                 max_result_rows: int = QUERY_CACHE_RESULT_ROWS):
+        """
+        QueryCache constructor
+        :param maxsize: max number of results kept, 0 to disable the cache
+        :param max_rows: max number of rows of all the results kept
+        :param max_result_rows: max number of rows of a result kept, the bigger results are read in db each time
+        """
+        self.maxsize = maxsize
+        self.max_rows = max_rows
+        self.max_result_rows = min(max_result_rows, max_rows)
+        self._results: OrderedDict[tuple, tuple[tuple, ...]] = OrderedDict()
+        self._rows = 0
+        # generation of the tables (all the wallets) and of the tables by wallet, (table, None) is changed by the writes
+        # of an unknown wallet
+        self._table_generations: Counter[str] = Counter()
+        self._wallet_generations: Counter[tuple[str, Optional[int]]] = Counter()
+        self._db_generation = ConnectionDB._generation
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_db(self) -> None:
+        # a new db (ConnectionDB.set_db) empties the cache
+        if self._db_generation != ConnectionDB._generation:
+            self._results.clear()
+            self._rows = 0
+            self._table_generations.clear()
+            self._wallet_generations.clear()
+            self._db_generation = ConnectionDB._generation
+
+    def _generation(self, table: str, id_wallet: Optional[int]) -> tuple[int, ...]:
+        if id_wallet is None:
+            return self._table_generations[table],
+        return self._wallet_generations[(table, None)], self._wallet_generations[(table, id_wallet)]
+
+    def fetchall(self, table: str, id_wallet: Optional[int], req: str, parameters: Iterable[Any] = ()) -> list[tuple]:
+        """
+        Rows of a query on a table, read in db if they are not in the cache
+        :param table: the table read, its writes invalidate the result
+        :param id_wallet: the wallet of the rows read, None if the query reads the rows of all the wallets
+        :param req: the SQL query
+        :param parameters: the parameters of the query
+        :return: the rows
+        """
+        parameters = tuple(parameters)
+        conn = ConnectionDB.get_connection()
+        if self.maxsize <= 0 or conn.in_transaction:
+            # the uncommitted writes of the thread must not be seen by the other threads
+            with self._lock:
+                self.misses += 1
+            return conn.execute(req, parameters).fetchall()
+        with self._lock:
+            self._check_db()
+            key = (table, id_wallet, self._generation(table, id_wallet), req, parameters)
+            rows = self._results.get(key)
+            if rows is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return list(rows)
+            self.misses += 1
+            db_generation = self._db_generation
+        # the generation is read before the rows : if the table is written meanwhile, the result is stored with the
+        # previous generation and is not found again
+        rows = tuple(conn.execute(req, parameters).fetchall())
+        with self._lock:
+            if db_generation == ConnectionDB._generation and len(rows) <= self.max_result_rows:
+                previous_rows = self._results.pop(key, None)
+                if previous_rows is not None:
+                    self._rows -= len(previous_rows)
+                self._results[key] = rows
+                self._rows += len(rows)
+                while len(self._results) > self.maxsize or self._rows > self.max_rows:
+                    self._rows -= len(self._results.popitem(last=False)[1])
+        return list(rows)
+
+    def invalidate(self, table: str, id_wallet: Optional[int] = None) -> None:
+        """
+        Invalidate the results of a table for a wallet, now and at the commit of the writes of the thread
+        :param table: the table written
+        :param id_wallet: the wallet of the rows written, None if unknown (the results of all the wallets are
+        invalidated)
+        """
+        self._bump(table, id_wallet)
+        local = self._local
+        # the callbacks of the thread are dropped by a new db
+        if not getattr(local, 'pending', None) or local.db_generation != ConnectionDB._generation:
+            local.pending = set()
+            local.db_generation = ConnectionDB._generation
+            ConnectionDB.after_commit(self._bump_pending)
+        local.pending.add((table, id_wallet))
+
+    def _bump(self, table: str, id_wallet: Optional[int]) -> None:
+        with self._lock:
+            self._table_generations[table] += 1
+            self._wallet_generations[(table, id_wallet)] += 1
+
+    def _bump_pending(self) -> None:
+        pending, self._local.pending = self._local.pending, set()
+        for table, id_wallet in pending:
+            self._bump(table, id_wallet)
+
+    def clear(self) -> None:
+        """
+        Empty the cache and reset the statistics
+        """
+        with self._lock:
+            self._results.clear()
+            self._rows = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> QueryCacheStats:
+        with self._lock:
+            return QueryCacheStats(self.hits, self.misses, len(self._results), self.maxsize, self._rows)
+
+
+# cache of the models
+QUERY_CACHE = QueryCache()
@@ -6,6 +6,7 @@ from moon.ui.main_window import MainWindow
 
 # api_key and api_secret for Binance API in env
 # client = Client(os.environ['api_key'], os.environ['api_secret'])
+# the trades of the pairs are synchronised by moon.sync.binance_sync.sync_binance_trades
 
 pairs = {
     "ADAEUR",
@@ -48,25 +49,6 @@ def toto() -> None:
 #         assets_set = assets_set.union(assets)
 #     assets_set.remove('USDT')
 #     return assets_set
-#
-#
-# def get_my_trades():
-#     nb_trades = 0
-#     for pair in pairs:
-#         trades_for_pair = client.get_my_trades(symbol=pair)
-#         buy = 0.0
-#         sell = 0.0
-#         for trade in trades_for_pair:
-#             # trades.append(Trade(trade['']))
-#             print(f'{pair} - Prix :', trade['price'], 'Qty :', trade['qty'], 'Montant :', trade['quoteQty'],
-#                   'Achat' if bool(trade['isBuyer']) else 'Vente',
-#                   datetime.fromtimestamp(trade['time'] / 1000).strftime('%d/%m/%y'))
-#             if bool(trade['isBuyer']):
-#                 buy += float(trade['quoteQty'])
-#             else:
-#                 sell += float(trade['quoteQty'])
-#         print(f'{pair} - BUY : {buy} SELL : {sell} PNL : {sell - buy}')
-#     print(f'nb_trades={nb_trades}')
 
 
 def main()->None:
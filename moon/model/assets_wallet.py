@@ -1,17 +1,21 @@
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from decimal import Decimal
 from typing import Optional, ItemsView, KeysView, ValuesView
 
 from moon.db.db import ConnectionDB
+from moon.db.query_cache import QUERY_CACHE
 
 SQL_READ = "select id, asset, qty, pru, currency from asset_wallet where id = ?"
 SQL_FIND = "select id, asset, qty, pru, currency description from asset_wallet where " \
            "id_wallet = ?"
-SQL_INSERT = "insert into asset_wallet(id_wallet, asset, qty, pru, currency) values(?, ?, ?, ?, ?)"
-SQL_UPDATE = "update asset_wallet set id_wallet = ?, asset = ?, qty = ?, pru = ?, currency= ? where id = ?"
-SQL_DELETE = "delete from asset_wallet where id = ?"
+SQL_UPSERT = "insert into asset_wallet(id_wallet, asset, qty, pru, currency) values(?, ?, ?, ?, ?) " \
+             "on conflict(id_wallet, asset) do update set qty = excluded.qty, pru = excluded.pru, " \
+             "currency = excluded.currency"
+SQL_DELETE = "delete from asset_wallet where id_wallet = ? and asset = ?"
 SQL_DELETE_ASSETS_WALLET = "delete from asset_wallet where id_wallet = ?"
+SQL_DELETE_OTHER_ASSETS = "delete from asset_wallet where id_wallet = ? and asset not in ({})"
+SQL_FIND_ALL = "select id_wallet, id, asset, qty, pru, currency from asset_wallet order by id_wallet, id"
 
 SQL_COL_ID = 0
 SQL_COL_ASSET = 1
@@ -31,6 +35,9 @@ class AssetWalletData:
 class AssetsWallet:
     """
     Manage assets of a wallet
+    The assets as saved in db (when loaded or saved) are kept in a snapshot, so that a save only writes the new, updated
+    and deleted assets without reading the db first. An assets wallet which was not loaded has no snapshot : its save
+    replaces all the assets of the wallet in db
     """
 
     def __init__(self, id_wallet: int, dict_asset: Optional[dict[str, AssetWalletData]] = None):
@@ -44,6 +51,8 @@ class AssetsWallet:
             self.assets_wallet = defaultdict(AssetWalletData, dict_asset)
         else:
             self.assets_wallet = defaultdict(AssetWalletData)
+        self.snapshot: dict[str, AssetWalletData] = {}
+        self.loaded = False
 
     def __repr__(self):
         # return f"{self.assets_wallet}"
@@ -61,18 +70,39 @@ class AssetsWallet:
         :param id_wallet: wallet id
         :return: the assets wallet loaded
         """
+        rows = QUERY_CACHE.fetchall('asset_wallet', id_wallet, SQL_FIND, (id_wallet,))
+        return AssetsWallet.from_rows(id_wallet, rows)
+
+    @staticmethod
+    def load_all() -> dict[int, 'AssetsWallet']:
+        """
+        Load the assets of all the wallets in one request
+        :return: the assets wallet by wallet id (a wallet without assets is not in the result)
+        """
+        rows_by_wallet: dict[int, list[tuple]] = defaultdict(list)
+        for row in ConnectionDB.get_connection().execute(SQL_FIND_ALL).fetchall():
+            rows_by_wallet[row[0]].append(row[1:])
+        return {id_wallet: AssetsWallet.from_rows(id_wallet, rows)  # type: ignore
+                for id_wallet, rows in rows_by_wallet.items()}
+
+    @staticmethod
+    def from_rows(id_wallet: int, rows: list[tuple]) -> Optional['AssetsWallet']:
+        """
+        Assets wallet of the asset_wallet rows (id, asset, qty, pru, currency) read in db
+        :param id_wallet: wallet id
+        :param rows: the rows
+        :return: the assets wallet or None if there is no row
+        """
+        if not rows:
+            return None
         aw = AssetsWallet(id_wallet)
-        cur = ConnectionDB.get_cursor().execute(SQL_FIND, (id_wallet,))
-        rows = cur.fetchall()
-        aw.assets_wallet = defaultdict(AssetWalletData)
         for row in rows:
             aw.assets_wallet[row[SQL_COL_ASSET]] = AssetWalletData(row[SQL_COL_ID],
-                                                                   Decimal(
-                                                                       str(row[SQL_COL_QTY])),
-                                                                   Decimal(
-                                                                       str(row[SQL_COL_PRU])),
+                                                                   row[SQL_COL_QTY],
+                                                                   row[SQL_COL_PRU],
                                                                    row[SQL_COL_CURRENCY])
-        return None if not aw else aw
+        aw._take_snapshot()
+        return aw
 
     def __getitem__(self, key: str):
         return self.assets_wallet[key]
@@ -106,57 +136,61 @@ class AssetsWallet:
     def get_assets_data(self) -> list[AssetWalletData]:
         return list(self.assets_wallet.values())
 
-    def save(self):
+    def _take_snapshot(self) -> None:
+        self.snapshot = {asset: replace(data) for asset, data in self.assets_wallet.items()}
+        self.loaded = True
+
+    def get_changes(self) -> tuple[dict[str, AssetWalletData], list[str]]:
         """
-        Save the assets wallet in db
+        Changes of the assets since the last load or save
+        :return: the new or updated assets and the deleted assets
         """
-        # read assets in db
-        assets_wallet_db = AssetsWallet.load(self.id_wallet)
+        upserted_assets = {asset: data for asset, data in self.assets_wallet.items()
+                           if self.snapshot.get(asset) != data}
+        deleted_assets = [asset for asset in self.snapshot if asset not in self.assets_wallet]
+        return upserted_assets, deleted_assets
 
-        # if db contains no assets waller for the wallet : insert all
-        if assets_wallet_db is None:
-            self._insert_assets(self.assets_wallet)
+    def save(self):
+        """
+        Save the changes of the assets wallet in db, in one transaction
+        The new and updated assets are upserted on (id_wallet, asset). An assets wallet which was not loaded
+        overwrites the assets of the wallet in db : the assets in db which are not in the assets wallet are deleted
+        """
+        upserted_assets, deleted_assets = self.get_changes()
+        if self.loaded and not upserted_assets and not deleted_assets:
+            return
+        QUERY_CACHE.invalidate('asset_wallet', self.id_wallet)
+        with ConnectionDB.savepoint('assets_wallet_save'):
+            if upserted_assets:
+                self._upsert_assets(upserted_assets)
+            if deleted_assets:
+                self._delete_assets(deleted_assets)
+            if not self.loaded:
+                self._delete_other_assets()
+        self._take_snapshot()
+
+    def _upsert_assets(self, upserted_assets: dict[str, AssetWalletData]):
+        upserted_assets_list = [(self.id_wallet, asset, data.qty, data.pru, data.currency)
+                                for asset, data in upserted_assets.items()]
+        cur = ConnectionDB.get_connection().executemany(SQL_UPSERT, upserted_assets_list)
+        ConnectionDB.count_writes('asset_wallet', cur.rowcount)
+
+    def _delete_assets(self, deleted_assets: list[str]):
+        deleted_assets_list = [(self.id_wallet, asset) for asset in deleted_assets]
+        cur = ConnectionDB.get_connection().executemany(SQL_DELETE, deleted_assets_list)
+        ConnectionDB.count_writes('asset_wallet', cur.rowcount)
+
+    def _delete_other_assets(self):
+        assets = self.get_assets()
+        if assets:
+            cur = ConnectionDB.get_connection().execute(SQL_DELETE_OTHER_ASSETS.format(', '.join('?' * len(assets))),
+                                                        (self.id_wallet, *assets))
         else:
-            # db not empty
-            # get new assets and insert db in batch mode
-            new_asset_keys = set(self.assets_wallet.keys()) - \
-                set(assets_wallet_db.assets_wallet.keys())
-            new_assets = {
-                k: v for k, v in self.assets_wallet.items() if k in new_asset_keys}
-            if new_assets:
-                self._insert_assets(new_assets)
-
-            # get updated assets and update db in batch mode
-            common_asset = set(self.assets_wallet.keys()).intersection(
-                set(assets_wallet_db.assets_wallet.keys()))
-            updated_asset = {}
-            for asset in common_asset:
-                if self.assets_wallet[asset] != assets_wallet_db[asset]:
-                    updated_asset[asset] = self.assets_wallet[asset]
-            if updated_asset:
-                self._update_assets(updated_asset)
-
-            # get deleted assets and delete db in batch mode
-            deleted_asset_keys = set(
-                set(assets_wallet_db.assets_wallet.keys() - self.assets_wallet.keys()))
-            deleted_asset_ids = [data.id for asset, data in assets_wallet_db.items() if asset in
-                                 deleted_asset_keys]
-            if deleted_asset_ids:
-                self._delete_assets(deleted_asset_ids)
-
-    def _insert_assets(self, inserted_assets: dict[str, AssetWalletData]):
-        inserted_assets_list = [(self.id_wallet, asset, float(data.qty), float(data.pru), data.currency)
-                                for asset, data in inserted_assets.items()]
-        ConnectionDB.get_cursor().executemany(SQL_INSERT, inserted_assets_list)
-
-    def _update_assets(self, updated_assets: dict[str, AssetWalletData]):
-        updated_assets_list = [(self.id_wallet, asset, float(data.qty), float(data.pru), data.currency, data.id) for
-                               asset, data in updated_assets.items()]
-        ConnectionDB.get_cursor().executemany(SQL_UPDATE, updated_assets_list)
-
-    def _delete_assets(self, deleted_assets: list[int]):
-        deleted_assets_list = [(id,) for id in deleted_assets]
-        ConnectionDB.get_cursor().executemany(SQL_DELETE, deleted_assets_list)
+            cur = ConnectionDB.get_connection().execute(SQL_DELETE_ASSETS_WALLET, (self.id_wallet,))
+        ConnectionDB.count_writes('asset_wallet', cur.rowcount)
 
     def delete(self):
-        ConnectionDB.get_cursor().execute(SQL_DELETE_ASSETS_WALLET, (self.id_wallet,))
+        QUERY_CACHE.invalidate('asset_wallet', self.id_wallet)
+        ConnectionDB.get_connection().execute(SQL_DELETE_ASSETS_WALLET, (self.id_wallet,))
+        self.snapshot = {}
+        self.loaded = True
@@ -0,0 +1,96 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Union
+
+from moon.db.db import ConnectionDB, to_datetime
+from moon.model.assets_wallet import AssetsWallet, AssetWalletData
+from moon.model.pnl_total import PnlTotal, PnlTotalBook
+
+SQL_READ = "select id_wallet, last_trade_date, last_trade_id, assets, pnl_total from checkpoint where id_wallet = ?"
+SQL_SAVE = "insert or replace into checkpoint(id_wallet, last_trade_date, last_trade_id, assets, pnl_total) " \
+           "values(?, ?, ?, ?, ?)"
+SQL_DELETE_WALLET = "delete from checkpoint where id_wallet = ?"
+SQL_DELETE_FROM_DATE = "delete from checkpoint where id_wallet = ? and last_trade_date >= ?"
+SQL_DELETE_FROM_TRADE = "delete from checkpoint where exists (select 1 from trade where trade.id = ? and " \
+                        "trade.id_wallet = checkpoint.id_wallet and trade.date <= checkpoint.last_trade_date)"
+
+COL_ID_WALLET = 0
+COL_LAST_TRADE_DATE = 1
+COL_LAST_TRADE_ID = 2
+COL_ASSETS = 3
+COL_PNL_TOTAL = 4
+
+
+class Checkpoint:
+    """
+    State of a wallet computation (assets qty/pru and pnl total) after the replay of its trades until the last trade
+    applied (identified by its date and id)
+    The assets wallet is kept as computed, with the assets with qty == 0, so that the next trades can be applied on it
+    """
+
+    def __init__(self, id_wallet: int, last_trade_date: Optional[Union[datetime, str]] = None,
+                 last_trade_id: Optional[int] = None, assets_wallet: Optional[AssetsWallet] = None,
+                 pnl_total_book: Optional[PnlTotalBook] = None):
+        self.id_wallet = id_wallet
+        self.last_trade_date = to_datetime(last_trade_date) if last_trade_date is not None else None
+        self.last_trade_id = last_trade_id
+        self.assets_wallet = assets_wallet if assets_wallet is not None else AssetsWallet(id_wallet)
+        self.pnl_total_book = pnl_total_book if pnl_total_book is not None else PnlTotalBook()
+
+    def __repr__(self):
+        return f"Checkpoint(id_wallet={self.id_wallet}, last_trade_date='{self.last_trade_date}', " \
+               f"last_trade_id={self.last_trade_id}, assets_wallet={self.assets_wallet!r}, " \
+               f"pnl_total_book={self.pnl_total_book!r})"
+
+    @staticmethod
+    def load(id_wallet: int) -> Optional['Checkpoint']:
+        """
+        Load the checkpoint of a wallet
+        :param id_wallet: wallet id
+        :return: the checkpoint or None if the wallet has no (valid) checkpoint
+        """
+        row = ConnectionDB.get_connection().execute(SQL_READ, (id_wallet,)).fetchone()
+        if row is None:
+            return None
+        assets = {asset: AssetWalletData(None, Decimal(qty), Decimal(pru), currency)
+                  for asset, (qty, pru, currency) in json.loads(row[COL_ASSETS]).items()}
+        pnl_total_book = PnlTotalBook(PnlTotal(None, asset, Decimal(value), currency)
+                                      for asset, value, currency in json.loads(row[COL_PNL_TOTAL]))
+        return Checkpoint(row[COL_ID_WALLET], row[COL_LAST_TRADE_DATE], row[COL_LAST_TRADE_ID],
+                          AssetsWallet(id_wallet, assets), pnl_total_book)
+
+    def save(self) -> None:
+        """
+        Save (insert or replace) the checkpoint of the wallet
+        Decimal values are serialized as strings so that they are stored without loss
+        """
+        assets = {asset: (str(data.qty), str(data.pru), data.currency) for asset, data in self.assets_wallet.items()}
+        pnl_total = [(p.asset, str(p.value), p.currency) for p in self.pnl_total_book]
+        cur = ConnectionDB.get_connection().execute(SQL_SAVE, (self.id_wallet, self.last_trade_date,
+                                                               self.last_trade_id, json.dumps(assets),
+                                                               json.dumps(pnl_total)))
+        ConnectionDB.count_writes('checkpoint', cur.rowcount)
+
+    @staticmethod
+    def invalidate(id_wallet: int, date: Optional[Union[datetime, str]] = None) -> None:
+        """
+        Invalidate (delete) the checkpoint of a wallet if a trade at date is not after its last trade
+        :param id_wallet: wallet id
+        :param date: date of the trade inserted, updated or deleted, if None the checkpoint is always invalidated
+        """
+        if date is None:
+            cur = ConnectionDB.get_connection().execute(SQL_DELETE_WALLET, (id_wallet,))
+        else:
+            cur = ConnectionDB.get_connection().execute(SQL_DELETE_FROM_DATE, (id_wallet, to_datetime(date)))
+        ConnectionDB.count_writes('checkpoint', cur.rowcount)
+
+    @staticmethod
+    def invalidate_trades(ids: list[int]) -> None:
+        """
+        Invalidate the checkpoints which have already applied the trades (as stored in db) identified by ids
+        Must be called before the trades are updated or deleted
+        :param ids: trades ids
+        """
+        cur = ConnectionDB.get_connection().executemany(SQL_DELETE_FROM_TRADE, [(id_,) for id_ in ids])
+        ConnectionDB.count_writes('checkpoint', cur.rowcount)
@@ -0,0 +1,128 @@
+"""
+Parallel (process pool) alternative to Wallet.import_trades
+
+The trades are partitioned by base asset : the state of a base asset only depends on the trades of this asset and on
+the quote and fee legs of the other trades where it is the quote or fee asset (ie BNB fees). These legs only change the
+quantity of the asset, not its PRU : they are replayed as quantity deltas in the partition of the asset, in the order
+of the trades. Each partition is replayed by Wallet._apply_trades in a worker process.
+The assets which are never a base asset (as EUR or USDT) only have a quantity : their quantity is the sum of the
+deltas of the partitions.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from typing import Optional, Union
+
+from moon.model.assets_wallet import AssetsWallet, AssetWalletData
+from moon.model.pnl import Pnl
+from moon.model.pnl_total import PnlTotal, PnlTotalBook
+from moon.model.trade import Trade, TradeType
+from moon.model.wallet import Wallet
+
+# quote or fee leg of a trade on the base asset of another partition : (asset, quantity delta)
+QtyDelta = tuple[str, Decimal]
+
+
+def import_trades(id_wallet: int, trades: list[Trade],
+                  max_workers: Optional[int] = None) -> tuple[AssetsWallet, list[Pnl], list[PnlTotal]]:
+    """
+    Compute the assets wallet, the pnl and the pnl total of the trades like Wallet.import_trades, the partitions of
+    trades being replayed in parallel
+    :param id_wallet: wallet's id
+    :param trades: the trades, in chronological order
+    :param max_workers: max number of worker processes, default is the number of processors
+    :return: the assets wallet, the pnl sorted by date and the pnl total sorted by asset
+    """
+    partitions = _partition(trades)
+    events = _partition_events(trades, partitions)
+    if len(partitions) <= 1 or max_workers == 1:
+        results = [_replay(id_wallet, partition_events) for partition_events in events]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_replay, [id_wallet] * len(partitions), events))
+
+    base_assets = {trade.get_assets()[0] for trade in trades}
+    assets: dict[Optional[str], AssetWalletData] = {}
+    pnl_by_trade: list[tuple[int, Pnl]] = []
+    pnl_total_by_trade: list[tuple[int, PnlTotal]] = []
+    for partition, (partition_assets, pnl_list, pnl_total_list) in zip(partitions, results):
+        base_asset = trades[partition[0]].get_assets()[0]
+        for asset, data in partition_assets.items():
+            # a base asset is taken from its partition (which has all its legs), the other assets are the sum of the
+            # partitions deltas
+            if asset == base_asset:
+                assets[asset] = data
+            elif asset in base_assets:
+                continue
+            elif asset not in assets:
+                assets[asset] = data
+            else:
+                assets[asset] = AssetWalletData(None, assets[asset].qty + data.qty, data.pru, data.currency)
+        # the pnl are in the order of the SELL trades of the partition
+        sell_trades = [i for i in partition if trades[i].type == TradeType.SELL]
+        pnl_by_trade.extend(zip(sell_trades, pnl_list))
+        first_sell_trades: dict[tuple[str, str], int] = {}
+        for i, pnl in zip(sell_trades, pnl_list):
+            first_sell_trades.setdefault((pnl.asset, pnl.currency), i)
+        pnl_total_by_trade.extend((first_sell_trades[(p.asset, p.currency)], p) for p in pnl_total_list)
+
+    # assets in the order of their first trade, as in Wallet.import_trades
+    first_trades: dict[Optional[str], int] = {}
+    for i, trade in enumerate(trades):
+        for asset in (*trade.get_assets(), trade.fee_asset):
+            first_trades.setdefault(asset, i)
+    assets_wallet = AssetsWallet(id_wallet, {asset: assets[asset]  # type: ignore
+                                             for asset in sorted(assets, key=lambda a: first_trades[a])})
+
+    return (
+        Wallet._get_final_assets_wallet(assets_wallet),
+        sorted([pnl for _, pnl in sorted(pnl_by_trade, key=lambda x: x[0])], key=lambda x: x.date),  # type: ignore
+        sorted([p for _, p in sorted(pnl_total_by_trade, key=lambda x: x[0])], key=lambda x: x.asset),
+    )
+
+
+def _partition(trades: list[Trade]) -> list[list[int]]:
+    """
+    Partition the trades by base asset
+    :return: the indexes of the trades of each partition, in the order of the trades
+    """
+    partitions: dict[Optional[str], list[int]] = {}
+    for i, trade in enumerate(trades):
+        partitions.setdefault(trade.get_assets()[0], []).append(i)
+    return list(partitions.values())
+
+
+def _partition_events(trades: list[Trade], partitions: list[list[int]]) -> list[list[Union[Trade, QtyDelta]]]:
+    """
+    Events replayed by each partition : its trades and the quote and fee legs of the other trades on its base asset,
+    in the order of the trades
+    """
+    partition_by_base_asset = {trades[partition[0]].get_assets()[0]: i for i, partition in enumerate(partitions)}
+    events: list[list[Union[Trade, QtyDelta]]] = [[] for _ in partitions]
+    for trade in trades:
+        base_asset, quote_asset = trade.get_assets()
+        events[partition_by_base_asset[base_asset]].append(trade)
+        quote_delta = -trade.total if trade.type == TradeType.BUY else trade.total
+        for asset, delta in ((quote_asset, quote_delta), (trade.fee_asset, -trade.fee)):
+            if asset != base_asset and asset in partition_by_base_asset:
+                events[partition_by_base_asset[asset]].append((asset, delta))  # type: ignore
+    return events
+
+
+def _replay(id_wallet: int,
+            events: list[Union[Trade, QtyDelta]]) -> tuple[dict[str, AssetWalletData], list[Pnl], list[PnlTotal]]:
+    """
+    Replay the events of a partition (in a worker process)
+    :return: the assets (with the assets with qty == 0), the pnl and the pnl total in the order of the trades
+    """
+    assets_wallet = AssetsWallet(id_wallet)
+    pnl_list: list[Pnl] = []
+    pnl_total_book = PnlTotalBook()
+    for event in events:
+        if isinstance(event, Trade):
+            Wallet._apply_trades(assets_wallet, pnl_list, pnl_total_book, [event])
+        else:
+            # as a quote or fee leg in Wallet._apply_trades : the PRU isn't changed
+            asset, delta = event
+            assets_wallet[asset] = AssetWalletData(None, assets_wallet[asset].qty + delta, assets_wallet[asset].pru,
+                                                   assets_wallet[asset].currency)
+    return dict(assets_wallet.items()), pnl_list, pnl_total_book.values()
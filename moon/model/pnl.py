@@ -3,7 +3,8 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Optional, Union, Any
 
-from moon.db.db import ConnectionDB
+from moon.db.db import ConnectionDB, to_datetime
+from moon.db.query_cache import QUERY_CACHE
 from moon.exceptions.exceptions import EntityNotFoundError
 
 SQL_FIND = "select id, id_wallet, date, asset, value, currency from pnl where id_wallet = ?"
@@ -21,9 +22,9 @@ COL_CURRENCY = 5
 
 class Pnl:
 
-    def __init__(self, id_: Optional[int], date: datetime, asset: str, value: Decimal, currency: str):
+    def __init__(self, id_: Optional[int], date: Union[datetime, str], asset: str, value: Decimal, currency: str):
         self.id = id_
-        self.date = date
+        self.date = to_datetime(date)
         self.asset = asset
         self.value: Decimal
         if isinstance(value, float):
@@ -71,16 +72,15 @@ class Pnl:
             parameters.append(asset)
         if begin_date:
             req += ' and date >= ?'
-            parameters.append(begin_date)
+            parameters.append(to_datetime(begin_date))
         if end_date:
             req += ' and date <= ? '
-            parameters.append(end_date)
+            parameters.append(to_datetime(end_date))
         if currency:
             req += ' and currency = ?'
             parameters.append(currency)
 
-        cur = ConnectionDB.get_cursor().execute(req, parameters)
-        rows = cur.fetchall()
+        rows = QUERY_CACHE.fetchall('pnl', id_wallet, req, parameters)
         pnl_list = []
         for row in rows:
             pnl_list.append(Pnl(row[COL_ID], row[COL_DATE], row[COL_ASSET], row[COL_VALUE], row[COL_CURRENCY]))
@@ -88,39 +88,46 @@ class Pnl:
 
     @staticmethod
     def read(id_: int) -> 'Pnl':
-        cur = ConnectionDB.get_cursor().execute(SQL_READ, (id_,))
+        cur = ConnectionDB.get_connection().execute(SQL_READ, (id_,))
         row = cur.fetchone()
         if not row:
             raise EntityNotFoundError(id_)
         return Pnl(row[COL_ID], row[COL_DATE], row[COL_ASSET], row[COL_VALUE], row[COL_CURRENCY])
 
     def save(self, id_wallet: int):
+        QUERY_CACHE.invalidate('pnl', id_wallet)
         if self._is_creation():
-            cur = ConnectionDB.get_cursor().execute(SQL_INSERT,
-                                                    (
-                                                        id_wallet, self.date, self.asset, float(self.value),
-                                                        self.currency))
+            cur = ConnectionDB.get_connection().execute(SQL_INSERT,
+                                                        (id_wallet, self.date, self.asset, self.value,
+                                                         self.currency))
             self.id = cur.lastrowid
         else:
-            ConnectionDB.get_cursor().execute(SQL_UPDATE,
-                                              (id_wallet, self.date, self.asset, float(self.value), self.currency,
-                                               self.id))
+            # the pnl can be moved from another wallet
+            QUERY_CACHE.invalidate('pnl')
+            ConnectionDB.get_connection().execute(SQL_UPDATE,
+                                                  (id_wallet, self.date, self.asset, self.value, self.currency,
+                                                   self.id))
 
     @staticmethod
     def save_all(id_wallet: int, pnl_list: list['Pnl']):
+        QUERY_CACHE.invalidate('pnl', id_wallet)
         update_list = [pnl for pnl in pnl_list if not pnl._is_creation()]
         if update_list:
-            parameters: list[Any] = [(id_wallet, pnl.date, pnl.asset, float(pnl.value), pnl.currency, pnl.id) for pnl in
+            QUERY_CACHE.invalidate('pnl')
+            parameters: list[Any] = [(id_wallet, pnl.date, pnl.asset, pnl.value, pnl.currency, pnl.id) for pnl in
                                      update_list]
-            ConnectionDB.get_cursor().executemany(SQL_UPDATE, parameters)
+            cur = ConnectionDB.get_connection().executemany(SQL_UPDATE, parameters)
+            ConnectionDB.count_writes('pnl', cur.rowcount)
 
         insert_list = [pnl for pnl in pnl_list if pnl._is_creation()]
         if insert_list:
-            parameters = [(id_wallet, pnl.date, pnl.asset, float(pnl.value), pnl.currency) for pnl in insert_list]
-            ConnectionDB.get_cursor().executemany(SQL_INSERT, parameters)
+            parameters = [(id_wallet, pnl.date, pnl.asset, pnl.value, pnl.currency) for pnl in insert_list]
+            cur = ConnectionDB.get_connection().executemany(SQL_INSERT, parameters)
+            ConnectionDB.count_writes('pnl', cur.rowcount)
 
     def delete(self):
-        ConnectionDB.get_cursor().execute(SQL_DELETE, (self.id,))
+        QUERY_CACHE.invalidate('pnl')
+        ConnectionDB.get_connection().execute(SQL_DELETE, (self.id,))
 
     def _is_creation(self):
         return self.id is None
@@ -135,6 +142,6 @@ class Pnl:
                     pnl = line.split(';')
                     # pnl[3][:-1] to skip \n
                     pnl_list.append(
-                        cls(None, datetime.strptime(pnl[0], '%Y-%m-%d %H:%M:%S'), pnl[1], Decimal(pnl[2]), pnl[3][:-1]))
+                        cls(None, pnl[0], pnl[1], Decimal(pnl[2]), pnl[3][:-1]))
 
         return pnl_list
@@ -1,9 +1,10 @@
 from decimal import Decimal
-from typing import Optional, Union, Any
+from typing import Optional, Union, Any, Iterable, Iterator
 
 from moon.exceptions.exceptions import EntityNotFoundError
 
 from moon.db.db import ConnectionDB
+from moon.db.query_cache import QUERY_CACHE
 
 SQL_READ = "select id, asset, value, currency from pnl_total where id = ?"
 SQL_FIND = "select id, asset, value, currency from pnl_total where id_wallet = ?"
@@ -41,46 +42,143 @@ class PnlTotal:
         req = SQL_FIND
         parameters: list[Union[int , str]] = [id_wallet]
         if asset:
-            req += 'and asset = ?'
+            req += ' and asset = ?'
             parameters.append(asset)
-        cur = ConnectionDB.get_cursor().execute(req, parameters)
-        rows = cur.fetchall()
+        rows = QUERY_CACHE.fetchall('pnl_total', id_wallet, req, parameters)
         return [cls(*row) for row in rows]
 
     @classmethod
     def read(cls, id_: int) -> 'PnlTotal':
-        row = ConnectionDB.get_cursor().execute(SQL_READ, (id_,)).fetchone()
+        row = ConnectionDB.get_connection().execute(SQL_READ, (id_,)).fetchone()
         if not row:
             raise EntityNotFoundError(id_)
         return cls(*row)
 
     def delete(self):
-        ConnectionDB.get_cursor().execute(SQL_DELETE, (self.id,))
+        QUERY_CACHE.invalidate('pnl_total')
+        ConnectionDB.get_connection().execute(SQL_DELETE, (self.id,))
 
     def save(self, id_wallet: int):
+        QUERY_CACHE.invalidate('pnl_total', id_wallet)
         if self._is_creation():
-            cur = ConnectionDB.get_cursor().execute(SQL_INSERT,
-                                                    (id_wallet, self.asset, float(self.value), self.currency))
+            cur = ConnectionDB.get_connection().execute(SQL_INSERT,
+                                                        (id_wallet, self.asset, self.value, self.currency))
             self.id = cur.lastrowid
         else:
-            ConnectionDB.get_cursor().execute(SQL_UPDATE,
-                                              (id_wallet, self.asset, float(self.value), self.currency, self.id))
+            # the pnl total can be moved from another wallet
+            QUERY_CACHE.invalidate('pnl_total')
+            ConnectionDB.get_connection().execute(SQL_UPDATE,
+                                                  (id_wallet, self.asset, self.value, self.currency, self.id))
 
     @staticmethod
-    def save_all(id_wallet: int, pnl_total_list: list['PnlTotal']):
-        update_list = [pnl_total for pnl_total in pnl_total_list if not pnl_total._is_creation()]
-        parameters: list[Any] = [(id_wallet, pnl_total.asset, float(pnl_total.value), pnl_total.currency, pnl_total.id) for
-                      pnl_total in update_list]
-        ConnectionDB.get_cursor().executemany(SQL_UPDATE, parameters)
+    def save_all(id_wallet: int, pnl_total_list: Union[list['PnlTotal'], 'PnlTotalBook']):
+        update_parameters: list[Any] = []
+        insert_parameters: list[Any] = []
+        for pnl_total in pnl_total_list:
+            if pnl_total._is_creation():
+                insert_parameters.append((id_wallet, pnl_total.asset, pnl_total.value, pnl_total.currency))
+            else:
+                update_parameters.append(
+                    (id_wallet, pnl_total.asset, pnl_total.value, pnl_total.currency, pnl_total.id))
+        QUERY_CACHE.invalidate('pnl_total', id_wallet)
+        if update_parameters:
+            QUERY_CACHE.invalidate('pnl_total')
+        cur = ConnectionDB.get_connection().executemany(SQL_UPDATE, update_parameters)
+        ConnectionDB.count_writes('pnl_total', cur.rowcount)
+        cur = ConnectionDB.get_connection().executemany(SQL_INSERT, insert_parameters)
+        ConnectionDB.count_writes('pnl_total', cur.rowcount)
 
-        insert_list = [pnl_total for pnl_total in pnl_total_list if pnl_total._is_creation()]
-        parameters = [(id_wallet, pnl_total.asset, float(pnl_total.value), pnl_total.currency) for pnl_total in
-                      insert_list]
-        ConnectionDB.get_cursor().executemany(SQL_INSERT, parameters)
+    @staticmethod
+    def delete_all(pnl_total_list: list['PnlTotal']):
+        QUERY_CACHE.invalidate('pnl_total')
+        cur = ConnectionDB.get_connection().executemany(SQL_DELETE, [(pnl_total.id,) for pnl_total in pnl_total_list])
+        ConnectionDB.count_writes('pnl_total', cur.rowcount)
 
     @staticmethod
     def delete_wallet(id_wallet: int):
-        ConnectionDB.get_cursor().execute(SQL_DELETE_WALLET, (id_wallet,))
+        QUERY_CACHE.invalidate('pnl_total', id_wallet)
+        ConnectionDB.get_connection().execute(SQL_DELETE_WALLET, (id_wallet,))
 
     def _is_creation(self):
         return self.id == None
+
+
+class PnlTotalBook:
+    """
+    Pnl total of a wallet keyed by (asset, currency)
+    """
+
+    def __init__(self, pnl_total_list: Optional[Iterable[PnlTotal]] = None):
+        """
+        PnlTotalBook constructor
+        :param pnl_total_list: the pnl total of the book, the pnl total of a same (asset, currency) are summed in the
+        first one, the others saved in db are kept in merged to be deleted
+        """
+        self.pnl_total: dict[tuple[str, str], PnlTotal] = {}
+        self.merged: list[PnlTotal] = []
+        if pnl_total_list:
+            for pnl_total in pnl_total_list:
+                if (pnl_total.asset, pnl_total.currency) in self.pnl_total:
+                    self.add(pnl_total.asset, pnl_total.value, pnl_total.currency)
+                    if not pnl_total._is_creation():
+                        self.merged.append(pnl_total)
+                else:
+                    self.pnl_total[(pnl_total.asset, pnl_total.currency)] = pnl_total
+
+    def __repr__(self):
+        return f"PnlTotalBook({list(self.pnl_total.values())!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, PnlTotalBook):
+            return False
+        return self.pnl_total == other.pnl_total
+
+    def __len__(self):
+        return len(self.pnl_total)
+
+    def __iter__(self) -> Iterator[PnlTotal]:
+        return iter(self.pnl_total.values())
+
+    def __contains__(self, key: tuple[str, str]):
+        return key in self.pnl_total
+
+    def get(self, asset: str, currency: str) -> Optional[PnlTotal]:
+        return self.pnl_total.get((asset, currency))
+
+    def values(self) -> list[PnlTotal]:
+        return list(self.pnl_total.values())
+
+    def add(self, asset: str, value: Decimal, currency: str) -> PnlTotal:
+        """
+        Add a pnl value to the pnl total of (asset, currency), created if it doesn't exist
+        :return: the pnl total updated
+        """
+        pnl_total = self.pnl_total.get((asset, currency))
+        if pnl_total is None:
+            pnl_total = PnlTotal(None, asset, value, currency)
+            self.pnl_total[(asset, currency)] = pnl_total
+        else:
+            pnl_total.value += value
+        return pnl_total
+
+    def merge(self, pnl_total_list: Iterable[PnlTotal]) -> list[PnlTotal]:
+        """
+        Add the pnl total values to the book
+        :param pnl_total_list: the pnl total to add (a list or a book)
+        :return: the pnl total of the book updated, in the order of pnl_total_list
+        """
+        return [self.add(pnl_total.asset, pnl_total.value, pnl_total.currency) for pnl_total in pnl_total_list]
+
+    def diff(self, other: 'PnlTotalBook') -> 'PnlTotalBook':
+        """
+        Difference between the book and another one
+        :return: a book with the values of the book minus the values of other, for the (asset, currency) whose value
+        is different
+        """
+        book = PnlTotalBook()
+        for key in list(self.pnl_total.keys()) + [key for key in other.pnl_total.keys() if key not in self.pnl_total]:
+            value = (self.pnl_total[key].value if key in self.pnl_total else Decimal('0')) - \
+                    (other.pnl_total[key].value if key in other.pnl_total else Decimal('0'))
+            if value != 0:
+                book.add(key[0], value, key[1])
+        return book
@@ -0,0 +1,70 @@
+import json
+from typing import Any, Iterable, Optional
+
+
+class SymbolIndex:
+    """
+    Resolution of the pairs (as BTCEUR) in (base asset, quote asset)
+    A pair is resolved from the symbols of the exchange metadata if it is known, otherwise it is split on the known
+    assets : the longest base asset whose remainder is a known asset wins (with the assets ETH, ETHDOWN and USDT,
+    ETHDOWNUSDT is read as ETHDOWN + USDT). Each pair is resolved once, the resolution is cached
+    """
+
+    def __init__(self, assets: Iterable[str] = (), symbols: Optional[dict[str, tuple[str, str]]] = None):
+        """
+        SymbolIndex constructor
+        :param assets: known assets
+        :param symbols: known pairs as {symbol: (base asset, quote asset)}
+        """
+        self.assets: set[str] = set(assets)
+        self.symbols: dict[str, tuple[str, str]] = dict(symbols) if symbols else {}
+        self.max_asset_len = max((len(asset) for asset in self.assets), default=0)
+        self.cache: dict[str, tuple[Optional[str], Optional[str]]] = {}
+
+    def add_assets(self, assets: Iterable[str]) -> None:
+        self.assets.update(assets)
+        self.max_asset_len = max((len(asset) for asset in self.assets), default=0)
+        self.cache.clear()
+
+    def load_exchange_info(self, exchange_info: dict[str, Any]) -> None:
+        """
+        Load the symbols of the exchange metadata (as returned by Binance get_exchange_info)
+        :param exchange_info: {'symbols': [{'symbol': 'BTCEUR', 'baseAsset': 'BTC', 'quoteAsset': 'EUR'}, ...]}
+        """
+        symbols = {s['symbol']: (s['baseAsset'], s['quoteAsset']) for s in exchange_info.get('symbols', [])}
+        self.symbols.update(symbols)
+        self.add_assets(asset for pair in symbols.values() for asset in pair)
+
+    def load_symbols_file(self, filename: str) -> None:
+        """
+        Load the symbols of a local json file (an export of the exchange metadata)
+        :param filename: filename of the json file with path
+        """
+        with open(filename, 'r') as f:
+            self.load_exchange_info(json.load(f))
+
+    def resolve(self, pair: str) -> tuple[Optional[str], Optional[str]]:
+        """
+        Resolve a pair
+        :param pair: the pair (as BTCEUR)
+        :return: (base asset, quote asset), an asset is None if it can't be resolved
+        """
+        assets = self.cache.get(pair)
+        if assets is None:
+            assets = self._resolve(pair)
+            self.cache[pair] = assets
+        return assets
+
+    def _resolve(self, pair: str) -> tuple[Optional[str], Optional[str]]:
+        if pair in self.symbols:
+            return self.symbols[pair]
+        # longest base asset whose remainder is an asset
+        for i in range(min(len(pair) - 1, self.max_asset_len), 0, -1):
+            if pair[:i] in self.assets and pair[i:] in self.assets:
+                return pair[:i], pair[i:]
+        # no split on known assets : longest known prefix and suffix
+        base = next((pair[:i] for i in range(min(len(pair), self.max_asset_len), 0, -1) if pair[:i] in self.assets),
+                    None)
+        quote = next((pair[-i:] for i in range(min(len(pair), self.max_asset_len), 0, -1) if pair[-i:] in self.assets),
+                     None)
+        return base, quote
@@ -1,12 +1,22 @@
-import csv
+import glob
+import hashlib
+import heapq
+import itertools
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from decimal import *
 from enum import Enum
-from typing import Union, Any, Optional
+from typing import Union, Any, Callable, Optional, Iterable, Iterator
 import logging.config
 
 from moon.exceptions.exceptions import EntityNotFoundError, BusinessError, Error
-from moon.db.db import ConnectionDB
+from moon.db.db import ConnectionDB, to_datetime, to_epoch_ms
+from moon.db.query_cache import QUERY_CACHE
+from moon.model.checkpoint import Checkpoint
+from moon.model.symbol_index import SymbolIndex
 
 logger = logging.getLogger(__name__)
 
@@ -24,16 +34,46 @@ class TradeOrigin(Enum):
 
 # db requests
 SQL_INSERT_TRADE = """insert into trade(id_wallet, pair, type, qty, price, total, date, fee, fee_asset, origin_id, 
-origin) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?); """
+origin, fingerprint) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?); """
 SQL_UPDATE_TRADE = """update trade set id_wallet = ?, pair = ?, type  = ?, qty = ?, price = ?, total = ?, date = ?, 
-fee = ?, fee_asset = ?, origin_id = ?, origin = ? where id = ? """
+fee = ?, fee_asset = ?, origin_id = ?, origin = ?, fingerprint = ? where id = ? """
 SQL_SELECT_READ_TRADE = """select id, id_wallet, pair, type, qty, price, total, date, fee, fee_asset, origin_id, 
 origin from trade where id=? """
 SQL_SELECT_FIND_TRADE = "select id, id_wallet, pair, type, qty, price, total, date, fee, fee_asset, origin_id, " \
                         "origin from trade "
+SQL_SELECT_FIND_TRADE_AFTER = SQL_SELECT_FIND_TRADE + "where id_wallet = ? and (date > ? or (date = ? and id > ?)) " \
+                                                      "order by date, id"
+SQL_SELECT_FIND_TRADE_WALLET = SQL_SELECT_FIND_TRADE + "where id_wallet = ? order by date, id"
+SQL_SELECT_FIND_TRADE_ID_AFTER = SQL_SELECT_FIND_TRADE + "where id_wallet = ? and id > ? order by date, id"
+SQL_SELECT_MAX_ID = "select coalesce(max(id), 0) from trade"
+SQL_COUNT_TRADE = "select count(*) from trade"
 SQL_DELETE_TRADE = "delete from trade where id=?"
+# generation of the trades of a wallet, incremented by the writes of the trades (see TradeCache)
+SQL_SELECT_GENERATION = "select generation from trade_generation where id_wallet = ?"
+SQL_BUMP_GENERATION = "insert into trade_generation(id_wallet, generation) values(?, 1) " \
+                      "on conflict(id_wallet) do update set generation = generation + 1"
+SQL_BUMP_GENERATION_TRADE = "insert into trade_generation(id_wallet, generation) " \
+                            "select id_wallet, 1 from trade where id = ? " \
+                            "on conflict(id_wallet) do update set generation = generation + 1"
 
 SQL_SELECT_PAIRS = 'select distinct pair from trade order by pair'
+SQL_SELECT_LAST_ORIGIN_IDS = "select pair, max(cast(origin_id as integer)) from trade where id_wallet = ? and " \
+                             "origin = ? and origin_id != '' group by pair"
+# trades of an origin without origin id (ie imported from a csv export), date to the second
+SQL_SELECT_WITHOUT_ORIGIN_ID = "select id, type, qty, price, date / 1000 from trade where id_wallet = ? and " \
+                               "pair = ? and date >= ? and origin = ? and origin_id = '' order by date, id"
+# the fingerprint isn't updated : it stays the one of the trade imported, found again by a new import of the source
+SQL_UPDATE_ORIGIN_ID = "update trade set origin_id = ? where id = ?"
+SQL_SELECT_FINGERPRINTS = "select fingerprint, count(*) from trade where id_wallet = ? and fingerprint in ({}) " \
+                          "group by fingerprint"
+
+# sort columns of find : the amounts are stored as text, they are sorted as numbers
+SQL_ORDER_BY = {'id': 'id', 'pair': 'pair', 'type': 'type', 'qty': 'cast(qty as real)',
+                'price': 'cast(price as real)', 'total': 'cast(total as real)', 'date': 'date',
+                'fee': 'cast(fee as real)', 'fee_asset': 'fee_asset', 'origin_id': 'origin_id', 'origin': 'origin'}
+
+# max number of fingerprints looked up in one request (sqlite limits the number of parameters of a request)
+SQL_MAX_FINGERPRINTS = 500
 
 SQL_SELECT_INDEX_ID = 0
 SQL_SELECT_INDEX_ID_WALLET = 1
@@ -48,23 +88,21 @@ SQL_SELECT_INDEX_FEE_ASSET = 9
 SQL_SELECT_INDEX_ORIGIN_ID = 10
 SQL_SELECT_INDEX_ORIGIN = 11
 
-# indexes in CSV file from Binance for import
-BINANCE_CSV_INDEX_DATE = 0
-BINANCE_CSV_INDEX_PAIR = 1
-BINANCE_CSV_INDEX_TRADE_TYPE = 2
-BINANCE_CSV_INDEX_PRICE = 3
-BINANCE_CSV_INDEX_QTY = 4
-BINANCE_CSV_INDEX_TOTAl = 5
-BINANCE_CSV_INDEX_FEE = 6
-BINANCE_CSV_INDEX_FEE_ASSET = 7
+# max number of trades read from a CSV file at once during a streaming import
+CSV_CHUNK_SIZE = 10000
 
 # CURRENCY_LIST = ('EUR', 'USDT')
 ASSET_LIST = (
     'BTC', 'ETH', 'BNB', 'HOT', 'SXP', 'DOT', 'ADA', 'CHZ', 'SOL', 'FIL', 'EGLD', 'CAKE', 'EOS', 'PERL', 'UNI', 'XLM',
     'MANA', 'XRP', 'AVAX', 'HNT', 'DOGE', 'BTT', 'INJ', 'KAVA', 'LTC', 'LINK', 'EUR', 'USDT', 'WIN')
 
+# resolution of the pairs of the trades, exchange metadata can be loaded in it (load_exchange_info/load_symbols_file)
+SYMBOL_INDEX = SymbolIndex(ASSET_LIST)
+
 
 class Trade:
+    # no __dict__ : a large history of trades takes less memory, see also TradeBatch
+    __slots__ = ('id', 'pair', 'type', 'qty', 'price', 'total', 'date', 'fee', 'fee_asset', 'origin_id', 'origin')
 
     def __init__(self,
                  id: Optional[int],
@@ -84,7 +122,7 @@ class Trade:
         self.qty = qty
         self.price = price
         self.total = total if total else qty * price
-        self.date = date
+        self.date = to_datetime(date)
         self.fee = fee
         self.fee_asset = fee_asset
         self.origin_id = origin_id
@@ -108,6 +146,16 @@ class Trade:
         return hash((self.pair, self.qty, self.price, self.total, self.fee, self.fee_asset,
                      self.origin_id, self.origin))
 
+    def get_fingerprint(self) -> str:
+        """
+        Returns the fingerprint of the trade content : two trades equal (see __eq__) have the same fingerprint
+        Decimal values are normalized so that 100 and 100.0 give the same fingerprint
+
+        :returns: the sha1 hexadecimal digest of the trade content
+        """
+        return _get_fingerprint(self.pair, self.type, self.qty, self.price, self.total, self.date, self.fee,
+                                self.fee_asset, self.origin_id, self.origin)
+
     def validate(self):
         errors = []
         if self.id is not None and (type(self.id) is not int or self.id < 0):
@@ -142,65 +190,163 @@ class Trade:
         if errors:
             raise BusinessError(errors)
 
-    def get_assets(self):
-        buy_asset = None
-        sell_asset = None
-        for asset in ASSET_LIST:
-            if self.pair.startswith(asset):
-                buy_asset = asset
-            if self.pair.endswith(asset):
-                sell_asset = asset
-            if buy_asset and sell_asset:
-                break
-        return buy_asset, sell_asset
+    def get_assets(self) -> tuple[Optional[str], Optional[str]]:
+        return SYMBOL_INDEX.resolve(self.pair)
 
     @staticmethod
-    def filter_new_trades(id_wallet: int, trades: list['Trade']) -> list['Trade']:
+    def filter_new_trades(id_wallet: int, trades: Union[list['Trade'], 'TradeBatch'],
+                          seen: Optional[dict[str, int]] = None) -> Union[list['Trade'], 'TradeBatch']:
         """
         Returns the trades that don't already exist in the wallet among those passed in parameters
+        The trades are looked up in db by their fingerprint, the existing trades are never loaded. Identical trades
+        (same fingerprint) are legitimate fills : if the source has n identical trades and the wallet m, the n - m
+        last ones are new
         :param id_wallet: wallet's id
-        :param trades: the trades to filter
-        :return: the new trades passed for the wallet
+        :param trades: the trades to filter, a batch is read by column (see TradeBatch.fingerprints)
+        :param seen: number of trades by fingerprint read before in the same source (ie the previous chunks of a
+        file), updated with the trades
+        :return: the new trades passed for the wallet, sorted by date, in a batch if trades is a batch
         """
-
-        # get the interval of time for loading trades from db
-        # search in db all trades in the interval
-        begin_date = min(trades, key=lambda t: t.date).date
-        end_date = max(trades, key=lambda t: t.date).date
-        trades_in_db = Trade.find(id_wallet=id_wallet, begin_date=begin_date, end_date=end_date) # type: ignore
-
-        # return difference between trades set and db set
-        return sorted(list(set(trades) - set(trades_in_db)), key=lambda t: t.date)
+        if seen is None:
+            seen = {}
+        batch = trades if isinstance(trades, TradeBatch) else TradeBatch(trades)
+        indexes_by_fingerprint: dict[str, list[int]] = {}
+        for i, fingerprint in enumerate(batch.fingerprints()):
+            indexes_by_fingerprint.setdefault(fingerprint, []).append(i)
+
+        # count in db the trades of the wallet by fingerprint
+        fingerprints = list(indexes_by_fingerprint.keys())
+        fingerprints_in_db: dict[str, int] = {}
+        for i in range(0, len(fingerprints), SQL_MAX_FINGERPRINTS):
+            fingerprints_chunk = fingerprints[i:i + SQL_MAX_FINGERPRINTS]
+            cur = ConnectionDB.get_connection().execute(
+                SQL_SELECT_FINGERPRINTS.format(', '.join('?' * len(fingerprints_chunk))),
+                [id_wallet, *fingerprints_chunk])
+            fingerprints_in_db.update(cur.fetchall())
+
+        new_indexes = []
+        for fingerprint, same_indexes in indexes_by_fingerprint.items():
+            nb_seen = seen.get(fingerprint, 0)
+            nb_new = nb_seen + len(same_indexes) - max(fingerprints_in_db.get(fingerprint, 0), nb_seen)
+            if nb_new > 0:
+                new_indexes.extend(same_indexes[-nb_new:])
+            seen[fingerprint] = nb_seen + len(same_indexes)
+        new_indexes.sort(key=batch.date.__getitem__)
+        if isinstance(trades, TradeBatch):
+            return trades.take(new_indexes)
+        return [trades[i] for i in new_indexes]
 
     @staticmethod
-    def import_trades(id_wallet: int, trades: list['Trade']) -> list['Trade']:
+    def import_trades(id_wallet: int, trades: Union[list['Trade'], 'TradeBatch'],
+                      seen: Optional[dict[str, int]] = None) -> Union[list['Trade'], 'TradeBatch']:
         """
         Import only new trades passed in parameter in database
         The trades already existing are ignored
         :param id_wallet: wallet's id
-        :param trades: the trades to import
-        :return: the saved trades
+        :param trades: the trades to import, in a list or a batch
+        :param seen: number of trades by fingerprint imported before from the same source, see filter_new_trades
+        :return: the saved trades, in a batch if trades is a batch
         """
-        new_trades = Trade.filter_new_trades(id_wallet, trades)
+        new_trades = Trade.filter_new_trades(id_wallet, trades, seen)
         Trade.save_all(id_wallet, new_trades)
         return new_trades
 
     @staticmethod
-    def import_trades_from_csv_file(id_wallet: int, csv_file: str) -> list['Trade']:
+    def import_trades_from_csv_file(id_wallet: int, csv_file: str, chunk_size: int = CSV_CHUNK_SIZE,
+                                    progress: Optional[Callable[[int], Any]] = None) -> int:
         """
         Import trades from csv file
+        The file is read and imported by chunks of chunk_size trades, the trades imported are not kept in memory
 
         :param id_wallet: wallet's id
         :param csv_file: teh csh filename
+        :param chunk_size: max number of trades read from the file at once
+        :param progress: called with the number of trades read after each chunk (see moon.common.task.TaskProgress)
+        :return: the number of trades imported
         :raises FileNotFoundError: if file doesn't exist
         """
-        trades = Trade.get_trades_from_csv_file(csv_file)
-        new_trades = Trade.import_trades(id_wallet, trades)
-        return new_trades
+        nb_new_trades = 0
+        nb_trades = 0
+        seen: dict[str, int] = {}
+        for trades in TradeBatch.iter_from_csv_file(csv_file, chunk_size):
+            nb_new_trades += len(Trade.import_trades(id_wallet, trades, seen))
+            nb_trades += len(trades)
+            if progress is not None:
+                progress(nb_trades)
+        return nb_new_trades
+
+    @staticmethod
+    def import_trades_from_csv_files(id_wallet: int, csv_files: Union[str, list[str]],
+                                     chunk_size: int = CSV_CHUNK_SIZE, max_workers: Optional[int] = None) -> int:
+        """
+        Import trades from several csv files (ie an export by month or by account) in one transaction
+        The files are read in parallel (process pool), then their trades are merged in the order of their date. A trade
+        in several files (overlapping exports) is imported once : a trade is kept as many times as it is at most in one
+        file, the identical trades of a file are legitimate (see filter_new_trades)
+
+        :param id_wallet: wallet's id
+        :param csv_files: a directory (its .csv files), a glob pattern or a list of filenames
+        :param chunk_size: number of trades saved at once
+        :param max_workers: max number of processes reading the files, default is the number of processors
+        :return: the number of trades imported
+        :raises FileNotFoundError: if a file doesn't exist
+        """
+        filenames = Trade.get_csv_filenames(csv_files)
+        if len(filenames) <= 1 or max_workers == 1:
+            results = list(map(_read_csv_file_sorted, filenames))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_read_csv_file_sorted, filenames))
+
+        trades = Trade._merge_sorted_files(results)
+        nb_new_trades = 0
+        seen: dict[str, int] = {}
+        with ConnectionDB.transaction():
+            while chunk := list(itertools.islice(trades, chunk_size)):
+                nb_new_trades += len(Trade.import_trades(id_wallet, chunk, seen))
+        return nb_new_trades
+
+    @staticmethod
+    def _merge_sorted_files(results: list[tuple['TradeBatch', Counter]]) -> Iterator['Trade']:
+        """
+        k-way merge by date of the trades of the files (each sorted by date), without the trades already read in
+        another file
+        :param results: the trades of each file sorted by date and their number by fingerprint
+        """
+        # max number of a trade (fingerprint) in one file
+        max_counts: Counter[str] = Counter()
+        for _, counts in results:
+            max_counts |= counts
+        merged_counts: Counter[str] = Counter()
+        for trade in heapq.merge(*(batch for batch, _ in results), key=lambda t: t.date):
+            fingerprint = trade.get_fingerprint()
+            if merged_counts[fingerprint] < max_counts[fingerprint]:
+                merged_counts[fingerprint] += 1
+                yield trade
+
+    @staticmethod
+    def get_csv_filenames(csv_files: Union[str, list[str]]) -> list[str]:
+        """
+        Filenames of a directory (its .csv files), of a glob pattern or of a list of filenames, sorted
+        :raises FileNotFoundError: if a file doesn't exist or if the pattern doesn't match any file
+        """
+        if isinstance(csv_files, list):
+            filenames = sorted(csv_files)
+        elif os.path.isdir(csv_files):
+            filenames = sorted(glob.glob(os.path.join(glob.escape(csv_files), '*.csv')))
+        else:
+            filenames = sorted(glob.glob(csv_files))
+            if not filenames:
+                raise FileNotFoundError(csv_files)
+        for filename in filenames:
+            if not os.path.isfile(filename):
+                raise FileNotFoundError(filename)
+        return filenames
 
     @staticmethod
     def find(id_wallet: int = None, pair: str = None, trade_type: TradeType = None, begin_date: datetime = None,
-             end_date: datetime = None, origin: TradeOrigin = None) -> list['Trade']:
+             end_date: datetime = None, origin: TradeOrigin = None, order_by: str = 'date', descending: bool = False,
+             limit: Optional[int] = None, offset: int = 0) -> list['Trade']:
         """
         Find trades by criteria, if no parameters supplied then all trades are returns
 
@@ -210,42 +356,297 @@ class Trade:
         :param begin_date: begin date
         :param end_date: end date
         :param origin: origin of the trade
+        :param order_by: sort column (a key of SQL_ORDER_BY), the trades of a same value are sorted by id
+        :param descending: descending sort
+        :param limit: max number of trades returned (a page), all if None
+        :param offset: number of trades skipped (the previous pages)
         :returns: trades list accordingly to the criterias
+        :raises ValueError: if order_by isn't a sort column
         """
-        req = SQL_SELECT_FIND_TRADE
-        parameters: list[Any] = []
+        req, parameters = Trade._find_request(id_wallet, pair, trade_type, begin_date, end_date, origin, order_by,
+                                              descending, limit, offset)
+        rows = QUERY_CACHE.fetchall('trade', id_wallet, req, parameters)
+        return [Trade.__convert_row_to_trade(row) for row in rows]
 
-        # SQL request definition
-        if id_wallet or pair or trade_type or begin_date or end_date or origin:
-            req += ' where '
-        if id_wallet:
-            req += ' and id_wallet = ? ' if parameters else ' id_wallet = ? '
+    @staticmethod
+    def _find_request(id_wallet: int = None, pair: str = None, trade_type: TradeType = None,
+                      begin_date: datetime = None, end_date: datetime = None,
+                      origin: TradeOrigin = None, order_by: str = 'date', descending: bool = False,
+                      limit: Optional[int] = None, offset: int = 0,
+                      select: str = SQL_SELECT_FIND_TRADE) -> tuple[str, list[Any]]:
+        """
+        SQL request of find and its parameters
+        """
+        if order_by not in SQL_ORDER_BY:
+            raise ValueError(f"Le tri {order_by} n'est pas valide, valeurs possibles : {', '.join(SQL_ORDER_BY)}")
+        where, parameters = Trade._find_where(id_wallet, pair, trade_type, begin_date, end_date, origin)
+        direction = ' desc' if descending else ''
+        req = f'{select}{where} order by {SQL_ORDER_BY[order_by]}{direction}'
+        if order_by != 'id':
+            req += f', id{direction}'
+        if limit is not None:
+            req += ' limit ? offset ?'
+            parameters.extend((limit, offset))
+        return req, parameters
+
+    @staticmethod
+    def _find_where(id_wallet: int = None, pair: str = None, trade_type: TradeType = None,
+                    begin_date: datetime = None, end_date: datetime = None,
+                    origin: TradeOrigin = None) -> tuple[str, list[Any]]:
+        """
+        where clause of the criteria of find (empty without criteria) and its parameters
+        """
+        conditions: list[str] = []
+        parameters: list[Any] = []
+        if id_wallet is not None:
+            conditions.append('id_wallet = ?')
             parameters.append(id_wallet)
         if pair:
             if '*' in pair:
-                pair = pair.replace('*', '%')
-                req += ' and pair like ? ' if parameters else ' pair like ? '
+                conditions.append('pair like ?')
+                parameters.append(pair.replace('*', '%'))
             else:
-                req += ' and pair = ? ' if parameters else ' pair = ? '
-            parameters.append(pair)
+                conditions.append('pair = ?')
+                parameters.append(pair)
         if trade_type:
-            req += ' and type = ? ' if parameters else ' type = ? '
+            conditions.append('type = ?')
             parameters.append(trade_type.value)
         if begin_date:
-            req += ' and date >= ? ' if parameters else ' date >= ? '
-            parameters.append(begin_date)
+            conditions.append('date >= ?')
+            parameters.append(to_datetime(begin_date))
         if end_date:
-            req += ' and date <= ? ' if parameters else ' date <= ? '
-            parameters.append(end_date)
+            conditions.append('date <= ?')
+            parameters.append(to_datetime(end_date))
         if origin:
-            req += ' and origin = ? ' if parameters else ' origin = ? '
+            conditions.append('origin = ?')
             parameters.append(origin.value)
-        req += ' order by date'
+        return (' where ' + ' and '.join(conditions) if conditions else ''), parameters
 
-        ConnectionDB.get_cursor().execute(req, parameters)
-        rows = ConnectionDB.get_cursor().fetchall()
+    @staticmethod
+    def count(id_wallet: int = None, pair: str = None, trade_type: TradeType = None, begin_date: datetime = None,
+              end_date: datetime = None, origin: TradeOrigin = None) -> int:
+        """
+        Number of trades matching the criteria of find
+        """
+        where, parameters = Trade._find_where(id_wallet, pair, trade_type, begin_date, end_date, origin)
+        return QUERY_CACHE.fetchall('trade', id_wallet, SQL_COUNT_TRADE + where, parameters)[0][0]
+
+    @staticmethod
+    def find_page(id_wallet: int = None, pair: str = None, trade_type: TradeType = None, begin_date: datetime = None,
+                  end_date: datetime = None, origin: TradeOrigin = None, after: Optional[tuple[Any, int]] = None,
+                  limit: int = CSV_CHUNK_SIZE, descending: bool = False, order_by: str = 'date') -> list['Trade']:
+        """
+        Page of the trades matching the criteria of find, in the order of (order_by, id) : keyset pagination, the next
+        page starts after the last trade of the previous one, whatever the number of the pages read before
+
+        :param after: (value of order_by, id) of the last trade of the previous page, None for the first page
+        :param limit: max number of trades in the page
+        :param descending: descending sort (the most recent trades first in the order of the dates)
+        :param order_by: sort column (a key of SQL_ORDER_BY), the trades of a same value are sorted by id
+        :returns: the trades of the page
+        :raises ValueError: if order_by isn't a sort column
+        """
+        req, parameters = Trade._find_page_request(id_wallet, pair, trade_type, begin_date, end_date, origin, after,
+                                                   limit, descending, order_by)
+        rows = QUERY_CACHE.fetchall('trade', id_wallet, req, parameters)
         return [Trade.__convert_row_to_trade(row) for row in rows]
 
+    @staticmethod
+    def _find_page_request(id_wallet: int = None, pair: str = None, trade_type: TradeType = None,
+                           begin_date: datetime = None, end_date: datetime = None, origin: TradeOrigin = None,
+                           after: Optional[tuple[Any, int]] = None, limit: int = CSV_CHUNK_SIZE,
+                           descending: bool = False, order_by: str = 'date') -> tuple[str, list[Any]]:
+        """
+        SQL request of find_page and its parameters
+        """
+        if order_by not in SQL_ORDER_BY:
+            raise ValueError(f"Le tri {order_by} n'est pas valide, valeurs possibles : {', '.join(SQL_ORDER_BY)}")
+        where, parameters = Trade._find_where(id_wallet, pair, trade_type, begin_date, end_date, origin)
+        operator = '<' if descending else '>'
+        if after is not None:
+            where += ' and ' if where else ' where '
+            if order_by == 'id':
+                where += f'id {operator} ?'
+                parameters.append(after[1])
+            else:
+                where += f'({SQL_ORDER_BY[order_by]}, id) {operator} (?, ?)'
+                parameters.extend((Trade._sort_value(order_by, after[0]), after[1]))
+        direction = ' desc' if descending else ''
+        req = f'{SQL_SELECT_FIND_TRADE}{where} order by {SQL_ORDER_BY[order_by]}{direction}'
+        if order_by != 'id':
+            req += f', id{direction}'
+        return f'{req} limit ?', [*parameters, limit]
+
+    @staticmethod
+    def _sort_value(order_by: str, value: Any) -> Any:
+        """
+        Parameter of the value of a trade compared to the sort expression of order_by (see SQL_ORDER_BY)
+        """
+        if order_by == 'date':
+            return to_datetime(value)
+        if isinstance(value, Enum):
+            return value.value
+        # the amounts are sorted as real
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
+
+    @staticmethod
+    def iter_find(id_wallet: int = None, pair: str = None, trade_type: TradeType = None, begin_date: datetime = None,
+                  end_date: datetime = None, origin: TradeOrigin = None, order_by: str = 'date',
+                  descending: bool = False, chunk_size: int = CSV_CHUNK_SIZE) -> Iterator[list['Trade']]:
+        """
+        Trades matching the criteria of find, read by chunks of chunk_size trades (fetchmany) : only one chunk is in
+        memory at once
+
+        :returns: an iterator on lists of at most chunk_size Trades
+        """
+        req, parameters = Trade._find_request(id_wallet, pair, trade_type, begin_date, end_date, origin, order_by,
+                                              descending)
+        cur = ConnectionDB.get_connection().execute(req, parameters)
+        while rows := cur.fetchmany(chunk_size):
+            yield [Trade.__convert_row_to_trade(row) for row in rows]
+
+    @staticmethod
+    def iter_columns(columns: Iterable[str], id_wallet: int = None, pair: str = None, trade_type: TradeType = None,
+                     begin_date: datetime = None, end_date: datetime = None, origin: TradeOrigin = None,
+                     order_by: str = 'date', descending: bool = False,
+                     chunk_size: int = CSV_CHUNK_SIZE) -> Iterator[tuple]:
+        """
+        Values of some columns of the trades matching the criteria of find (projection), read by chunks of chunk_size
+        rows : the trades are not created, the amounts are Decimal and the dates datetime
+
+        :param columns: the columns (keys of SQL_ORDER_BY)
+        :returns: an iterator on the tuples of the values of the columns
+        :raises ValueError: if a column isn't a column of the trades
+        """
+        columns = list(columns)
+        if not columns:
+            raise ValueError("Au moins une colonne est obligatoire.")
+        unknown_columns = [column for column in columns if column not in SQL_ORDER_BY]
+        if unknown_columns:
+            raise ValueError(f"Les colonnes {', '.join(unknown_columns)} ne sont pas valides, valeurs possibles : "
+                             f"{', '.join(SQL_ORDER_BY)}")
+        req, parameters = Trade._find_request(id_wallet, pair, trade_type, begin_date, end_date, origin, order_by,
+                                              descending, select=f"select {', '.join(columns)} from trade")
+        cur = ConnectionDB.get_connection().execute(req, parameters)
+        while rows := cur.fetchmany(chunk_size):
+            yield from rows
+
+    @staticmethod
+    def find_after(id_wallet: int, date: Optional[Union[datetime, str]] = None,
+                   id_: Optional[int] = None) -> list['Trade']:
+        """
+        Find the trades of a wallet after a trade, in the order of the replay (date then id)
+
+        :param id_wallet: wallet's id
+        :param date: date of the trade, if None all the trades of the wallet are returned
+        :param id_: id of the trade
+        :returns: trades list after the trade (date, id)
+        """
+        if date is None:
+            cur = ConnectionDB.get_connection().execute(SQL_SELECT_FIND_TRADE_WALLET, (id_wallet,))
+        else:
+            date = to_datetime(date)
+            cur = ConnectionDB.get_connection().execute(SQL_SELECT_FIND_TRADE_AFTER,
+                                                        (id_wallet, date, date, id_ if id_ is not None else -1))
+        return [Trade.__convert_row_to_trade(row) for row in cur.fetchall()]
+
+    @staticmethod
+    def get_max_id() -> int:
+        """
+        Greatest id of the trades (0 if there is no trade), the trades saved after have a greater id
+        """
+        return ConnectionDB.get_connection().execute(SQL_SELECT_MAX_ID).fetchone()[0]
+
+    @staticmethod
+    def get_last_origin_ids(id_wallet: int, origin: TradeOrigin = TradeOrigin.BINANCE) -> dict[str, int]:
+        """
+        Greatest origin id (the trade id of the exchange) of the trades of a wallet by pair
+        :param id_wallet: wallet's id
+        :param origin: origin of the trades
+        :return: {pair: last origin id}, the pairs without trade of the origin are missing
+        """
+        rows = ConnectionDB.get_connection().execute(SQL_SELECT_LAST_ORIGIN_IDS, (id_wallet, origin.value)).fetchall()
+        return dict(rows)
+
+    @staticmethod
+    def link_origin_ids(id_wallet: int, trades: list['Trade']) -> list['Trade']:
+        """
+        Set the origin id of the trades of the wallet saved without it (ie imported from a csv export of the exchange)
+        that are the same fills as trades of the exchange : same pair, type, qty, price and date to the second (the
+        csv exports have no milliseconds). Each trade of the wallet is linked to one trade at most
+        :param id_wallet: wallet's id
+        :param trades: the trades of the exchange with their origin id
+        :return: the trades not linked to a trade of the wallet
+        """
+        trades_by_pair: dict[str, list[Trade]] = {}
+        for trade in trades:
+            trades_by_pair.setdefault(trade.pair, []).append(trade)
+
+        not_linked: list[Trade] = []
+        update_parameters: list[tuple[str, int]] = []
+        for pair, pair_trades in trades_by_pair.items():
+            begin_date = min(trade.date for trade in pair_trades).replace(microsecond=0)
+            ids: dict[tuple, list[int]] = {}
+            for id_, type_, qty, price, second in ConnectionDB.get_connection().execute(
+                    SQL_SELECT_WITHOUT_ORIGIN_ID, (id_wallet, pair, begin_date, pair_trades[0].origin.value)):
+                ids.setdefault((type_, qty, price, second), []).append(id_)
+            for trade in pair_trades:
+                same_ids = ids.get((trade.type.value, trade.qty, trade.price, to_epoch_ms(trade.date) // 1000))
+                if same_ids:
+                    update_parameters.append((trade.origin_id, same_ids.pop(0)))
+                else:
+                    not_linked.append(trade)
+
+        if update_parameters:
+            Trade._bump_generation(id_wallet, [id_ for _, id_ in update_parameters])
+            cur = ConnectionDB.get_connection().executemany(SQL_UPDATE_ORIGIN_ID, update_parameters)
+            ConnectionDB.count_writes('trade', cur.rowcount)
+        return not_linked
+
+    @staticmethod
+    def get_generation(id_wallet: int) -> int:
+        """
+        Generation of the trades of a wallet : it changes with each write of the trades of the wallet
+        """
+        row = ConnectionDB.get_connection().execute(SQL_SELECT_GENERATION, (id_wallet,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _bump_generation(id_wallet: Optional[int], ids: list[int]) -> None:
+        """
+        Change the generation of the wallet and of the wallets of the trades ids (as stored in db)
+        Must be called before the trades are updated or deleted
+        The results of the queries cached are invalidated : of the wallet, of all the wallets if trades are updated or
+        deleted (their wallet isn't read)
+        """
+        if id_wallet is not None:
+            QUERY_CACHE.invalidate('trade', id_wallet)
+        if ids:
+            QUERY_CACHE.invalidate('trade')
+        conn = ConnectionDB.get_connection()
+        conn.executemany(SQL_BUMP_GENERATION_TRADE, [(id_,) for id_ in ids])
+        if id_wallet is not None:
+            conn.execute(SQL_BUMP_GENERATION, (id_wallet,))
+
+    @staticmethod
+    def iter_trades_after_id(id_wallet: int, id_: int, chunk_size: int = CSV_CHUNK_SIZE) -> Iterator[list['Trade']]:
+        """
+        Trades of a wallet with an id greater than id_ (ie saved after the trade id_), in the order of the replay (date
+        then id), read by chunks of chunk_size trades
+
+        :param id_wallet: wallet's id
+        :param id_: trade id
+        :param chunk_size: max number of trades in a chunk
+        :returns: an iterator on lists of at most chunk_size Trades
+        """
+        cur = ConnectionDB.get_connection().execute(SQL_SELECT_FIND_TRADE_ID_AFTER, (id_wallet, id_))
+        rows = cur.fetchmany(chunk_size)
+        while rows:
+            yield [Trade.__convert_row_to_trade(row) for row in rows]
+            rows = cur.fetchmany(chunk_size)
+
     @staticmethod
     def read(id_: int) -> 'Trade':
         """
@@ -255,8 +656,7 @@ class Trade:
         :returns: the found trade
         :raises EntityNotFoundError: if no trade found
         """
-        ConnectionDB.get_cursor().execute(SQL_SELECT_READ_TRADE, (id_,))
-        row = ConnectionDB.get_cursor().fetchone()
+        row = ConnectionDB.get_connection().execute(SQL_SELECT_READ_TRADE, (id_,)).fetchone()
         if row is None:
             raise EntityNotFoundError(id_)
         t = Trade.__convert_row_to_trade(row)
@@ -267,11 +667,11 @@ class Trade:
         return Trade(row[SQL_SELECT_INDEX_ID],
                      row[SQL_SELECT_INDEX_PAIR],
                      TradeType(row[SQL_SELECT_INDEX_TYPE]),
-                     Decimal(str(row[SQL_SELECT_INDEX_QTY])),
-                     Decimal(str(row[SQL_SELECT_INDEX_PRICE])),
-                     Decimal(str(row[SQL_SELECT_INDEX_TOTAL])),
-                     datetime.strptime(row[SQL_SELECT_INDEX_DATE], '%Y-%m-%d %H:%M:%S'),
-                     Decimal(str(row[SQL_SELECT_INDEX_FEE])),
+                     row[SQL_SELECT_INDEX_QTY],
+                     row[SQL_SELECT_INDEX_PRICE],
+                     row[SQL_SELECT_INDEX_TOTAL],
+                     row[SQL_SELECT_INDEX_DATE],
+                     row[SQL_SELECT_INDEX_FEE],
                      row[SQL_SELECT_INDEX_FEE_ASSET],
                      row[SQL_SELECT_INDEX_ORIGIN_ID],
                      TradeOrigin(row[SQL_SELECT_INDEX_ORIGIN]))
@@ -279,61 +679,71 @@ class Trade:
     def save(self, id_wallet: int) -> None:
         """
         Save or update a trade (insert or update in db)
+        The checkpoint of the wallet is invalidated if the trade is not after it
 
         :returns: the saved trade with its id
         """
+        Checkpoint.invalidate(id_wallet, self.date)
+        Trade._bump_generation(id_wallet, [self.id] if self.id is not None else [])
         # update in db
         if self.id is not None:
-            ConnectionDB.get_cursor().execute(SQL_UPDATE_TRADE,
-                                              (id_wallet, self.pair, self.type.value, float(self.qty),
-                                               float(self.price), float(self.total), self.date,
-                                               float(self.fee),
-                                               self.fee_asset,
-                                               self.origin_id, self.origin.value, self.id))
+            Checkpoint.invalidate_trades([self.id])
+            ConnectionDB.get_connection().execute(SQL_UPDATE_TRADE,
+                                                  (id_wallet, self.pair, self.type.value, self.qty,
+                                                   self.price, self.total, self.date,
+                                                   self.fee,
+                                                   self.fee_asset,
+                                                   self.origin_id, self.origin.value, self.get_fingerprint(), self.id))
         # insert in db
         else:
-            cur = ConnectionDB.get_cursor().execute(SQL_INSERT_TRADE,
-                                                    (id_wallet, self.pair, self.type.value, float(self.qty),
-                                                     float(self.price), float(self.total), self.date,
-                                                     float(self.fee),
-                                                     self.fee_asset,
-                                                     self.origin_id, self.origin.value))
+            cur = ConnectionDB.get_connection().execute(SQL_INSERT_TRADE,
+                                                        (id_wallet, self.pair, self.type.value, self.qty,
+                                                         self.price, self.total, self.date,
+                                                         self.fee,
+                                                         self.fee_asset,
+                                                         self.origin_id, self.origin.value, self.get_fingerprint()))
             self.id = cur.lastrowid
 
     @staticmethod
-    def save_all(id_wallet: int, trades: list['Trade']) -> None:
+    def save_all(id_wallet: int, trades: Union[list['Trade'], 'TradeBatch']) -> None:
         """
         Save all trades passed i parameter (update or insert in db)
+        The checkpoint of the wallet is invalidated if one of the trades is not after it
 
-        :param trades: trades lsit
-        """
-        # transform original list to get the values of the enums (type and origin)
-        update_trades = [trade for trade in trades if trade.id is not None]
-        update_trades = list(map(lambda trade: (id_wallet, trade.pair, trade.type.value, float(trade.qty), # type: ignore
-                                                float(trade.price), float(trade.total), trade.date,
-                                                float(trade.fee),
-                                                trade.fee_asset,
-                                                trade.origin_id,
-                                                trade.origin.value, trade.id), update_trades))
-        ConnectionDB.get_cursor().executemany(SQL_UPDATE_TRADE, update_trades)
-
-        insert_trades = [trade for trade in trades if trade.id is None]
-        insert_trades = list(map(lambda trade: (id_wallet, trade.pair, trade.type.value, float(trade.qty), # type: ignore
-                                                float(trade.price), float(trade.total), trade.date,
-                                                float(trade.fee),
-                                                trade.fee_asset,
-                                                trade.origin_id,
-                                                trade.origin.value), insert_trades))
-        ConnectionDB.get_cursor().executemany(SQL_INSERT_TRADE, insert_trades)
+        :param trades: trades lsit or batch, a batch is read by column
+        """
+        batch = trades if isinstance(trades, TradeBatch) else TradeBatch(trades)
+        update_ids = [id_trade for id_trade in batch.id if id_trade is not None]
+        if len(batch):
+            Checkpoint.invalidate(id_wallet, min(batch.date))
+        Checkpoint.invalidate_trades(update_ids)
+        if len(batch):
+            Trade._bump_generation(id_wallet, update_ids)
+
+        # the values of the enums (type and origin) and the id last (where clause of the update)
+        parameters = list(zip(itertools.repeat(id_wallet), batch.pair, [trade_type.value for trade_type in batch.type],
+                              batch.qty, batch.price, batch.total, batch.date, batch.fee, batch.fee_asset,
+                              batch.origin_id, [origin.value for origin in batch.origin], batch.fingerprints(),
+                              batch.id))
+        update_parameters = [values for values in parameters if values[-1] is not None]
+        cur = ConnectionDB.get_connection().executemany(SQL_UPDATE_TRADE, update_parameters)
+        ConnectionDB.count_writes('trade', cur.rowcount)
+
+        insert_parameters = [values[:-1] for values in parameters if values[-1] is None]
+        cur = ConnectionDB.get_connection().executemany(SQL_INSERT_TRADE, insert_parameters)
+        ConnectionDB.count_writes('trade', cur.rowcount)
 
         ConnectionDB.commit()
 
     def delete(self) -> None:
         """
         Delete trade
+        The checkpoint of the wallet is invalidated if the trade was applied on it
         """
         Trade.read(self.id) # type: ignore
-        ConnectionDB.get_cursor().execute(SQL_DELETE_TRADE, (self.id,))
+        Checkpoint.invalidate_trades([self.id])  # type: ignore
+        Trade._bump_generation(None, [self.id])  # type: ignore
+        ConnectionDB.get_connection().execute(SQL_DELETE_TRADE, (self.id,))
         ConnectionDB.commit()
 
     @staticmethod
@@ -343,35 +753,195 @@ class Trade:
 
         :returns: pairs
         """
-        ConnectionDB.get_cursor().execute(SQL_SELECT_PAIRS)
-        pairs = ConnectionDB.get_cursor().fetchall()
-        # transform list of tuples in list of str value
-        pairs = {pair[0] for pair in pairs}
+        rows = QUERY_CACHE.fetchall('trade', None, SQL_SELECT_PAIRS)
+        # transform list of tuples in set of str value
+        pairs: set[str] = {row[0] for row in rows}
         return pairs
 
     @staticmethod
     def get_trades_from_csv_file(filename: str) -> list['Trade']:
         """
-        Read trades from csv file (with ';' delimiter) and return them
+        Read trades from csv file and return them
 
         :param filename: filename of the csv file with path (ie /home/patrick/Documents/Finances/binance-export-trades1.csv)
         :returns: a list of Trades
         :raises FileNotFoundError: if the file doesn't exist
         """
-        # loop on csv row and create a trade object for each and add it to the trades list
-        trades = []
-        with open(filename) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=';')
-            for row in csv_reader:
-                trades.append(Trade(None, row[BINANCE_CSV_INDEX_PAIR],
-                                    TradeType.BUY if row[BINANCE_CSV_INDEX_TRADE_TYPE] == 'BUY' else TradeType.SELL,
-                                    Decimal(row[BINANCE_CSV_INDEX_QTY]),
-                                    Decimal(row[BINANCE_CSV_INDEX_PRICE]),
-                                    Decimal(row[BINANCE_CSV_INDEX_TOTAl]),
-                                    row[BINANCE_CSV_INDEX_DATE],
-                                    Decimal(row[BINANCE_CSV_INDEX_FEE]),
-                                    row[BINANCE_CSV_INDEX_FEE_ASSET],
-                                    '',
-                                    TradeOrigin.BINANCE))
-
-        return trades
+        return [trade for trades in Trade.iter_trades_from_csv_file(filename) for trade in trades]
+
+    @staticmethod
+    def iter_trades_from_csv_file(filename: str, chunk_size: int = CSV_CHUNK_SIZE) -> Iterator['TradeBatch']:
+        """
+        Read trades from csv file and yield them by chunks, so that only one chunk of the file
+        is in memory at once
+        The chunks are the batches read (see TradeBatch.iter_from_csv_file), a Trade is only created when a trade of a
+        chunk is accessed
+
+        :param filename: filename of the csv file with path
+        :param chunk_size: max number of trades in a chunk
+        :returns: an iterator on batches of at most chunk_size trades, in the order of the file
+        :raises FileNotFoundError: if the file doesn't exist
+        """
+        return TradeBatch.iter_from_csv_file(filename, chunk_size)
+
+
+class TradeBatch:
+    """
+    Trades stored by column (struct of arrays) : a batch of n trades is a list of n values by attribute of Trade instead
+    of n Trade objects, the pairs and assets strings are shared by the trades
+    A Trade is only created when a trade of the batch is accessed (batch[i] or iteration), Wallet.import_trades and
+    Wallet._apply_trades read the columns directly
+    """
+    COLUMNS = Trade.__slots__
+    __slots__ = COLUMNS
+    id: list[Optional[int]]
+    pair: list[str]
+    type: list[TradeType]
+    qty: list[Decimal]
+    price: list[Decimal]
+    total: list[Decimal]
+    date: list[datetime]
+    fee: list[Decimal]
+    fee_asset: list[str]
+    origin_id: list[str]
+    origin: list[TradeOrigin]
+
+    def __init__(self, trades: Optional[Iterable[Trade]] = None):
+        """
+        TradeBatch constructor
+        :param trades: the trades of the batch
+        """
+        for column in TradeBatch.COLUMNS:
+            setattr(self, column, [])
+        if trades:
+            for trade in trades:
+                self.append(trade)
+
+    def __repr__(self):
+        return f"TradeBatch({list(self)!r})"
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, i: int) -> Trade:
+        return Trade(*(getattr(self, column)[i] for column in TradeBatch.COLUMNS))
+
+    def __iter__(self) -> Iterator[Trade]:
+        return (Trade(*values) for values in zip(*(getattr(self, column) for column in TradeBatch.COLUMNS)))
+
+    def __eq__(self, other):
+        if not isinstance(other, TradeBatch):
+            return False
+        return list(self) == list(other)
+
+    def append(self, trade: Trade) -> None:
+        for column in TradeBatch.COLUMNS:
+            getattr(self, column).append(getattr(trade, column))
+
+    def extend(self, other: 'TradeBatch') -> None:
+        for column in TradeBatch.COLUMNS:
+            getattr(self, column).extend(getattr(other, column))
+
+    def take(self, indexes: Iterable[int]) -> 'TradeBatch':
+        """
+        Batch of the trades of the indexes, in the order of the indexes
+        """
+        indexes = list(indexes)
+        batch = TradeBatch()
+        for column in TradeBatch.COLUMNS:
+            values = getattr(self, column)
+            setattr(batch, column, [values[i] for i in indexes])
+        return batch
+
+    def fingerprints(self) -> list[str]:
+        """
+        Fingerprints of the trades of the batch (see Trade.get_fingerprint), read from the columns
+        """
+        return list(map(_get_fingerprint, self.pair, self.type, self.qty, self.price, self.total, self.date, self.fee,
+                        self.fee_asset, self.origin_id, self.origin))
+
+    @staticmethod
+    def find(id_wallet: int = None, pair: str = None, trade_type: TradeType = None, begin_date: datetime = None,
+             end_date: datetime = None, origin: TradeOrigin = None, order_by: str = 'date', descending: bool = False,
+             limit: Optional[int] = None, offset: int = 0) -> 'TradeBatch':
+        """
+        Find trades by criteria as Trade.find, in a batch
+        """
+        req, parameters = Trade._find_request(id_wallet, pair, trade_type, begin_date, end_date, origin, order_by,
+                                              descending, limit, offset)
+        return TradeBatch.from_rows(QUERY_CACHE.fetchall('trade', id_wallet, req, parameters))
+
+    @staticmethod
+    def find_page(id_wallet: int = None, pair: str = None, trade_type: TradeType = None, begin_date: datetime = None,
+                  end_date: datetime = None, origin: TradeOrigin = None, after: Optional[tuple[Any, int]] = None,
+                  limit: int = CSV_CHUNK_SIZE, descending: bool = False, order_by: str = 'date') -> 'TradeBatch':
+        """
+        Page of the trades matching the criteria of find as Trade.find_page, in a batch
+        """
+        req, parameters = Trade._find_page_request(id_wallet, pair, trade_type, begin_date, end_date, origin, after,
+                                                   limit, descending, order_by)
+        return TradeBatch.from_rows(QUERY_CACHE.fetchall('trade', id_wallet, req, parameters))
+
+    @staticmethod
+    def from_rows(rows: list[tuple]) -> 'TradeBatch':
+        """
+        Batch of the trade rows read in db (as SQL_SELECT_FIND_TRADE)
+        """
+        batch = TradeBatch()
+        if not rows:
+            return batch
+        columns = list(zip(*rows))
+        batch.id = list(columns[SQL_SELECT_INDEX_ID])
+        batch.pair = list(map(sys.intern, columns[SQL_SELECT_INDEX_PAIR]))
+        batch.type = list(map(TradeType, columns[SQL_SELECT_INDEX_TYPE]))
+        batch.qty = list(columns[SQL_SELECT_INDEX_QTY])
+        batch.price = list(columns[SQL_SELECT_INDEX_PRICE])
+        batch.total = list(columns[SQL_SELECT_INDEX_TOTAL])
+        batch.date = list(columns[SQL_SELECT_INDEX_DATE])
+        batch.fee = list(columns[SQL_SELECT_INDEX_FEE])
+        batch.fee_asset = [sys.intern(fee_asset) if fee_asset else fee_asset
+                           for fee_asset in columns[SQL_SELECT_INDEX_FEE_ASSET]]
+        batch.origin_id = list(columns[SQL_SELECT_INDEX_ORIGIN_ID])
+        batch.origin = list(map(TradeOrigin, columns[SQL_SELECT_INDEX_ORIGIN]))
+        return batch
+
+    @staticmethod
+    def iter_from_csv_file(filename: str, chunk_size: int = CSV_CHUNK_SIZE,
+                           parser: str = 'vectorized') -> Iterator['TradeBatch']:
+        """
+        Read trades from csv file and yield them by batches of chunk_size trades
+        The format of the file (moon or Binance export, delimiter) is detected, see moon.model.trade_csv
+
+        :param filename: filename of the csv file with path
+        :param chunk_size: max number of trades in a batch
+        :param parser: name of the parser (see moon.model.trade_csv.CSV_PARSERS)
+        :returns: an iterator on batches of at most chunk_size trades, in the order of the file
+        :raises FileNotFoundError: if the file doesn't exist
+        :raises BusinessError: if the format of the file isn't known
+        """
+        # imported here : trade_csv depends on this module
+        from moon.model.trade_csv import iter_csv_file
+        return iter_csv_file(filename, chunk_size, parser)
+
+
+def _read_csv_file_sorted(filename: str) -> tuple[TradeBatch, Counter]:
+    """
+    Read a csv file in a worker process of Trade.import_trades_from_csv_files (a module function to be picklable)
+    :return: the trades of the file sorted by date and their number by fingerprint
+    """
+    batch = TradeBatch()
+    for trades in TradeBatch.iter_from_csv_file(filename):
+        batch.extend(trades)
+    batch = batch.take(sorted(range(len(batch)), key=batch.date.__getitem__))
+    return batch, Counter(batch.fingerprints())
+
+
+def _get_fingerprint(pair: str, trade_type: TradeType, qty: Decimal, price: Decimal, total: Decimal, date: datetime,
+                     fee: Decimal, fee_asset: str, origin_id: str, origin: TradeOrigin) -> str:
+    """
+    Fingerprint of the content of a trade, see Trade.get_fingerprint
+    """
+    content = '|'.join((pair, trade_type.value, format(qty.normalize(), 'f'), format(price.normalize(), 'f'),
+                        format(total.normalize(), 'f'), str(date), format(fee.normalize(), 'f'), fee_asset, origin_id,
+                        origin.value))
+    return hashlib.sha1(content.encode()).hexdigest()
@@ -0,0 +1,217 @@
+import fnmatch
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterator, Optional, Union
+
+import numpy as np
+
+from moon.db.db import ConnectionDB, from_epoch_ms, to_datetime, to_epoch_ms
+from moon.model.trade import CSV_CHUNK_SIZE, SQL_SELECT_FIND_TRADE_WALLET, SQL_SELECT_INDEX_DATE, SQL_SELECT_INDEX_FEE, \
+    SQL_SELECT_INDEX_FEE_ASSET, SQL_SELECT_INDEX_ID, SQL_SELECT_INDEX_ORIGIN, SQL_SELECT_INDEX_ORIGIN_ID, \
+    SQL_SELECT_INDEX_PAIR, SQL_SELECT_INDEX_PRICE, SQL_SELECT_INDEX_QTY, SQL_SELECT_INDEX_TOTAL, \
+    SQL_SELECT_INDEX_TYPE, Trade, TradeBatch, TradeOrigin, TradeType
+
+META_FILE = 'meta.json'
+
+# the amounts are stored as exact text in fixed width byte strings
+AMOUNT_COLUMNS = ('qty', 'price', 'total', 'fee')
+# the strings shared by the trades are dictionary encoded : the codes (index in the dictionary) are stored
+DICTIONARY_COLUMNS = ('pair', 'fee_asset')
+# the strings of each trade (origin_id) are stored utf-8 encoded in fixed width byte strings
+TEXT_COLUMNS = ('origin_id',)
+TRADE_TYPES = list(TradeType)
+TRADE_ORIGINS = list(TradeOrigin)
+
+
+class CachedTrades:
+    """
+    Trades of a wallet loaded from the cache : the columns are numpy arrays memory mapped on the cache files (no copy),
+    in the order of the replay (date then id)
+    id and date (epoch milliseconds) are int64, the amounts are their exact text (float_column to compute on them),
+    type and origin are codes of TRADE_TYPES and TRADE_ORIGINS, pair and fee_asset are codes of their dictionaries,
+    origin_id is its text
+    """
+
+    def __init__(self, db_identity: str, generation: int, columns: dict[str, np.ndarray],
+                 dictionaries: dict[str, list[str]]):
+        self.db_identity = db_identity
+        self.generation = generation
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def float_column(self, column: str) -> np.ndarray:
+        """
+        Values of an amount column as float64 (for the vectorized computations)
+        """
+        return self.columns[column].astype(np.float64)
+
+    def select(self, pair: Optional[str] = None, trade_type: Optional[TradeType] = None,
+               begin_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> np.ndarray:
+        """
+        Indexes of the trades matching the criteria (as Trade.find, pair can have * wildcards)
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if pair:
+            codes = [i for i, value in enumerate(self.dictionaries['pair']) if fnmatch.fnmatchcase(value, pair)]
+            mask &= np.isin(self.columns['pair'], codes)
+        if trade_type:
+            mask &= self.columns['type'] == TRADE_TYPES.index(trade_type)
+        if begin_date:
+            mask &= self.columns['date'] >= to_epoch_ms(to_datetime(begin_date))
+        if end_date:
+            mask &= self.columns['date'] <= to_epoch_ms(to_datetime(end_date))
+        return np.flatnonzero(mask)
+
+    def index_after(self, date: Optional[datetime] = None, id_: Optional[int] = None) -> int:
+        """
+        Index of the first trade after a trade (date, id) in the order of the replay, found by binary search on the
+        date and id columns (nothing is copied)
+        :param date: date of the trade, None for the first trade
+        :param id_: id of the trade
+        """
+        if date is None:
+            return 0
+        date_ms = to_epoch_ms(to_datetime(date))
+        dates = self.columns['date']
+        begin = int(np.searchsorted(dates, date_ms, side='left'))
+        end = int(np.searchsorted(dates, date_ms, side='right'))
+        ids = self.columns['id'][begin:end]
+        return begin + int(np.searchsorted(ids, id_ if id_ is not None else -1, side='right'))
+
+    def to_batch(self, indexes: Optional[Union[np.ndarray, slice]] = None) -> TradeBatch:
+        """
+        Trades (all or the indexes ones) in a TradeBatch
+        The values of these trades only are decoded (amounts as Decimal, dates as datetime), the columns of the others
+        trades are not read
+        """
+        columns = self.columns if indexes is None else {name: column[indexes] for name, column in self.columns.items()}
+        batch = TradeBatch()
+        batch.id = columns['id'].tolist()
+        batch.type = [TRADE_TYPES[code] for code in columns['type'].tolist()]
+        batch.date = [from_epoch_ms(date) for date in columns['date'].tolist()]
+        batch.origin = [TRADE_ORIGINS[code] for code in columns['origin'].tolist()]
+        for name in AMOUNT_COLUMNS:
+            setattr(batch, name, [Decimal(value.decode()) for value in columns[name].tolist()])
+        for name in DICTIONARY_COLUMNS:
+            dictionary = self.dictionaries[name]
+            setattr(batch, name, [dictionary[code] for code in columns[name].tolist()])
+        for name in TEXT_COLUMNS:
+            setattr(batch, name, [value.decode() for value in columns[name].tolist()])
+        return batch
+
+
+class TradeCache:
+    """
+    Columnar cache of the trades of the wallets on disk, a directory by wallet with a .npy file by column
+    The cache of a wallet is stamped with the identity of the db (see ConnectionDB.get_identity) and the generation of
+    its trades (see Trade.get_generation) : it is rebuilt from the db when a trade of the wallet has been written since
+    or when the cache has been built from another db
+    """
+
+    def __init__(self, cache_dir: str):
+        """
+        TradeCache constructor
+        :param cache_dir: directory of the cache
+        """
+        self.cache_dir = cache_dir
+
+    def _wallet_dir(self, id_wallet: int) -> str:
+        return os.path.join(self.cache_dir, f"wallet-{id_wallet}")
+
+    def load(self, id_wallet: int) -> CachedTrades:
+        """
+        Trades of a wallet, the cache is (re)built if it doesn't exist, if it has been built from another db or if the
+        trades have been written since
+        :param id_wallet: wallet id
+        :return: the trades memory mapped
+        """
+        db_identity = ConnectionDB.get_identity()
+        generation = Trade.get_generation(id_wallet)
+        cached_trades = self._read(id_wallet)
+        if cached_trades is None or cached_trades.db_identity != db_identity or cached_trades.generation != generation:
+            cached_trades = self._write(id_wallet, db_identity, generation)
+        return cached_trades
+
+    def find(self, id_wallet: int, pair: Optional[str] = None, trade_type: Optional[TradeType] = None,
+             begin_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> TradeBatch:
+        """
+        Find the trades of a wallet by criteria in the cache, as Trade.find
+        """
+        cached_trades = self.load(id_wallet)
+        return cached_trades.to_batch(cached_trades.select(pair, trade_type, begin_date, end_date))
+
+    def iter_after(self, id_wallet: int, date: Optional[datetime] = None, id_: Optional[int] = None,
+                   chunk_size: int = CSV_CHUNK_SIZE) -> Iterator[TradeBatch]:
+        """
+        Trades of a wallet after a trade (date, id) in the order of the replay, as Trade.find_after, decoded by chunks
+        of chunk_size trades
+        :param id_wallet: wallet id
+        :param date: date of the trade, if None all the trades of the wallet are returned
+        :param id_: id of the trade
+        :return: an iterator on the batches of at most chunk_size trades
+        """
+        cached_trades = self.load(id_wallet)
+        for begin in range(cached_trades.index_after(date, id_), len(cached_trades), chunk_size):
+            yield cached_trades.to_batch(slice(begin, begin + chunk_size))
+
+    def invalidate(self, id_wallet: int) -> None:
+        shutil.rmtree(self._wallet_dir(id_wallet), ignore_errors=True)
+
+    def _read(self, id_wallet: int) -> Optional[CachedTrades]:
+        wallet_dir = self._wallet_dir(id_wallet)
+        try:
+            with open(os.path.join(wallet_dir, META_FILE), 'r') as f:
+                meta = json.load(f)
+            columns = {name: np.load(os.path.join(wallet_dir, f"{name}.npy"), mmap_mode='r')
+                       for name in meta['columns']}
+            return CachedTrades(meta['db_identity'], meta['generation'], columns, meta['dictionaries'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, id_wallet: int, db_identity: str, generation: int) -> CachedTrades:
+        """
+        Write the cache of the wallet from the db, in a temporary directory which replaces the previous cache
+        :return: the trades of the cache written, memory mapped, or the trades read from the db in memory if the cache
+        can't be read back (ie replaced meanwhile by another process)
+        """
+        rows = ConnectionDB.get_connection().execute(SQL_SELECT_FIND_TRADE_WALLET, (id_wallet,)).fetchall()
+        values = list(zip(*rows)) if rows else [()] * (SQL_SELECT_INDEX_ORIGIN + 1)
+        columns: dict[str, np.ndarray] = {
+            'id': np.array(values[SQL_SELECT_INDEX_ID], dtype=np.int64),
+            'type': np.array([TRADE_TYPES.index(TradeType(value)) for value in values[SQL_SELECT_INDEX_TYPE]],
+                             dtype=np.uint8),
+            'date': np.array([to_epoch_ms(date) for date in values[SQL_SELECT_INDEX_DATE]], dtype=np.int64),
+            'origin': np.array([TRADE_ORIGINS.index(TradeOrigin(value)) for value in values[SQL_SELECT_INDEX_ORIGIN]],
+                               dtype=np.uint8),
+        }
+        for name, index in zip(AMOUNT_COLUMNS, (SQL_SELECT_INDEX_QTY, SQL_SELECT_INDEX_PRICE, SQL_SELECT_INDEX_TOTAL,
+                                                SQL_SELECT_INDEX_FEE)):
+            columns[name] = np.array([str(value).encode() for value in values[index]], dtype=np.bytes_)
+        dictionaries: dict[str, list[str]] = {}
+        for name, index in zip(DICTIONARY_COLUMNS, (SQL_SELECT_INDEX_PAIR, SQL_SELECT_INDEX_FEE_ASSET)):
+            codes: dict[str, int] = {}
+            columns[name] = np.array([codes.setdefault(value, len(codes)) for value in values[index]], dtype=np.int32)
+            dictionaries[name] = list(codes)
+        for name, index in zip(TEXT_COLUMNS, (SQL_SELECT_INDEX_ORIGIN_ID,)):
+            columns[name] = np.array([value.encode() for value in values[index]], dtype=np.bytes_)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        for name, column in columns.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), column)
+        with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+            json.dump({'db_identity': db_identity, 'generation': generation, 'columns': list(columns),
+                       'dictionaries': dictionaries}, f)
+        self.invalidate(id_wallet)
+        os.replace(tmp_dir, self._wallet_dir(id_wallet))
+        cached_trades = self._read(id_wallet)
+        if cached_trades is None:
+            return CachedTrades(db_identity, generation, columns, dictionaries)
+        return cached_trades
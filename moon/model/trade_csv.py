@@ -0,0 +1,245 @@
+"""
+Parsing of the csv files of trades
+
+The format of a file is detected from its first line (see detect_csv_format) : the delimiter and, for the Binance
+exports, the header which gives the column of each field of the trades. The files without header are the moon format
+(date;pair;type;price;qty;total;fee;fee_asset).
+
+The rows are parsed by chunks in a TradeBatch by a parser of CSV_PARSERS :
+- rows : row by row with csv.reader
+- vectorized : column by column, the lines of a chunk are split then each column is converted at once (map of the
+  converter on the column), the amounts stay exact Decimal
+"""
+import csv
+import itertools
+import re
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Iterator, Optional
+
+from moon.exceptions.exceptions import BusinessError, Error
+from moon.model.trade import CSV_CHUNK_SIZE, SYMBOL_INDEX, TradeBatch, TradeOrigin, TradeType
+
+# fields of the trades read in a csv file, in the order of the moon format
+CSV_FIELDS = ('date', 'pair', 'type', 'price', 'qty', 'total', 'fee', 'fee_asset')
+CSV_DELIMITERS = (';', ',', '\t')
+
+# amount with its asset as suffix (ie 0.5BTC)
+AMOUNT_UNIT_PATTERN = re.compile(r'([0-9.,]+)(.*)')
+
+
+@dataclass(frozen=True)
+class CsvFormat:
+    """
+    Format of a csv file of trades : the column (name in the header) of each field of CSV_FIELDS, None if the file
+    hasn't the field (the total is then qty * price, the fee is 0)
+    """
+    name: str
+    header: tuple[str, ...]
+    fields: tuple[Optional[str], ...]
+    has_header: bool = True
+    # the amounts have their asset as suffix (ie 0.5BTC)
+    units: bool = False
+    # the rows are orders : those not filled (qty 0) are ignored
+    orders: bool = False
+
+    def indexes(self, header: tuple[str, ...]) -> dict[str, Optional[int]]:
+        """
+        Index of each field in the columns of the file
+        :param header: the header of the file
+        """
+        return {field: header.index(column) if column else None for field, column in zip(CSV_FIELDS, self.fields)}
+
+
+MOON_CSV_FORMAT = CsvFormat('moon', CSV_FIELDS, CSV_FIELDS, has_header=False)
+BINANCE_TRADE_HISTORY_FORMAT = CsvFormat(
+    'binance-trade-history',
+    ('Date(UTC)', 'Market', 'Type', 'Price', 'Amount', 'Total', 'Fee', 'Fee Coin'),
+    ('Date(UTC)', 'Market', 'Type', 'Price', 'Amount', 'Total', 'Fee', 'Fee Coin'))
+# newer export : the quantities and the fee have their asset as suffix, the fee asset is the suffix of the fee
+BINANCE_TRADE_HISTORY_UNITS_FORMAT = CsvFormat(
+    'binance-trade-history-units',
+    ('Date(UTC)', 'Pair', 'Side', 'Price', 'Executed', 'Amount', 'Fee'),
+    ('Date(UTC)', 'Pair', 'Side', 'Price', 'Executed', 'Amount', 'Fee', None),
+    units=True)
+# the orders : the filled quantity at the average price, without fee, the orders not filled are ignored
+BINANCE_ORDER_HISTORY_FORMAT = CsvFormat(
+    'binance-order-history',
+    ('Date(UTC)', 'Pair', 'Type', 'Order Price', 'Order Amount', 'AvgTrading Price', 'Filled', 'Total', 'status'),
+    ('Date(UTC)', 'Pair', 'Type', 'AvgTrading Price', 'Filled', 'Total', None, None),
+    orders=True)
+
+CSV_FORMATS = {csv_format.name: csv_format for csv_format in (
+    MOON_CSV_FORMAT, BINANCE_TRADE_HISTORY_FORMAT, BINANCE_TRADE_HISTORY_UNITS_FORMAT, BINANCE_ORDER_HISTORY_FORMAT)}
+
+
+def detect_csv_format(line: str) -> tuple[CsvFormat, str, tuple[str, ...]]:
+    """
+    Detect the format of a csv file from its first line
+    :param line: the first line of the file
+    :return: the format, the delimiter and the header of the file (the fields of the format if it has no header)
+    :raises BusinessError: if the format isn't known
+    """
+    line = line.rstrip('\r\n')
+    delimiter = max(CSV_DELIMITERS, key=line.count)
+    header = tuple(column.strip() for column in next(csv.reader([line], delimiter=delimiter)))
+    for csv_format in CSV_FORMATS.values():
+        if csv_format.has_header and set(csv_format.header) <= set(header):
+            return csv_format, delimiter, header
+    if len(header) == len(CSV_FIELDS) and _is_date(header[0]):
+        return MOON_CSV_FORMAT, delimiter, CSV_FIELDS
+    raise BusinessError(Error('csv', f"Le format du fichier csv n'est pas reconnu : {line}"))
+
+
+def _is_date(value: str) -> bool:
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def iter_csv_file(filename: str, chunk_size: int = CSV_CHUNK_SIZE, parser: str = 'vectorized') \
+        -> Iterator[TradeBatch]:
+    """
+    Read the trades of a csv file (format detected) by batches of chunk_size trades at most
+    :param filename: filename of the csv file with path
+    :param chunk_size: max number of trades in a batch
+    :param parser: name of the parser in CSV_PARSERS
+    :return: an iterator on the batches, in the order of the file
+    :raises FileNotFoundError: if the file doesn't exist
+    :raises BusinessError: if the format of the file isn't known
+    """
+    parse = CSV_PARSERS[parser]
+    with open(filename, newline='', encoding='utf-8-sig') as csv_file:
+        first_line = csv_file.readline()
+        if not first_line.strip():
+            return
+        csv_format, delimiter, header = detect_csv_format(first_line)
+        indexes = csv_format.indexes(header)
+        lines = csv_file if csv_format.has_header else itertools.chain([first_line], csv_file)
+        while chunk := list(itertools.islice(lines, chunk_size)):
+            batch = parse(chunk, delimiter, csv_format, indexes)
+            if len(batch):
+                yield batch
+
+
+def parse_rows(lines: list[str], delimiter: str, csv_format: CsvFormat,
+               indexes: dict[str, Optional[int]]) -> TradeBatch:
+    """
+    Parse the lines of a csv file row by row
+    """
+    batch = TradeBatch()
+    for row in csv.reader(lines, delimiter=delimiter):
+        if not row:
+            continue
+        pair = row[indexes['pair']]  # type: ignore
+        base_asset, quote_asset = SYMBOL_INDEX.resolve(pair)
+        qty, _ = _read_amount(row[indexes['qty']], base_asset, csv_format.units)  # type: ignore
+        if csv_format.orders and not qty:
+            # order not filled
+            continue
+        price, _ = _read_amount(row[indexes['price']], quote_asset, csv_format.units)  # type: ignore
+        total = _read_amount(row[indexes['total']], quote_asset, csv_format.units)[0] \
+            if indexes['total'] is not None else None
+        if indexes['fee'] is not None:
+            fee, fee_asset = _read_amount(row[indexes['fee']], None, csv_format.units)
+        else:
+            fee, fee_asset = Decimal('0'), ''
+        if indexes['fee_asset'] is not None:
+            fee_asset = row[indexes['fee_asset']]
+        batch.id.append(None)
+        batch.pair.append(sys.intern(pair))
+        batch.type.append(TradeType.BUY if row[indexes['type']] == 'BUY' else TradeType.SELL)  # type: ignore
+        batch.qty.append(qty)
+        batch.price.append(price)
+        # as Trade
+        batch.total.append(total if total else qty * price)
+        batch.date.append(datetime.fromisoformat(row[indexes['date']]))  # type: ignore
+        batch.fee.append(fee)
+        batch.fee_asset.append(sys.intern(fee_asset))
+        batch.origin_id.append('')
+        batch.origin.append(TradeOrigin.BINANCE)
+    return batch
+
+
+def parse_columns(lines: list[str], delimiter: str, csv_format: CsvFormat,
+                  indexes: dict[str, Optional[int]]) -> TradeBatch:
+    """
+    Parse the lines of a csv file column by column : the lines are split, then each column is converted at once
+    """
+    if any('"' in line for line in lines):
+        rows = [row for row in csv.reader(lines, delimiter=delimiter) if row]
+    else:
+        rows = [line.rstrip('\r\n').split(delimiter) for line in lines if line.strip()]
+    if not rows:
+        return TradeBatch()
+    columns = list(zip(*rows))
+    nb_rows = len(rows)
+
+    pairs = list(map(sys.intern, columns[indexes['pair']]))  # type: ignore
+    if csv_format.units:
+        assets = list(map(SYMBOL_INDEX.resolve, pairs))
+        qty = [_read_amount(value, base_asset, True)[0]
+               for value, (base_asset, _) in zip(columns[indexes['qty']], assets)]  # type: ignore
+        price = [_read_amount(value, quote_asset, True)[0]
+                 for value, (_, quote_asset) in zip(columns[indexes['price']], assets)]  # type: ignore
+        total = [_read_amount(value, quote_asset, True)[0]
+                 for value, (_, quote_asset) in zip(columns[indexes['total']], assets)]  # type: ignore
+    else:
+        qty = list(map(Decimal, columns[indexes['qty']]))  # type: ignore
+        price = list(map(Decimal, columns[indexes['price']]))  # type: ignore
+        total = list(map(Decimal, columns[indexes['total']])) if indexes['total'] is not None else [None] * nb_rows
+    if indexes['fee'] is None:
+        fee, fee_asset = [Decimal('0')] * nb_rows, [''] * nb_rows
+    elif csv_format.units:
+        fee, fee_asset = map(list, zip(*(_read_amount(value, None, True) for value in columns[indexes['fee']])))
+    else:
+        fee, fee_asset = list(map(Decimal, columns[indexes['fee']])), [''] * nb_rows
+    if indexes['fee_asset'] is not None:
+        fee_asset = columns[indexes['fee_asset']]
+
+    batch = TradeBatch()
+    batch.id = [None] * nb_rows
+    batch.pair = pairs
+    batch.type = [TradeType.BUY if value == 'BUY' else TradeType.SELL
+                  for value in columns[indexes['type']]]  # type: ignore
+    batch.qty = qty
+    batch.price = price
+    # as Trade
+    batch.total = [t if t else q * p for q, p, t in zip(qty, price, total)]
+    batch.date = list(map(datetime.fromisoformat, columns[indexes['date']]))  # type: ignore
+    batch.fee = fee
+    batch.fee_asset = list(map(sys.intern, fee_asset))
+    batch.origin_id = [''] * nb_rows
+    batch.origin = [TradeOrigin.BINANCE] * nb_rows
+    if csv_format.orders and not all(qty):
+        # orders not filled
+        batch = TradeBatch(trade for trade in batch if trade.qty)
+    return batch
+
+
+def _read_amount(value: str, asset: Optional[str], units: bool) -> tuple[Decimal, str]:
+    """
+    Amount of a column and its asset (suffix of the amount if units, '' otherwise)
+    :param asset: the expected asset of the amount, if None the asset is the letters after the amount
+    """
+    if not units:
+        return Decimal(value), ''
+    value = value.strip()
+    if asset and value.endswith(asset):
+        amount, asset = value[:-len(asset)], asset
+    else:
+        match = AMOUNT_UNIT_PATTERN.fullmatch(value)
+        if match is None:
+            raise BusinessError(Error('csv', f"Le montant {value} n'est pas valide"))
+        amount, asset = match.groups()
+    return Decimal(amount.replace(',', '')), asset
+
+
+CSV_PARSERS: dict[str, Callable[[list[str], str, CsvFormat, dict[str, Optional[int]]], TradeBatch]] = {
+    'rows': parse_rows,
+    'vectorized': parse_columns,
+}
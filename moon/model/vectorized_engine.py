@@ -0,0 +1,204 @@
+"""
+Columnar (NumPy) alternative to Wallet.import_trades
+
+Each trade is split in three legs : the base asset leg (+qty for a BUY, -qty for a SELL), the quote asset leg
+(-total for a BUY, +total for a SELL) and the fee leg (-fee). The legs are grouped by asset, in the order of the trades,
+and for each asset :
+- the running quantity is a cumulative sum of the legs quantities
+- the PRU follows the linear recurrence pru[k] = a[k] * pru[k - 1] + b[k], with a = qty_before / qty_after and
+  b = total / qty_after for a BUY leg, a = 1 and b = 0 otherwise, and a = b = 0 when the quantity goes back to 0.
+  It is solved segment by segment (a segment ends when the quantity goes back to 0) with cumulative products and sums
+- the realised pnl of a SELL leg is total - qty * pru before the leg
+
+The computation is done on float64 : quantities whose absolute value is under the tolerance are 0 and the results are
+rounded to the tolerance.
+"""
+import math
+from decimal import Decimal
+from typing import Optional
+
+import numpy as np
+
+from moon.model.assets_wallet import AssetsWallet, AssetWalletData
+from moon.model.pnl import Pnl
+from moon.model.pnl_total import PnlTotal
+from moon.model.trade import Trade, TradeType
+
+DEFAULT_TOLERANCE = 1e-9
+
+LEG_BASE = 0
+LEG_QUOTE = 1
+LEG_FEE = 2
+NB_LEGS = 3
+
+
+def import_trades(id_wallet: int, trades: list[Trade],
+                  tolerance: float = DEFAULT_TOLERANCE) -> tuple[AssetsWallet, list[Pnl], list[PnlTotal]]:
+    """
+    Compute the assets wallet, the pnl and the pnl total of the trades like Wallet.import_trades
+    :param id_wallet: wallet's id
+    :param trades: the trades, in chronological order
+    :param tolerance: quantities under the tolerance are 0, results are rounded to the tolerance
+    :return: the assets wallet (assets with qty != 0 sorted by invested value), the pnl sorted by date and the pnl
+    total sorted by asset
+    """
+    if not trades:
+        return AssetsWallet(id_wallet), [], []
+    decimals = max(0, -math.floor(math.log10(tolerance)))
+
+    # trades columns, the assets are encoded by their index in assets
+    assets: list[Optional[str]] = []
+    asset_codes: dict[Optional[str], int] = {}
+    assets_by_pair: dict[str, tuple[int, int]] = {}
+
+    def encode(asset: Optional[str]) -> int:
+        if asset not in asset_codes:
+            asset_codes[asset] = len(assets)
+            assets.append(asset)
+        return asset_codes[asset]
+
+    n = len(trades)
+    base = np.empty(n, dtype=np.int64)
+    quote = np.empty(n, dtype=np.int64)
+    fee_asset = np.empty(n, dtype=np.int64)
+    is_buy = np.empty(n, dtype=bool)
+    qty = np.empty(n)
+    total = np.empty(n)
+    fee = np.empty(n)
+    for i, trade in enumerate(trades):
+        if trade.pair not in assets_by_pair:
+            asset1, asset2 = trade.get_assets()
+            assets_by_pair[trade.pair] = (encode(asset1), encode(asset2))
+        base[i], quote[i] = assets_by_pair[trade.pair]
+        fee_asset[i] = encode(trade.fee_asset)
+        is_buy[i] = trade.type == TradeType.BUY
+        qty[i] = trade.qty
+        total[i] = trade.total
+        fee[i] = trade.fee
+
+    # legs of the trades (leg k of trade i at position i * NB_LEGS + k) grouped by asset in the order of the trades
+    sign = np.where(is_buy, 1.0, -1.0)
+    leg_asset = np.stack((base, quote, fee_asset), axis=1).ravel()
+    leg_qty = np.stack((sign * qty, -sign * total, -fee), axis=1).ravel()
+    order = np.argsort(leg_asset, kind='stable')
+    leg_asset = leg_asset[order]
+    leg_qty = leg_qty[order]
+    leg_trade = order // NB_LEGS
+    leg_kind = order % NB_LEGS
+    asset_starts = np.r_[True, leg_asset[1:] != leg_asset[:-1]]
+
+    # running quantity of the asset after and before each leg
+    qty_after = _segmented_cumsum(leg_qty, asset_starts)
+    qty_after[np.abs(qty_after) <= tolerance] = 0.0
+    qty_before = _shift(qty_after, asset_starts)
+
+    # pru of the asset after and before each leg
+    base_leg = leg_kind == LEG_BASE
+    buy_leg = base_leg & is_buy[leg_trade]
+    closed = qty_after == 0.0
+    a = np.ones(len(leg_qty))
+    b = np.zeros(len(leg_qty))
+    open_buy = buy_leg & ~closed
+    a[open_buy] = qty_before[open_buy] / qty_after[open_buy]
+    b[open_buy] = total[leg_trade[open_buy]] / qty_after[open_buy]
+    a[base_leg & closed] = 0.0
+    a[asset_starts] = 0.0
+    pru_after = _linear_recurrence(a, b)
+    pru_before = _shift(pru_after, asset_starts)
+
+    # realised pnl of the SELL legs, in the order of the trades
+    sell_leg = base_leg & ~is_buy[leg_trade]
+    sell_trades = leg_trade[sell_leg]
+    sell_order = np.argsort(sell_trades, kind='stable')
+    sell_trades = sell_trades[sell_order]
+    pnl_values = (total[sell_trades] - qty[sell_trades] * pru_before[sell_leg][sell_order])
+
+    def to_decimal(value: float) -> Decimal:
+        return Decimal(str(round(float(value), decimals)))
+
+    pnl_list = [Pnl(None, trades[i].date, assets[base[i]], to_decimal(value), assets[quote[i]])  # type: ignore
+                for i, value in zip(sell_trades, pnl_values)]
+
+    # pnl total by (asset, currency) in the order of their first pnl
+    keys = base[sell_trades] * len(assets) + quote[sell_trades]
+    unique_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    pnl_totals = np.bincount(inverse.ravel(), weights=pnl_values, minlength=len(unique_keys))
+    pnl_total_list = [PnlTotal(None, assets[key // len(assets)], to_decimal(value),  # type: ignore
+                               assets[key % len(assets)])  # type: ignore
+                      for _, key, value in sorted(zip(first_index, unique_keys, pnl_totals))]
+
+    # final state of each asset (last leg) with the currency of its last BUY or SELL, in the order of their first leg
+    bounds = np.r_[np.flatnonzero(asset_starts), len(leg_asset)]
+    last_legs = bounds[1:] - 1
+    last_base_legs = np.maximum.reduceat(np.where(base_leg, np.arange(len(leg_asset)), -1), bounds[:-1])
+    first_legs = np.minimum.reduceat(order, bounds[:-1])
+    assets_wallet = {}
+    for ind in np.argsort(first_legs, kind='stable'):
+        last_leg = last_legs[ind]
+        if qty_after[last_leg] != 0.0:
+            last_base_leg = last_base_legs[ind]
+            currency = assets[quote[leg_trade[last_base_leg]]] if last_base_leg >= 0 else ''
+            assets_wallet[assets[leg_asset[last_leg]]] = AssetWalletData(
+                None, to_decimal(qty_after[last_leg]), to_decimal(pru_after[last_leg]), currency)  # type: ignore
+
+    return (
+        AssetsWallet(id_wallet, dict(sorted(assets_wallet.items(), key=lambda item: item[1].qty * item[1].pru,
+                                            reverse=True))),  # type: ignore
+        sorted(pnl_list, key=lambda x: x.date),  # type: ignore
+        sorted(pnl_total_list, key=lambda x: x.asset),
+    )
+
+
+def _segmented_cumsum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Cumulative sum of values restarting at each start
+    The sum is done segment by segment so that the error of a segment doesn't depend on the previous ones
+    """
+    bounds = np.r_[np.flatnonzero(starts), len(values)]
+    sums = np.empty_like(values)
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        np.cumsum(values[begin:end], out=sums[begin:end])
+    return sums
+
+
+def _shift(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Previous value in the segment (0 for the first value of a segment)
+    """
+    shifted = np.r_[0.0, values[:-1]]
+    shifted[starts] = 0.0
+    return shifted
+
+
+def _linear_recurrence(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Solve x[k] = a[k] * x[k - 1] + b[k] with x[-1] = 0
+    A segment starts at each a[k] == 0 (x[k] = b[k]), in a segment x[k] = p[k] * sum(b[j] / p[j]) for j <= k with p[k]
+    the cumulative product of a since the start of the segment. p is computed as a cumulative sum of logarithms and the
+    sums as cumulative log-sum-exp (of the positive and of the negative terms), so that p[k] and 1 / p[k] are never
+    computed : they underflow/overflow on long segments (ie a position never fully closed)
+    """
+    starts = a == 0.0
+    starts[0] = True
+    factors = np.where(starts, 1.0, a)
+    log_p = _segmented_cumsum(np.log(np.abs(factors)), starts)
+    negative_p = _segmented_cumsum((factors < 0).astype(np.float64), starts) % 2 == 1.0
+    # terms b[j] / p[j] as sign and logarithm
+    negative_terms = (b < 0) != negative_p
+    with np.errstate(divide='ignore'):
+        log_terms = np.log(np.abs(b)) - log_p
+    log_sums_positive = _segmented_logcumsumexp(np.where(negative_terms, -np.inf, log_terms), starts)
+    log_sums_negative = _segmented_logcumsumexp(np.where(negative_terms, log_terms, -np.inf), starts)
+    x = np.exp(log_p + log_sums_positive) - np.exp(log_p + log_sums_negative)
+    return np.where(negative_p, -x, x)
+
+
+def _segmented_logcumsumexp(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    log(cumsum(exp(values))) restarting at each start, without computing exp(values)
+    """
+    bounds = np.r_[np.flatnonzero(starts), len(values)]
+    sums = np.empty_like(values)
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        np.logaddexp.accumulate(values[begin:end], out=sums[begin:end])
+    return sums
@@ -3,20 +3,24 @@ import os
 import sys
 from datetime import datetime
 from decimal import *
-from typing import Optional
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
 
 from moon.db.db import ConnectionDB
 from moon.exceptions.exceptions import BusinessError, EntityNotFoundError, Error
 
 from moon.model.assets_wallet import AssetsWallet, AssetWalletData
+from moon.model.checkpoint import Checkpoint
 from moon.model.pnl import Pnl
-from moon.model.pnl_total import PnlTotal
-from moon.model.trade import Trade, TradeOrigin, TradeType
+from moon.model.pnl_total import PnlTotal, PnlTotalBook
+from moon.model.trade import CSV_CHUNK_SIZE, SYMBOL_INDEX, Trade, TradeBatch, TradeOrigin, TradeType
+from moon.model.trade_cache import TradeCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 SQL_READ_WALLET = "select id, name, description from wallet where id = ?"
+SQL_READ_WALLET_ASSETS = "select w.id, w.name, w.description, a.id, a.asset, a.qty, a.pru, a.currency from wallet w " \
+                         "left join asset_wallet a on a.id_wallet = w.id where w.id = ? order by a.id"
 SQL_FIND_WALLET = "select id, name, description from wallet order by id"
 SQL_INSERT_WALLET = "insert into wallet(name, description) values(?, ?)"
 SQL_UPDATE_WALLET = "update wallet set name = ?, description = ? where id = ?"
@@ -46,91 +50,157 @@ class Wallet:
         return f"Wallet(id={self.id}, name='{self.name}', description='{self.description}', trades={self.trades!r}, assets_wallet={self.assets_wallet!r}, pnl={self.pnl!r}, pnl_total={self.pnl_total!r})"
 
     @staticmethod
-    def import_trades(id_wallet: int, trades: list[Trade]) -> tuple[AssetsWallet, list[Pnl], list[PnlTotal]]:
+    def import_trades(id_wallet: int,
+                      trades: Union[list[Trade], TradeBatch]) -> tuple[AssetsWallet, list[Pnl], list[PnlTotal]]:
         logger.debug("Entry _import_trades")
         assets_wallet: AssetsWallet = AssetsWallet(id_wallet)
         pnl_list: list[Pnl] = []
-        pnl_total_list: list[PnlTotal] = []
-
-        if len(trades) > 0:
-            for trade in trades:
-                logger.debug(f"Trade : {trade}")
-                asset1, asset2 = trade.get_assets()
-                fee_asset = trade.fee_asset
-
-                logger.debug(f"asset1 : {asset1} - asset2 : {asset2} - fee_asset : {fee_asset}")
-
-                # BUY
-                if trade.type == TradeType.BUY:
-                    qty = assets_wallet[asset1].qty + trade.qty
-                    pru = (
-                        (((assets_wallet[asset1].qty * assets_wallet[asset1].pru) + trade.total) / qty)
-                        if qty != 0.0
-                        else Decimal("0.0")
-                    )
-                    assets_wallet[asset1] = AssetWalletData(None, qty, pru, asset2)
-                    assets_wallet[asset2] = AssetWalletData(
-                        None,
-                        assets_wallet[asset2].qty - trade.total,
-                        assets_wallet[asset2].pru,
-                        assets_wallet[asset2].currency,
-                    )
-                    logger.debug("BUY")
-                    logger.debug(f"qty : {qty}")
-                    logger.debug(f"pru : {pru}")
-                    logger.debug(f"assets_wallet[{asset1}] : {assets_wallet[asset1]}")
-                    logger.debug(f"assets_wallet[{asset2}] : {assets_wallet[asset2]}")
-                # SELL
-                elif trade.type == TradeType.SELL:
-                    qty = assets_wallet[asset1].qty - trade.qty
-                    pnl = trade.total - (trade.qty * assets_wallet[asset1].pru)
-                    pnl_list.append(Pnl(None, trade.date, asset1, pnl, asset2))
-                    pnl_total_item = [e for e in pnl_total_list if e.asset == asset1 and e.currency == asset2]
-                    if pnl_total_item:
-                        pnl_total = pnl_total_item[0].value + pnl
-                        pnl_total_item[0].value = pnl_total
-                    else:
-                        pnl_total = pnl
-                        pnl_total_list.append(PnlTotal(None, asset1, pnl_total, asset2))
-                    assets_wallet[asset1] = AssetWalletData(
-                        None,
-                        qty,
-                        assets_wallet[asset1].pru if qty != 0 else Decimal("0.0"),
-                        asset2,
-                    )
-                    assets_wallet[asset2] = AssetWalletData(
-                        None,
-                        assets_wallet[asset2].qty + trade.total,
-                        assets_wallet[asset2].pru,
-                        assets_wallet[asset2].currency,
-                    )
-                    logger.debug("SELL")
-                    logger.debug(f"qty : {qty}")
-                    logger.debug(f"pnl : {pnl}")
-                    logger.debug(f"pnl_total : {pnl_total}")
-                    logger.debug(f"assets_wallet[{asset1}] : {assets_wallet[asset1]}")
-                    logger.debug(f"assets_wallet[{asset2}] : {assets_wallet[asset2]}")
-                # fees
-                assets_wallet[fee_asset] = AssetWalletData(
-                    None,
-                    assets_wallet[fee_asset].qty - trade.fee,
-                    assets_wallet[fee_asset].pru,
-                    assets_wallet[fee_asset].currency,
-                )
-                logger.debug(f"assets_wallet[{fee_asset}] : {assets_wallet[fee_asset]}")
+        pnl_total_book = PnlTotalBook()
 
-        # suppress asset with qty == 0
-        new_assets_wallet = AssetsWallet(
-            id_wallet,
-            {asset: data for asset, data in assets_wallet.items() if data.qty != 0},
-        )
-        
-        new_assets_wallet = dict(sorted(new_assets_wallet.items(), key= lambda item: item[1].qty*item[1].pru, reverse=True)) # type: ignore
+        Wallet._apply_trades(assets_wallet, pnl_list, pnl_total_book, trades)
 
         return (
-            new_assets_wallet,
+            Wallet._get_final_assets_wallet(assets_wallet),
             sorted(pnl_list, key=lambda x: x.date), # type: ignore
-            sorted(pnl_total_list, key=lambda x: x.asset),
+            sorted(pnl_total_book, key=lambda x: x.asset),
+        )
+
+    @staticmethod
+    def import_trades_from_checkpoint(id_wallet: int, chunk_size: int = CSV_CHUNK_SIZE,
+                                      progress: Optional[Callable[[int], Any]] = None,
+                                      trade_cache: Optional[TradeCache] = None) \
+            -> tuple[AssetsWallet, list[Pnl], list[PnlTotal]]:
+        """
+        Compute the wallet from its checkpoint : only the trades saved after the checkpoint are applied, then the
+        checkpoint is moved to the last trade. Without a valid checkpoint all the trades of the wallet are replayed.
+        :param id_wallet: wallet's id
+        :param chunk_size: number of trades applied between two progress reports
+        :param progress: called with the number of trades applied after each chunk (see moon.common.task.TaskProgress)
+        :param trade_cache: the trades are read from the cache (memory mapped, decoded chunk by chunk) instead of the db
+        :return: the assets wallet, the pnl of the trades applied and the pnl total of the wallet
+        """
+        checkpoint = Checkpoint.load(id_wallet) or Checkpoint(id_wallet)
+        chunks: Iterable[Union[list[Trade], TradeBatch]]
+        if trade_cache is not None:
+            chunks = trade_cache.iter_after(id_wallet, checkpoint.last_trade_date, checkpoint.last_trade_id,
+                                            chunk_size)
+        else:
+            trades = Trade.find_after(id_wallet, checkpoint.last_trade_date, checkpoint.last_trade_id)
+            chunks = (trades[i:i + chunk_size] for i in range(0, len(trades), chunk_size))
+        pnl_list: list[Pnl] = []
+
+        nb_trades = 0
+        last_trade: Optional[Trade] = None
+        for chunk in chunks:
+            Wallet._apply_trades(checkpoint.assets_wallet, pnl_list, checkpoint.pnl_total_book, chunk)
+            nb_trades += len(chunk)
+            last_trade = chunk[-1]
+            if progress is not None:
+                progress(nb_trades)
+
+        if last_trade is not None:
+            checkpoint.last_trade_date = last_trade.date
+            checkpoint.last_trade_id = last_trade.id
+            checkpoint.save()
+            ConnectionDB.commit()
+
+        return (
+            Wallet._get_final_assets_wallet(checkpoint.assets_wallet),
+            pnl_list,
+            sorted(checkpoint.pnl_total_book, key=lambda x: x.asset),
+        )
+
+    @staticmethod
+    def _apply_trades(
+        assets_wallet: AssetsWallet,
+        pnl_list: list[Pnl],
+        pnl_total_book: PnlTotalBook,
+        trades: Union[list[Trade], TradeBatch],
+    ) -> None:
+        """
+        Apply the trades, in their order, on the assets wallet and add the resulting pnl to pnl_list and pnl_total_book
+        Successive calls with the following trades give the same result than one call with all the trades
+        The columns of a TradeBatch are read directly, no Trade is created
+        """
+        for pair, trade_type, trade_qty, total, date, fee, fee_asset in Wallet._iter_trades_values(trades):
+            logger.debug("Trade : %s %s qty=%s total=%s date=%s fee=%s %s", pair, trade_type, trade_qty, total, date,
+                         fee, fee_asset)
+            asset1, asset2 = SYMBOL_INDEX.resolve(pair)
+
+            logger.debug("asset1 : %s - asset2 : %s - fee_asset : %s", asset1, asset2, fee_asset)
+
+            # BUY
+            if trade_type == TradeType.BUY:
+                qty = assets_wallet[asset1].qty + trade_qty
+                pru = (
+                    (((assets_wallet[asset1].qty * assets_wallet[asset1].pru) + total) / qty)
+                    if qty != 0.0
+                    else Decimal("0.0")
+                )
+                assets_wallet[asset1] = AssetWalletData(None, qty, pru, asset2)
+                assets_wallet[asset2] = AssetWalletData(
+                    None,
+                    assets_wallet[asset2].qty - total,
+                    assets_wallet[asset2].pru,
+                    assets_wallet[asset2].currency,
+                )
+                logger.debug("BUY")
+                logger.debug("qty : %s", qty)
+                logger.debug("pru : %s", pru)
+                logger.debug("assets_wallet[%s] : %s", asset1, assets_wallet[asset1])
+                logger.debug("assets_wallet[%s] : %s", asset2, assets_wallet[asset2])
+            # SELL
+            elif trade_type == TradeType.SELL:
+                qty = assets_wallet[asset1].qty - trade_qty
+                pnl = total - (trade_qty * assets_wallet[asset1].pru)
+                pnl_list.append(Pnl(None, date, asset1, pnl, asset2))
+                pnl_total = pnl_total_book.add(asset1, pnl, asset2).value
+                assets_wallet[asset1] = AssetWalletData(
+                    None,
+                    qty,
+                    assets_wallet[asset1].pru if qty != 0 else Decimal("0.0"),
+                    asset2,
+                )
+                assets_wallet[asset2] = AssetWalletData(
+                    None,
+                    assets_wallet[asset2].qty + total,
+                    assets_wallet[asset2].pru,
+                    assets_wallet[asset2].currency,
+                )
+                logger.debug("SELL")
+                logger.debug("qty : %s", qty)
+                logger.debug("pnl : %s", pnl)
+                logger.debug("pnl_total : %s", pnl_total)
+                logger.debug("assets_wallet[%s] : %s", asset1, assets_wallet[asset1])
+                logger.debug("assets_wallet[%s] : %s", asset2, assets_wallet[asset2])
+            # fees
+            assets_wallet[fee_asset] = AssetWalletData(
+                None,
+                assets_wallet[fee_asset].qty - fee,
+                assets_wallet[fee_asset].pru,
+                assets_wallet[fee_asset].currency,
+            )
+            logger.debug("assets_wallet[%s] : %s", fee_asset, assets_wallet[fee_asset])
+
+    @staticmethod
+    def _iter_trades_values(trades: Union[list[Trade], TradeBatch]) -> Iterator[tuple]:
+        """
+        (pair, type, qty, total, date, fee, fee_asset) of the trades, the columns of a batch are zipped
+        """
+        if isinstance(trades, TradeBatch):
+            return zip(trades.pair, trades.type, trades.qty, trades.total, trades.date, trades.fee, trades.fee_asset)
+        return ((trade.pair, trade.type, trade.qty, trade.total, trade.date, trade.fee, trade.fee_asset)
+                for trade in trades)
+
+    @staticmethod
+    def _get_final_assets_wallet(assets_wallet: AssetsWallet) -> AssetsWallet:
+        """
+        Returns the assets wallet without the assets with qty == 0 and sorted by invested value (qty * pru)
+        """
+        assets = {asset: data for asset, data in assets_wallet.items() if data.qty != 0}
+        return AssetsWallet(
+            assets_wallet.id_wallet,
+            dict(sorted(assets.items(), key=lambda item: item[1].qty * item[1].pru, reverse=True)),
         )
 
     def _merge_assets_wallet(self, assets_wallet: AssetsWallet) -> None:
@@ -154,34 +224,72 @@ class Wallet:
                 else:
                     self.assets_wallet[asset] = assets_data
 
-    @staticmethod
-    def _get_existant_asset(pnl_total_list: list[PnlTotal], asset: str, currency: str) -> Optional[PnlTotal]:
-        for ind, p in enumerate(pnl_total_list):
-            if p.asset == asset and p.currency == currency:
-                return p
-        return None
-
-    def _merge_pnl_total(self, pnl_total_list: list[PnlTotal]) -> list[PnlTotal]:
-        pnl_total_list_wallet = self.load_pnl_total()
-        pnl_total_list_to_save = []
-        for pnl_total in pnl_total_list:
-            p = self._get_existant_asset(pnl_total_list_wallet, pnl_total.asset, pnl_total.currency)
-            if p:
-                p.value += pnl_total.value
-                pnl_total_list_to_save.append(p)
-            else:
-                pnl_total_list_to_save.append(pnl_total)
-        return pnl_total_list_to_save
-
-    def import_trades_from_csv_file(self, filename: str) -> None:
-        csv_trades = Trade.get_trades_from_csv_file(filename)
-        new_trades = Trade.filter_new_trades(self.id, csv_trades)
-        assets_wallet, pnl, pnl_total = Wallet.import_trades(self.id, new_trades)
-        self._merge_assets_wallet(assets_wallet)
-        self.assets_wallet.save()
-        Pnl.save_all(self.id, pnl)
-        pnl_total_list_to_save = self._merge_pnl_total(pnl_total)
-        PnlTotal.save_all(self.id, pnl_total_list_to_save)
+    def _merge_pnl_total(self, pnl_total_list: Iterable[PnlTotal]) -> list[PnlTotal]:
+        pnl_total_saved = self.load_pnl_total()
+        # values saved in db of the row kept for each (asset, currency)
+        pnl_total_book_saved = PnlTotalBook()
+        for pnl_total in pnl_total_saved:
+            if (pnl_total.asset, pnl_total.currency) not in pnl_total_book_saved:
+                pnl_total_book_saved.add(pnl_total.asset, pnl_total.value, pnl_total.currency)
+        pnl_total_book_wallet = PnlTotalBook(pnl_total_saved)
+        # the duplicate pnl total of an (asset, currency) are summed in the book, the other rows are deleted
+        if pnl_total_book_wallet.merged:
+            PnlTotal.delete_all(pnl_total_book_wallet.merged)
+        pnl_total_book_wallet.merge(pnl_total_list)
+        # only the pnl total whose value differs from the db are saved
+        pnl_total_book_diff = pnl_total_book_wallet.diff(pnl_total_book_saved)
+        return [pnl_total for pnl_total in pnl_total_book_wallet
+                if (pnl_total.asset, pnl_total.currency) in pnl_total_book_diff]
+
+    def import_trades_from_csv_file(self, filename: str, chunk_size: int = CSV_CHUNK_SIZE,
+                                    progress: Optional[Callable[[int], Any]] = None) -> dict[str, int]:
+        """
+        Import the new trades of a csv file in the wallet
+        The file is streamed by chunks of chunk_size trades : the new trades of each chunk are saved, then the trades
+        saved are read back by chunks in the order of their date (the file can be in any order, the Binance exports
+        are the most recent trades first) and applied on the wallet, so the memory used doesn't depend on the size
+        of the file
+        All the writes (trades, pnl, assets, pnl total) are done in one transaction : the wallet is imported entirely
+        or not at all
+        :param progress: called with the number of trades read, see Trade.import_trades_from_csv_file
+        :return: the number of rows written by table
+        """
+        return self._import_trades(
+            lambda: Trade.import_trades_from_csv_file(self.id, filename, chunk_size, progress),  # type: ignore
+            filename, chunk_size)
+
+    def import_trades_from_csv_files(self, csv_files: Union[str, list[str]], chunk_size: int = CSV_CHUNK_SIZE,
+                                     max_workers: Optional[int] = None) -> dict[str, int]:
+        """
+        Import the new trades of several csv files (a directory, a glob pattern or a list of filenames) in the wallet
+        The files are read in parallel and merged by date, see Trade.import_trades_from_csv_files, then the new trades
+        are applied on the wallet as import_trades_from_csv_file, in the same transaction
+        :return: the number of rows written by table
+        """
+        return self._import_trades(
+            lambda: Trade.import_trades_from_csv_files(self.id, csv_files, chunk_size, max_workers),  # type: ignore
+            str(csv_files), chunk_size)
+
+    def _import_trades(self, save_new_trades: Callable[[], int], source: str, chunk_size: int) -> dict[str, int]:
+        """
+        Save the new trades (save_new_trades) and apply them on the wallet in one transaction
+        :return: the number of rows written by table
+        """
+        with ConnectionDB.transaction() as transaction:
+            last_id = Trade.get_max_id()
+            save_new_trades()
+            assets_wallet = AssetsWallet(self.id)  # type: ignore
+            pnl_total = PnlTotalBook()
+            for new_trades in Trade.iter_trades_after_id(self.id, last_id, chunk_size):  # type: ignore
+                pnl: list[Pnl] = []
+                Wallet._apply_trades(assets_wallet, pnl, pnl_total, new_trades)
+                Pnl.save_all(self.id, pnl)  # type: ignore
+            self._merge_assets_wallet(Wallet._get_final_assets_wallet(assets_wallet))
+            self.assets_wallet.save()  # type: ignore
+            pnl_total_list_to_save = self._merge_pnl_total(sorted(pnl_total, key=lambda x: x.asset))
+            PnlTotal.save_all(self.id, pnl_total_list_to_save)  # type: ignore
+        logger.info(f"Import of {source} in wallet {self.id} : {dict(transaction.rows_written)} rows written")
+        return dict(transaction.rows_written)
 
     def _is_creation(self) -> bool:
         return self.id is None
@@ -206,39 +314,54 @@ class Wallet:
             raise BusinessError(errors)
 
     @staticmethod
-    def read(id_: int) -> "Wallet":
-        ConnectionDB.get_cursor().execute(SQL_READ_WALLET, (id_,))
-        row = ConnectionDB.get_cursor().fetchone()
-        if row is None:
+    def read(id_: int, load_assets: bool = True) -> "Wallet":
+        """
+        Read a wallet
+        :param id_: wallet id
+        :param load_assets: if True the assets of the wallet are loaded in the same request
+        :return: the wallet
+        """
+        if not load_assets:
+            row = ConnectionDB.get_connection().execute(SQL_READ_WALLET, (id_,)).fetchone()
+            if row is None:
+                raise EntityNotFoundError(id_)
+            return Wallet(*row)
+        rows = ConnectionDB.get_connection().execute(SQL_READ_WALLET_ASSETS, (id_,)).fetchall()
+        if not rows:
             raise EntityNotFoundError(id_)
-        wallet = Wallet(*row)
-        wallet.assets_wallet = AssetsWallet.load(wallet.id)
+        wallet = Wallet(*rows[0][:3])
+        wallet.assets_wallet = AssetsWallet.from_rows(wallet.id, [row[3:] for row in rows if row[3] is not None])
         return wallet
 
     @staticmethod
-    def find() -> list["Wallet"]:
-        ConnectionDB.get_cursor().execute(SQL_FIND_WALLET)
-        rows = ConnectionDB.get_cursor().fetchall()
-        wallets = []
-        for row in rows:
-            wallet = Wallet(*row)
-            wallet.assets_wallet = AssetsWallet.load(wallet.id)
-            wallets.append(wallet)
+    def find(load_assets: bool = True) -> list["Wallet"]:
+        """
+        Find all the wallets
+        :param load_assets: if True the assets of all the wallets are loaded in one request
+        :return: the wallets sorted by id
+        """
+        rows = ConnectionDB.get_connection().execute(SQL_FIND_WALLET).fetchall()
+        wallets = [Wallet(*row) for row in rows]
+        if load_assets and wallets:
+            assets_wallets = AssetsWallet.load_all()
+            for wallet in wallets:
+                wallet.assets_wallet = assets_wallets.get(wallet.id)  # type: ignore
         return wallets
 
     def save(self) -> None:
         self.validate()
         if self._is_creation():
-            cur = ConnectionDB.get_cursor().execute(SQL_INSERT_WALLET, (self.name, self.description))
+            cur = ConnectionDB.get_connection().execute(SQL_INSERT_WALLET, (self.name, self.description))
             self.id = cur.lastrowid
         else:
-            ConnectionDB.get_cursor().execute(SQL_UPDATE_WALLET, (self.name, self.description, self.id))
+            ConnectionDB.get_connection().execute(SQL_UPDATE_WALLET, (self.name, self.description, self.id))
         if self.assets_wallet:
             self.assets_wallet.save()
 
     def delete(self) -> None:
-        Wallet.read(self.id)  # type: ignore
-        ConnectionDB.get_cursor().execute(SQL_DELETE_WALLET, (self.id,))
+        Wallet.read(self.id, load_assets=False)  # type: ignore
+        ConnectionDB.get_connection().execute(SQL_DELETE_WALLET, (self.id,))
+        Checkpoint.invalidate(self.id)  # type: ignore
         if self.assets_wallet:
             self.assets_wallet.delete()
 
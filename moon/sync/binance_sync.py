@@ -0,0 +1,191 @@
+"""
+Synchronisation of the trades of a wallet with the Binance account (python-binance AsyncClient)
+
+The trades of the pairs are fetched concurrently : at most max_concurrency requests at once, under a rate limiter of the
+weight of the requests (the Binance limit is on the weight of the requests by minute). The trades of a pair are fetched
+from the last trade of the pair in the wallet (fromId pagination on the Binance trade id kept in origin_id), so only
+the new fills are fetched. The fills already imported from a csv export (saved without origin_id) get their origin_id
+(Trade.link_origin_ids), the others are imported in the wallet as the trades of a csv file (Trade.import_trades).
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from moon.db.db import ConnectionDB, from_epoch_ms
+from moon.model.trade import Trade, TradeOrigin, TradeType
+
+logger = logging.getLogger(__name__)
+
+# max weight of the requests by minute of an account
+BINANCE_MAX_WEIGHT = 1200
+BINANCE_WEIGHT_PERIOD = 60.0
+# weight of a GET /api/v3/myTrades request and max number of trades it returns
+MY_TRADES_WEIGHT = 10
+MY_TRADES_LIMIT = 1000
+# header of the responses with the weight used in the current minute
+USED_WEIGHT_HEADER = 'x-mbx-used-weight-1m'
+MAX_CONCURRENCY = 5
+
+
+class RateLimiter:
+    """
+    Limiter of the weight of the requests : at most max_weight in a sliding window of period seconds, a request waits
+    until its weight fits in the window (the requests acquire the weight in their order of arrival)
+    """
+
+    def __init__(self, max_weight: int = BINANCE_MAX_WEIGHT, period: float = BINANCE_WEIGHT_PERIOD,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        """
+        RateLimiter constructor
+        :param max_weight: max weight of the requests in a period
+        :param period: duration of the window in seconds
+        :param clock: time in seconds (monotonic)
+        :param sleep: coroutine waiting a duration in seconds
+        """
+        self.max_weight = max_weight
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        # (time, weight) of the requests in the window
+        self.requests: deque[tuple[float, int]] = deque()
+        self.weight = 0
+        self.lock = asyncio.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self.requests and self.requests[0][0] <= now - self.period:
+            self.weight -= self.requests.popleft()[1]
+
+    async def acquire(self, weight: int) -> None:
+        """
+        Wait until a request of weight can be sent and count it
+        :raises ValueError: if the weight is greater than max_weight
+        """
+        if weight > self.max_weight:
+            raise ValueError(f"Le poids de la requête ({weight}) dépasse le poids maximum ({self.max_weight})")
+        async with self.lock:
+            while True:
+                now = self.clock()
+                self._expire(now)
+                if self.weight + weight <= self.max_weight:
+                    break
+                await self.sleep(self.requests[0][0] + self.period - now)
+            self.requests.append((now, weight))
+            self.weight += weight
+
+    def update_used_weight(self, used_weight: int) -> None:
+        """
+        Count the weight used reported by the server (ie by other clients of the account) if it's greater than the
+        weight counted
+        """
+        now = self.clock()
+        self._expire(now)
+        if used_weight > self.weight:
+            self.requests.append((now, used_weight - self.weight))
+            self.weight = used_weight
+
+
+class BinanceSync:
+    """
+    Fetch of the trades of a Binance account by pair
+    The client is a python-binance AsyncClient, or any object with the coroutine get_my_trades(symbol, fromId, limit)
+    """
+
+    def __init__(self, client: Any, max_concurrency: int = MAX_CONCURRENCY, rate_limiter: Optional[RateLimiter] = None,
+                 limit: int = MY_TRADES_LIMIT):
+        """
+        BinanceSync constructor
+        :param client: the Binance client
+        :param max_concurrency: max number of requests at once
+        :param rate_limiter: limiter of the weight of the requests, by default the limit of an account
+        :param limit: number of trades by request (page)
+        """
+        self.client = client
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.limit = limit
+
+    async def fetch_trades(self, pair: str, from_id: int = 0) -> list[Trade]:
+        """
+        Fetch the trades of a pair page by page
+        :param pair: the pair (symbol)
+        :param from_id: Binance id of the first trade fetched
+        :return: the trades with id >= from_id
+        """
+        trades: list[Trade] = []
+        while True:
+            await self.rate_limiter.acquire(MY_TRADES_WEIGHT)
+            async with self.semaphore:
+                page = await self.client.get_my_trades(symbol=pair, fromId=from_id, limit=self.limit)
+                self._update_used_weight()
+            trades.extend(map(BinanceSync.convert_trade, page))
+            if len(page) < self.limit:
+                return trades
+            from_id = page[-1]['id'] + 1
+
+    def _update_used_weight(self) -> None:
+        # the AsyncClient keeps the last response
+        response = getattr(self.client, 'response', None)
+        used_weight = response.headers.get(USED_WEIGHT_HEADER) if response is not None else None
+        if used_weight is not None:
+            self.rate_limiter.update_used_weight(int(used_weight))
+
+    async def fetch_new_trades(self, id_wallet: int, pairs: Iterable[str]) -> list[Trade]:
+        """
+        Fetch the trades of the pairs after the last Binance trade of each pair in the wallet, the pairs concurrently
+        :param id_wallet: wallet's id
+        :param pairs: the pairs
+        :return: the new trades sorted by date
+        """
+        last_ids = Trade.get_last_origin_ids(id_wallet, TradeOrigin.BINANCE)
+        results = await asyncio.gather(*(self.fetch_trades(pair, last_ids[pair] + 1 if pair in last_ids else 0)
+                                         for pair in pairs))
+        return sorted((trade for trades in results for trade in trades), key=lambda trade: trade.date)
+
+    async def sync(self, id_wallet: int, pairs: Iterable[str]) -> int:
+        """
+        Import in the wallet the new trades of the pairs, in one transaction
+        The trades already imported from a csv export are not imported again, they are linked to their Binance id
+        :param id_wallet: wallet's id
+        :param pairs: the pairs
+        :return: the number of trades imported
+        """
+        trades = await self.fetch_new_trades(id_wallet, pairs)
+        with ConnectionDB.transaction():
+            trades = Trade.link_origin_ids(id_wallet, trades)
+            nb_new_trades = len(Trade.import_trades(id_wallet, trades))
+        logger.info(f"Sync of wallet {id_wallet} with Binance : {nb_new_trades} trades imported")
+        return nb_new_trades
+
+    @staticmethod
+    def convert_trade(trade: dict[str, Any]) -> Trade:
+        """
+        Trade of a Binance trade (as returned by get_my_trades)
+        """
+        return Trade(None, trade['symbol'], TradeType.BUY if trade['isBuyer'] else TradeType.SELL,
+                     Decimal(trade['qty']), Decimal(trade['price']), Decimal(trade['quoteQty']),
+                     from_epoch_ms(trade['time']), Decimal(trade['commission']), trade['commissionAsset'],
+                     str(trade['id']), TradeOrigin.BINANCE)
+
+
+async def sync_binance_trades(api_key: str, api_secret: str, id_wallet: int, pairs: Iterable[str],
+                              max_concurrency: int = MAX_CONCURRENCY) -> int:
+    """
+    Import in the wallet the new trades of the pairs of the Binance account
+    :param api_key: key of the Binance API
+    :param api_secret: secret of the Binance API
+    :param id_wallet: wallet's id
+    :param pairs: the pairs
+    :param max_concurrency: max number of requests at once
+    :return: the number of trades imported
+    """
+    from binance import AsyncClient
+
+    client = await AsyncClient.create(api_key, api_secret)
+    try:
+        return await BinanceSync(client, max_concurrency).sync(id_wallet, pairs)
+    finally:
+        await client.close_connection()
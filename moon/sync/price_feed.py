@@ -0,0 +1,142 @@
+"""
+Live prices of the assets of a wallet
+
+The prices are kept by symbol in a TickerCache shared by the views (TICKER_CACHE). A PriceFeed subscribes to the Binance
+mini ticker stream of the symbols held in the wallet only and updates the cache with the messages : the changed prices
+are passed to a callback (the AccountWidget gets them as a Qt signal and updates only their cells).
+The stream is an async iterator of messages : binance_mini_ticker_stream (python-binance multiplex socket) or a fake
+stream in the tests.
+"""
+import json
+import logging
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, Union
+
+from moon.model.assets_wallet import AssetsWallet
+
+logger = logging.getLogger(__name__)
+
+MINI_TICKER_STREAM = '{}@miniTicker'
+# fields of a mini ticker message
+MINI_TICKER_SYMBOL = 's'
+MINI_TICKER_CLOSE_PRICE = 'c'
+
+
+class TickerCache:
+    """
+    Last price of the symbols, by symbol
+    """
+
+    def __init__(self) -> None:
+        self.prices: dict[str, Decimal] = {}
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.prices
+
+    def get(self, symbol: str) -> Optional[Decimal]:
+        return self.prices.get(symbol)
+
+    def update(self, prices: dict[str, Decimal]) -> dict[str, Decimal]:
+        """
+        Update the prices of symbols
+        :return: the prices which have changed
+        """
+        changed = {symbol: price for symbol, price in prices.items() if self.prices.get(symbol) != price}
+        self.prices.update(changed)
+        return changed
+
+    def load_tickers(self, tickers: Iterable[dict[str, str]]) -> dict[str, Decimal]:
+        """
+        Update the prices with the tickers of the REST API (as returned by Binance get_all_tickers)
+        :param tickers: [{'symbol': 'BTCEUR', 'price': '41234.56'}, ...]
+        :return: the prices which have changed
+        """
+        return self.update({ticker['symbol']: Decimal(ticker['price']) for ticker in tickers})
+
+
+# prices shared by the views
+TICKER_CACHE = TickerCache()
+
+
+def get_wallet_symbols(assets_wallet: AssetsWallet) -> list[str]:
+    """
+    Symbols of the prices of the assets of a wallet in their currency (as BTCEUR)
+    """
+    return [asset + data.currency for asset, data in assets_wallet.items() if asset != data.currency]
+
+
+class PriceFeed:
+    """
+    Update of a TickerCache with the mini ticker messages of symbols
+    """
+
+    def __init__(self, symbols: Iterable[str], on_prices: Callable[[dict[str, Decimal]], Any],
+                 cache: TickerCache = TICKER_CACHE):
+        """
+        PriceFeed constructor
+        :param symbols: the symbols followed, the messages of the other symbols are ignored
+        :param on_prices: called with the prices which have changed (by symbol)
+        :param cache: the cache of the prices
+        """
+        self.symbols = set(symbols)
+        self.on_prices = on_prices
+        self.cache = cache
+
+    def streams(self) -> list[str]:
+        """
+        Names of the streams of the symbols (as btceur@miniTicker)
+        """
+        return [MINI_TICKER_STREAM.format(symbol.lower()) for symbol in sorted(self.symbols)]
+
+    def handle_prices(self, prices: dict[str, Decimal]) -> dict[str, Decimal]:
+        """
+        Update the cache with the prices of the followed symbols
+        :return: the prices which have changed (passed to on_prices if any)
+        """
+        changed = self.cache.update({symbol: price for symbol, price in prices.items() if symbol in self.symbols})
+        if changed:
+            self.on_prices(changed)
+        return changed
+
+    def handle_tickers(self, tickers: Iterable[dict[str, str]]) -> dict[str, Decimal]:
+        """
+        Update the cache with the tickers of the REST API (the prices before the first messages)
+        """
+        return self.handle_prices({ticker['symbol']: Decimal(ticker['price']) for ticker in tickers
+                                   if ticker['symbol'] in self.symbols})
+
+    def handle_message(self, message: Union[str, dict[str, Any], list[Any]]) -> dict[str, Decimal]:
+        """
+        Update the cache with a message of the stream : a mini ticker, a list of mini tickers (all market stream) or a
+        message of a combined stream ({'stream': ..., 'data': ...}), as json or decoded
+        :return: the prices which have changed
+        """
+        data: Any = json.loads(message) if isinstance(message, str) else message
+        if isinstance(data, dict) and 'data' in data:
+            data = data['data']
+        tickers: list[dict[str, Any]] = data if isinstance(data, list) else [data]
+        return self.handle_prices({ticker[MINI_TICKER_SYMBOL]: Decimal(ticker[MINI_TICKER_CLOSE_PRICE])
+                                   for ticker in tickers if MINI_TICKER_SYMBOL in ticker})
+
+    async def run(self, stream: AsyncIterator[Any]) -> None:
+        """
+        Handle the messages of the stream until its end
+        """
+        async for message in stream:
+            self.handle_message(message)
+
+
+async def binance_mini_ticker_stream(client: Any, streams: list[str]) -> AsyncIterator[dict[str, Any]]:
+    """
+    Messages of the mini ticker streams of Binance (multiplex socket of python-binance)
+    :param client: the python-binance AsyncClient
+    :param streams: the names of the streams (see PriceFeed.streams)
+    """
+    from binance import BinanceSocketManager
+
+    async with BinanceSocketManager(client).multiplex_socket(streams) as socket:
+        while True:
+            yield await socket.recv()
@@ -1,61 +1,131 @@
-from dataclasses import dataclass
+import asyncio
+from dataclasses import dataclass, replace
 from decimal import Decimal
 from locale import currency
-from threading import Timer
-from typing import Any
+from threading import Event, Timer
+from typing import Any, Optional
 
 import moon.common.mail as mail
 import moon.common.moon_config as moon_config
 import moon.common.utils as utils
-from binance.client import Client
 from moon.model.assets_wallet import AssetsWallet
+from moon.sync.price_feed import TICKER_CACHE, PriceFeed, TickerCache, binance_mini_ticker_stream, \
+    get_wallet_symbols
+from PySide6.QtCore import QThread, Signal
 from PySide6.QtGui import QFont
-from PySide6.QtWidgets import QGridLayout, QHBoxLayout, QLabel, QPushButton, QVBoxLayout, QWidget
+from PySide6.QtWidgets import QGridLayout, QHBoxLayout, QLabel, QMessageBox, QPushButton, QVBoxLayout, QWidget
+
+# columns of the cells of an asset
+COL_ASSET = 0
+COL_QTY = 1
+COL_QTY_BINANCE = 2
+COL_PRU = 3
+COL_PRT = 4
+COL_PRICE = 5
+COL_VALUE = 6
+COL_PNL = 7
 
 
 @dataclass
 class AccountWidgetModel:
     qty: Decimal
-    qty_binance: Decimal
+    qty_binance: Optional[Decimal]
     pru: Decimal
     currency: str
     prt: Decimal
-    price: Decimal
-    value: Decimal
-    pnl: Decimal
+    price: Optional[Decimal]
+    value: Optional[Decimal]
+    pnl: Optional[Decimal]
 
-    @staticmethod
-    def get_qty_binance_for_asset(asset: str, balances: Any) -> Decimal:
-        return Decimal([bal for bal in balances if bal["asset"] == asset][0]["free"])
+    def with_price(self, price: Decimal) -> "AccountWidgetModel":
+        """
+        The model with a new price of the asset
+        """
+        return replace(self, price=price, value=self.qty * price, pnl=self.qty * price - self.prt)
 
     @classmethod
-    def convert_to_AssetModelUI(cls, aw: AssetsWallet, balances: Any, tickers: Any) -> dict[str, "AccountWidgetModel"]:
+    def convert_to_AssetModelUI(cls, aw: AssetsWallet, balances: dict[str, Decimal],
+                                prices: TickerCache) -> dict[str, "AccountWidgetModel"]:
+        """
+        Models of the assets of the wallet
+        :param aw: the assets wallet
+        :param balances: the quantities of the Binance account by asset
+        :param prices: the prices by symbol, the assets without price have no price, value and pnl yet
+        """
         model: dict[str, AccountWidgetModel] = {}
         for asset, data in aw.items():
-            prices = [ticker["price"] for ticker in tickers if ticker["symbol"] == asset + data.currency]
-            if prices:
-                price = Decimal(prices[0])
-                model[asset] = AccountWidgetModel(
-                    data.qty,
-                    cls.get_qty_binance_for_asset(asset, balances),
-                    data.pru,
-                    data.currency,
-                    data.qty * data.pru,
-                    price,
-                    data.qty * price,
-                    data.qty * price - data.qty * data.pru,
-                )
+            model[asset] = AccountWidgetModel(
+                data.qty, balances.get(asset), data.pru, data.currency, data.qty * data.pru, None, None, None)
+            price = prices.get(asset + data.currency)
+            if price is not None:
+                model[asset] = model[asset].with_price(price)
         return model
 
 
+class PriceFeedThread(QThread):
+    """
+    Thread of the Binance client of the AccountWidget : it loads the balances of the account and the prices of the
+    symbols, then follows the prices on the mini ticker stream of the symbols
+    An error of the client (no network, bad keys...) ends the thread and is emitted by failed
+    """
+
+    balances_loaded = Signal(dict)
+    prices_changed = Signal(dict)
+    failed = Signal(object)
+
+    def __init__(self, symbols: list[str]) -> None:
+        super().__init__()
+        self.feed = PriceFeed(symbols, self.prices_changed.emit)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stopped = Event()
+
+    def run(self) -> None:
+        asyncio.run(self._run())
+
+    async def _run(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        # stopped before the loop was set : stop() had nothing to cancel
+        if self.stopped.is_set():
+            return
+        client = None
+        try:
+            from binance import AsyncClient
+
+            client = await AsyncClient.create(moon_config.api_key(), moon_config.api_secret())
+            account = await client.get_account()
+            self.balances_loaded.emit({balance["asset"]: Decimal(balance["free"]) for balance in account["balances"]})
+            self.feed.handle_tickers(await client.get_all_tickers())
+            await self.feed.run(binance_mini_ticker_stream(client, self.feed.streams()))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.failed.emit(e)
+        finally:
+            if client is not None:
+                await client.close_connection()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        loop = self.loop
+        if loop is not None and self.task is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self.task.cancel)
+            except RuntimeError:
+                # the loop was closed since is_closed : the thread is ending
+                pass
+        self.wait()
+
+
 class AccountWidget(QWidget):
     def __init__(self, aw: AssetsWallet) -> None:
         super().__init__()
 
-        self.binance_client = Client(moon_config.api_key(), moon_config.api_secret())
-        balances = self.binance_client.get_account()["balances"]
-        tickers = self.binance_client.get_all_tickers()
-        self.model = AccountWidgetModel.convert_to_AssetModelUI(aw, balances, tickers)
+        # the prices already known are shown, the balances and the prices are then loaded by the feed thread
+        self.model = AccountWidgetModel.convert_to_AssetModelUI(aw, {}, TICKER_CACHE)
+        self.symbol_assets = {asset + aw[asset].currency: asset for asset in aw.keys()}
+        self.cells: dict[str, dict[int, QLabel]] = {}
 
         v_layout = QVBoxLayout()
         g_account_layout = QGridLayout()
@@ -99,19 +169,63 @@ class AccountWidget(QWidget):
         # datas
         line = 1
         for ind, (asset, data) in enumerate(self.model.items(), start=1):
-            g_account_layout.addWidget(QLabel(asset), ind, 0)
-            g_account_layout.addWidget(QLabel(str(round(data.qty, 3))), ind, 1)
-            g_account_layout.addWidget(QLabel(str(round(data.qty_binance, 3))), ind, 2)
-            g_account_layout.addWidget(QLabel(str(round(data.pru, 3)) + " " + data.currency), ind, 3)
-            g_account_layout.addWidget(QLabel(str(round(data.prt, 3)) + " " + data.currency), ind, 4)
-            g_account_layout.addWidget(QLabel(str(round(data.price, 3)) + " " + data.currency), ind, 5)
-            g_account_layout.addWidget(QLabel(str(round(data.value, 3)) + " " + data.currency), ind, 6)
-            g_account_layout.addWidget(QLabel(str(round(data.pnl, 3)) + " " + data.currency), ind, 7)
+            self.cells[asset] = {col: QLabel() for col in range(COL_PNL + 1)}
+            for col, label in self.cells[asset].items():
+                g_account_layout.addWidget(label, ind, col)
+            self.cells[asset][COL_ASSET].setText(asset)
+            self.cells[asset][COL_QTY].setText(str(round(data.qty, 3)))
+            self.cells[asset][COL_PRU].setText(str(round(data.pru, 3)) + " " + data.currency)
+            self.cells[asset][COL_PRT].setText(str(round(data.prt, 3)) + " " + data.currency)
+            self.update_qty_binance_cell(asset)
+            self.update_price_cells(asset)
             line += 1
+
+        self.price_feed_thread = PriceFeedThread(get_wallet_symbols(aw))
+        self.price_feed_thread.balances_loaded.connect(self.update_balances)  # type: ignore
+        self.price_feed_thread.prices_changed.connect(self.update_prices)  # type: ignore
+        self.price_feed_thread.failed.connect(self.show_feed_error)  # type: ignore
+        self.price_feed_thread.start()
         # self.button_send_mail = QPushButton("Mail")
         # self.button_send_mail.clicked.connect(self.send_mail)  # type: ignore
         # glayout.addWidget(self.button_send_mail, line, 0)
 
+    @staticmethod
+    def format_amount(amount: Optional[Decimal], currency: str = "") -> str:
+        if amount is None:
+            return "-"
+        return (str(round(amount, 3)) + " " + currency).rstrip()
+
+    def update_qty_binance_cell(self, asset: str) -> None:
+        self.cells[asset][COL_QTY_BINANCE].setText(AccountWidget.format_amount(self.model[asset].qty_binance))
+
+    def update_price_cells(self, asset: str) -> None:
+        data = self.model[asset]
+        self.cells[asset][COL_PRICE].setText(AccountWidget.format_amount(data.price, data.currency))
+        self.cells[asset][COL_VALUE].setText(AccountWidget.format_amount(data.value, data.currency))
+        self.cells[asset][COL_PNL].setText(AccountWidget.format_amount(data.pnl, data.currency))
+
+    def update_balances(self, balances: dict[str, Decimal]) -> None:
+        for asset, data in self.model.items():
+            data.qty_binance = balances.get(asset)
+            self.update_qty_binance_cell(asset)
+
+    def update_prices(self, prices: dict[str, Decimal]) -> None:
+        """
+        Update the cells of the assets whose price has changed only
+        """
+        for symbol, price in prices.items():
+            asset = self.symbol_assets.get(symbol)
+            if asset is not None:
+                self.model[asset] = self.model[asset].with_price(price)
+                self.update_price_cells(asset)
+
+    def show_feed_error(self, error: Exception) -> None:
+        QMessageBox.warning(self, "Erreur", "Les prix Binance ne sont pas disponibles.\n" + str(error))
+
+    def closeEvent(self, event: Any) -> None:
+        self.price_feed_thread.stop()
+        super().closeEvent(event)
+
     # def get_all_tickers(self) -> None:
     #     rep = self.binance_client.get_all_tickers()
     #     Timer(5, self.get_all_tickers).start()
@@ -1,3 +1,4 @@
+import os
 from decimal import Decimal
 from pprint import pprint
 from pydoc import describe
@@ -5,10 +6,15 @@ from threading import Timer
 from dataclasses import dataclass
 from typing import Any
 
+import moon.common.moon_config as moon_config
+from moon.common.task import TaskProgress, error_message
+from moon.db.db import ConnectionDB, DbProfile
 from moon.model.assets_wallet import AssetWalletData, AssetsWallet
 from moon.model.trade import Trade
+from moon.model.trade_cache import TradeCache
 from moon.model.wallet import Wallet
 from moon.ui.account_widget import AccountWidget
+from moon.ui.tasks import TaskRunner
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QAction, QCloseEvent, QFont, QIcon
 from PySide6.QtWidgets import (
@@ -28,6 +34,10 @@ from PySide6.QtWidgets import (
 # from moon.ui.trade_window import TradesWindow
 
 TRADES_CSV_FILE = "/Users/Patrick/Documents locaux/Finances/Binance-export-trades.csv"
+MOON_DB_FILE = "/Users/Patrick/Documents locaux/Finances/moon.db"
+# columnar cache of the trades, next to the db
+TRADE_CACHE_DIR = os.path.join(os.path.dirname(MOON_DB_FILE), "moon-cache")
+ID_WALLET = 0
 
 
 class MainWindow(QMainWindow):
@@ -39,12 +49,21 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Moon !")
         self.statusBar().showMessage("Prêt")
 
-        # asset dashboard init from csv
-        csv_trades = Trade.get_trades_from_csv_file(TRADES_CSV_FILE)
-        self.assets_wallet, pnl, pnl_total = Wallet.import_trades(0, csv_trades)
-
-        self.central_widget = AccountWidget(self.assets_wallet)
+        # asset dashboard init : import the new trades of the csv and apply them on the wallet checkpoint in a
+        # worker thread, the window is shown meanwhile
+        ConnectionDB.set_db(MOON_DB_FILE, DbProfile.from_config(moon_config.db_profile()))
+        ConnectionDB.create_schema_if_empty()
+        self.task_runner = TaskRunner()
+        self.central_widget: QWidget = QLabel("Chargement du wallet...")
+        self.central_widget.setAlignment(Qt.AlignCenter)
         self.setCentralWidget(self.central_widget)
+        self.task_runner.start(
+            MainWindow.load_wallet,
+            TRADES_CSV_FILE,
+            on_finished=self.show_assets_wallet,
+            on_progress=lambda nb_trades: self.statusBar().showMessage(f"Chargement : {nb_trades} trades"),
+            on_failed=self.show_error,
+        )
 
         # self.init_menu_bar()
 
@@ -78,9 +97,37 @@ class MainWindow(QMainWindow):
         menu_file.addAction(action_import)
         menu_file.addAction(action_exit)
 
-    # def closeEvent(self, event: QCloseEvent) -> None:
-    #     print("Application close event received")
-    #     event.accept()
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self.task_runner.cancel_all()
+        self.stop_account_widget()
+        event.accept()
+
+    def stop_account_widget(self) -> None:
+        if isinstance(self.central_widget, AccountWidget):
+            self.central_widget.price_feed_thread.stop()
+
+    @staticmethod
+    def load_wallet(progress: TaskProgress, filename: str) -> tuple[int, AssetsWallet]:
+        """
+        Import the new trades of a csv file and apply them on the wallet checkpoint (in a worker thread)
+        :return: the number of trades imported and the assets wallet
+        """
+        with ConnectionDB.transaction():
+            nb_new_trades = Trade.import_trades_from_csv_file(ID_WALLET, filename, progress=progress)
+        assets_wallet, pnl, pnl_total = Wallet.import_trades_from_checkpoint(ID_WALLET, progress=progress,
+                                                                             trade_cache=TradeCache(TRADE_CACHE_DIR))
+        return nb_new_trades, assets_wallet
+
+    def show_assets_wallet(self, result: tuple[int, AssetsWallet]) -> None:
+        nb_new_trades, self.assets_wallet = result
+        self.stop_account_widget()
+        self.central_widget = AccountWidget(self.assets_wallet)
+        self.setCentralWidget(self.central_widget)
+        self.statusBar().showMessage("Prêt")
+
+    def show_error(self, error: Exception) -> None:
+        self.statusBar().showMessage("Erreur")
+        QMessageBox.critical(self, "Erreur", error_message(error))
 
     def import_csv_file(self) -> None:
         """
@@ -95,14 +142,19 @@ class MainWindow(QMainWindow):
         dialog.setFileMode(QFileDialog.ExistingFile)
         if dialog.exec_():
             filename = dialog.selectedFiles()
-            QApplication.instance().setOverrideCursor(Qt.WaitCursor)
-            new_trades = Trade.import_trades_from_csv_file(filename)
-            QApplication.instance().restoreOverrideCursor()
-            QMessageBox.information(
-                self,
-                "Import",
-                "Importation réussie.\n Le nombre de trades importés est %i." % (len(new_trades)),
+            self.task_runner.start(
+                MainWindow.load_wallet,
+                filename[0],
+                on_finished=self.show_import_result,
+                on_progress=lambda nb_trades: self.statusBar().showMessage(f"Import : {nb_trades} trades"),
+                on_failed=self.show_error,
+                on_cancelled=lambda: self.statusBar().showMessage("Import annulé"),
             )
-            if new_trades:
-                wallet = Wallet.import_trades(new_trades)
-                self.trades_window.show_trades()
+
+    def show_import_result(self, result: tuple[int, AssetsWallet]) -> None:
+        self.show_assets_wallet(result)
+        QMessageBox.information(
+            self,
+            "Import",
+            "Importation réussie.\n Le nombre de trades importés est %i." % result[0],
+        )
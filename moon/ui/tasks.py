@@ -0,0 +1,85 @@
+from typing import Any, Callable, Optional
+
+from moon.common.task import TaskCancelled, TaskProgress
+from moon.db.db import ConnectionDB
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+class TaskSignals(QObject):
+    """
+    Signals of a task, emitted in the worker thread and received in the GUI thread
+    """
+
+    progress = Signal(int)
+    finished = Signal(object)
+    failed = Signal(object)
+    cancelled = Signal()
+
+
+class Task(QRunnable):
+    """
+    Function run in a thread of a QThreadPool : fn(progress, *args) where progress is the TaskProgress of the task
+    The result of the function is emitted by finished, its exception by failed, TaskCancelled by cancelled
+    """
+
+    def __init__(self, fn: Callable[..., Any], *args: Any) -> None:
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = TaskSignals()
+        self.progress = TaskProgress(self.signals.progress.emit)
+
+    def cancel(self) -> None:
+        self.progress.cancel()
+
+    def run(self) -> None:
+        try:
+            result = self.fn(self.progress, *self.args)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            # the connection of the worker thread isn't kept between the tasks
+            ConnectionDB.close()
+
+
+class TaskRunner:
+    """
+    Run the tasks of a window in a thread pool, keeps the running tasks to cancel them (ie when the window is closed)
+    """
+
+    def __init__(self, pool: Optional[QThreadPool] = None) -> None:
+        self.pool = pool if pool is not None else QThreadPool.globalInstance()
+        self.tasks: list[Task] = []
+
+    def start(self, fn: Callable[..., Any], *args: Any, on_finished: Optional[Callable[[Any], Any]] = None,
+              on_progress: Optional[Callable[[int], Any]] = None,
+              on_failed: Optional[Callable[[Exception], Any]] = None,
+              on_cancelled: Optional[Callable[[], Any]] = None) -> Task:
+        """
+        Run fn(progress, *args) in the pool, the callbacks are called in the GUI thread
+        :return: the task
+        """
+        task = Task(fn, *args)
+        for signal, slot in ((task.signals.finished, on_finished), (task.signals.progress, on_progress),
+                             (task.signals.failed, on_failed), (task.signals.cancelled, on_cancelled)):
+            if slot is not None:
+                signal.connect(slot)
+        for signal in (task.signals.finished, task.signals.failed, task.signals.cancelled):
+            signal.connect(lambda *_, t=task: self.tasks.remove(t) if t in self.tasks else None)
+        self.tasks.append(task)
+        self.pool.start(task)
+        return task
+
+    def cancel_all(self, wait: bool = True) -> None:
+        """
+        Cancel the running tasks
+        :param wait: wait for the end of the tasks of the pool
+        """
+        for task in self.tasks:
+            task.cancel()
+        if wait:
+            self.pool.waitForDone()
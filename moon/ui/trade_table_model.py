@@ -0,0 +1,147 @@
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Optional, cast
+
+import PySide6.QtCore as QtCore
+from babel.numbers import format_decimal
+from moon.model.trade import TradeBatch
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+TRADE_COL_LABELS = [
+    "Id",
+    "Pair",
+    "Type",
+    "Quantité",
+    "Prix",
+    "Total",
+    "Date",
+    "Taxe",
+    "Taxe devise",
+    "Id origine",
+    "Origine",
+]
+TRADE_COL_ID = 0
+TRADE_COL_PAIR = 1
+TRADE_COL_TYPE = 2
+TRADE_COL_QTY = 3
+TRADE_COL_PRICE = 4
+TRADE_COL_TOTAL = 5
+TRADE_COL_DATE = 6
+TRADE_COL_FEE = 7
+TRADE_COL_FEE_ASSET = 8
+TRADE_COL_FEE_ORIGIN_ID = 9
+TRADE_COL_FEE_ORIGIN = 10
+
+# attribute of the trades (column of the batch and sort column of Trade.find) of each column
+TRADE_COL_FIELDS = TradeBatch.COLUMNS
+
+# number of trades read at once
+PAGE_SIZE = 500
+
+
+class TradeTableModel(QAbstractTableModel):
+    """
+    Trades of a search, read page by page from the db when the view scrolls (canFetchMore/fetchMore)
+    The trades are kept in a TradeBatch, the cells are formatted when they are displayed, the sort is done by the db
+    """
+
+    # criteria of the search to read again from its first page after a sort
+    sort_changed = QtCore.Signal(dict)
+
+    def __init__(self, page_size: int = PAGE_SIZE, parent: Optional[QtCore.QObject] = None) -> None:
+        super().__init__(parent)
+        self.page_size = page_size
+        # criteria of the search, None before the first search
+        self.criteria: Optional[dict[str, Any]] = None
+        self.order_by = 'date'
+        self.descending = False
+        self.trades = TradeBatch()
+        self.exhausted = True
+
+    def set_search(self, criteria: dict[str, Any], first_page: Optional[TradeBatch] = None) -> None:
+        """
+        New search
+        :param criteria: the criteria of Trade.find (pair, trade_type, begin_date, end_date...)
+        :param first_page: the first page of the search if it has already been read (ie in a worker thread), it's read
+        by the next fetchMore otherwise
+        """
+        self.beginResetModel()
+        self.criteria = criteria
+        self.trades = first_page if first_page is not None else TradeBatch()
+        self.exhausted = first_page is not None and len(first_page) < self.page_size
+        self.endResetModel()
+
+    def find_page(self, offset: int, criteria: Optional[dict[str, Any]] = None) -> TradeBatch:
+        """
+        Page of the trades of the search (or of criteria) from offset, in the order of the model
+        The page is read after the last trade read (keyset pagination on the sort column and the id) instead of
+        skipping the offset first trades
+        """
+        criteria = criteria if criteria is not None else self.criteria or {}
+        # the trades of the model are read in db : they have an id
+        after = (getattr(self.trades, self.order_by)[offset - 1], cast(int, self.trades.id[offset - 1])) \
+            if offset else None
+        return TradeBatch.find_page(**criteria, after=after, limit=self.page_size, descending=self.descending,
+                                    order_by=self.order_by)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.trades)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(TRADE_COL_LABELS)
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        if parent.isValid():
+            return
+        page = self.find_page(len(self.trades))
+        self.exhausted = len(page) < self.page_size
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.trades), len(self.trades) + len(page) - 1)
+            self.trades.extend(page)
+            self.endInsertRows()
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        value = getattr(self.trades, TRADE_COL_FIELDS[index.column()])[index.row()]
+        if role == Qt.DisplayRole:
+            return TradeTableModel.format_value(value)
+        if role == Qt.TextAlignmentRole and isinstance(value, Decimal):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    @staticmethod
+    def format_value(value: Any) -> str:
+        if isinstance(value, Decimal):
+            return format_decimal(value, decimal_quantization=False)
+        if isinstance(value, Enum):
+            return str(value.value)
+        if value is None:
+            return ""
+        return str(value)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return TRADE_COL_LABELS[section]
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        """
+        Sort by the db : the search is read again from its first page in the new order
+        The first page isn't read here (in the GUI thread) : sort_changed is emitted to read it (ie in a worker
+        thread), then it's shown by set_search
+        """
+        self.order_by = TRADE_COL_FIELDS[column]
+        self.descending = order == Qt.DescendingOrder
+        self.beginResetModel()
+        self.trades = TradeBatch()
+        self.exhausted = True
+        self.endResetModel()
+        if self.criteria is not None:
+            self.sort_changed.emit(self.criteria)
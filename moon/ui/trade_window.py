@@ -1,12 +1,12 @@
 import datetime
+from typing import Optional
 
 import PySide6.QtCore as QtCore
 import dateutils
 from PySide6.QtWidgets import (
     QWidget,
-    QTableWidget,
+    QTableView,
     QVBoxLayout,
-    QTableWidgetItem,
     QHBoxLayout,
     QLineEdit,
     QLabel,
@@ -14,39 +14,19 @@ from PySide6.QtWidgets import (
     QDateEdit,
     QGroupBox,
     QPushButton,
+    QMessageBox,
 )
-from babel.numbers import format_decimal
-from moon.model.trade import Trade, TradeType
-
-TRADE_COL_LABELS = [
-    "Id",
-    "Pair",
-    "Type",
-    "Quantité",
-    "Prix",
-    "Total",
-    "Date",
-    "Taxe",
-    "Taxe devise",
-    "Id origine",
-    "Origine",
-]
-TRADE_COL_ID = 0
-TRADE_COL_PAIR = 1
-TRADE_COL_TYPE = 2
-TRADE_COL_QTY = 3
-TRADE_COL_PRICE = 4
-TRADE_COL_TOTAL = 5
-TRADE_COL_DATE = 6
-TRADE_COL_FEE = 7
-TRADE_COL_FEE_ASSET = 8
-TRADE_COL_FEE_ORIGIN_ID = 9
-TRADE_COL_FEE_ORIGIN = 10
+from moon.common.task import TaskProgress, error_message
+from moon.model.trade import Trade, TradeBatch, TradeType
+from moon.ui.tasks import Task, TaskRunner
+from moon.ui.trade_table_model import TRADE_COL_DATE, TRADE_COL_ID, TradeTableModel
 
 
 class TradesWindow(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
+        self.task_runner = TaskRunner()
+        self.search_task: Optional[Task] = None
         self.init_ui()
         # self.show_trades()
 
@@ -56,7 +36,7 @@ class TradesWindow(QWidget):
         self.pair = QComboBox()
         self.pair.setEditable(True)
         self.pair.addItem("")
-        for pair in TradeDB.get_trade_db().get_pairs():
+        for pair in sorted(Trade.get_pairs()):
             self.pair.addItem(pair)
 
         self.type_label = QLabel("Type :")
@@ -78,12 +58,13 @@ class TradesWindow(QWidget):
         self.search_button.clicked.connect(self.search_trades)
 
         # trade tables
-        self.trades_table = QTableWidget()
-        self.trades_table.setColumnCount(len(TRADE_COL_LABELS))
-        self.trades_table.setHorizontalHeaderLabels(TRADE_COL_LABELS)
-        self.trades_table.setColumnHidden(0, True)
-        self.trades_table.itemClicked.connect(self.item_clicked)
-        self.trades_table.cellClicked.connect(self.cell_clicked)
+        self.trades_model = TradeTableModel()
+        self.trades_model.sort_changed.connect(self.load_first_page)
+        self.trades_table = QTableView()
+        self.trades_table.setModel(self.trades_model)
+        self.trades_table.setColumnHidden(TRADE_COL_ID, True)
+        self.trades_table.horizontalHeader().setSortIndicator(TRADE_COL_DATE, QtCore.Qt.AscendingOrder)
+        self.trades_table.setSortingEnabled(True)
 
         # layout
         v_layout = QVBoxLayout(self)
@@ -106,87 +87,47 @@ class TradesWindow(QWidget):
         v_layout.addWidget(criteria_group_box)
         v_layout.addWidget(self.trades_table)
 
-    def item_clicked(self, item):
-        print("item_clicked")
-        print(str(item))
-
-    def cell_clicked(self, row, col):
-        print("cell_clicked")
-        print(row, col)
-
     def search_trades(self) -> None:
-        trade_db = TradeDB.get_trade_db()
-        trades = trade_db.find(
-            self.pair.currentText(),
-            self.type.itemData(self.type.currentIndex()),
-            utils.convert_date_to_datetime(
-                self.begin_date.date().toPython(), "00:00:00"
-            ),
-            utils.convert_date_to_datetime(self.end_date.date().toPython(), "23:59:59"),
-            
+        """
+        Search the trades in a worker thread, a new search cancels the previous one
+        """
+        self.load_first_page({
+            "pair": self.pair.currentText() or None,
+            "trade_type": self.type.itemData(self.type.currentIndex()),
+            "begin_date": datetime.datetime.combine(self.begin_date.date().toPython(), datetime.time.min),
+            "end_date": datetime.datetime.combine(self.end_date.date().toPython(), datetime.time.max),
+        })
+
+    def load_first_page(self, criteria: dict) -> None:
+        """
+        Read the first page of a search in a worker thread (a new search or a new sort), cancels the previous read
+        """
+        if self.search_task is not None:
+            self.search_task.cancel()
+        self.search_task = self.task_runner.start(
+            TradesWindow.find_first_page,
+            self.trades_model,
+            criteria,
+            on_finished=lambda first_page: self.show_trades(criteria, first_page),
+            on_failed=self.show_error,
         )
-        self.trades_table.clearContents()
-        self.trades_table.setRowCount(len(trades))
-        row = 0
-        for trade in trades:
-            self.add_trade_to_table(row, trade)
-            row += 1
-        self.trades_table.setSortingEnabled(True)
-        self.trades_table.sortByColumn(TRADE_COL_DATE, QtCore.Qt.AscendingOrder)
+
+    @staticmethod
+    def find_first_page(progress: TaskProgress, model: TradeTableModel, criteria: dict) -> TradeBatch:
+        """
+        First page of the trades of a search (in a worker thread), the next pages are read when the table scrolls
+        """
+        first_page = model.find_page(0, criteria)
+        # the result of a cancelled search isn't shown
+        progress.check()
+        return first_page
+
+    def show_trades(self, criteria: dict, first_page: TradeBatch) -> None:
+        self.search_task = None
+        self.trades_model.set_search(criteria, first_page)
+        # the widths of the columns from the first page only
         self.trades_table.resizeColumnsToContents()
 
-    def add_trade_to_table(self, row: int, trade: Trade) -> None:
-        # id : not visible
-        item = QTableWidgetItem(str(trade.id))
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_ID, item)
-
-        # pair
-        item = QTableWidgetItem(trade.pair)
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_PAIR, item)
-
-        # type
-        item = QTableWidgetItem(trade.type.value)
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_TYPE, item)
-
-        # qty
-        item = QTableWidgetItem(format_decimal(trade.qty, decimal_quantization=False))
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_QTY, item)
-
-        # price
-        item = QTableWidgetItem(format_decimal(trade.price, decimal_quantization=False))
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_PRICE, item)
-
-        # total
-        item = QTableWidgetItem(format_decimal(trade.total, decimal_quantization=False))
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_TOTAL, item)
-
-        # date
-        item = QTableWidgetItem(str(trade.date))
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_DATE, item)
-
-        # fee
-        item = QTableWidgetItem(format_decimal(trade.fee, decimal_quantization=False))
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_FEE, item)
-
-        # fee asset
-        item = QTableWidgetItem(trade.fee_asset)
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_FEE_ASSET, item)
-
-        # origin id
-        item = QTableWidgetItem(trade.origin_id)
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_FEE_ORIGIN_ID, item)
-
-        # origin
-        item = QTableWidgetItem(trade.origin.value)
-        item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        self.trades_table.setItem(row, TRADE_COL_FEE_ORIGIN, item)
+    def show_error(self, error: Exception) -> None:
+        self.search_task = None
+        QMessageBox.critical(self, "Erreur", error_message(error))
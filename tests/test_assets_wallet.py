@@ -1,3 +1,4 @@
+import sqlite3
 from decimal import Decimal
 from unittest.mock import patch
 
@@ -55,12 +56,12 @@ def test_load(fill_db):
     assert len(aw2) == 1
 
 
-def test_insert_assets(fill_db):
+def test_upsert_assets_insert(fill_db):
     aw = AssetsWallet.load(1)
     new_aw = {}
     new_aw['ADA'] = AssetWalletData(None, Decimal('11.0'), Decimal('2.0'), 'EUR')
     new_aw['DOT'] = AssetWalletData(None, Decimal('5.5'), Decimal('1.9'), 'EUR')
-    aw._insert_assets(new_aw)
+    aw._upsert_assets(new_aw)
     aw = AssetsWallet.load(1)
     assert len(aw) == 4
     assert 'ADA' in aw.assets_wallet.keys()
@@ -75,56 +76,102 @@ def test_insert_assets(fill_db):
     assert aw.assets_wallet['DOT'].currency == 'EUR'
 
 
-def test_update_assets(fill_db):
+def test_upsert_assets_update(fill_db):
     aw = AssetsWallet.load(1)
-    aw._update_assets({'BTC': AssetWalletData(aw['BTC'].id, Decimal('120.0'), Decimal('3.0'), 'EUR')})
+    aw._upsert_assets({'BTC': AssetWalletData(None, Decimal('120.0'), Decimal('3.0'), 'EUR')})
     aw = AssetsWallet.load(1)
     assert len(aw.get_assets()) == 2
+    assert aw['BTC'].id == 1
     assert aw['BTC'].qty == Decimal('120.0')
     assert aw['BTC'].pru == Decimal('3.0')
 
 def test_delete_assets(fill_db):
     aw = AssetsWallet.load(1)
     assert len(aw) == 2
-    aw._delete_assets([aw['BTC'].id])
+    aw._delete_assets(['BTC'])
     aw = AssetsWallet.load(1)
     assert len(aw) == 1
+    assert AssetsWallet.load(2) is not None
 
 
-
-@patch.object(AssetsWallet, '_insert_assets')
-@patch.object(AssetsWallet, '_update_assets')
+@patch.object(AssetsWallet, '_upsert_assets')
 @patch.object(AssetsWallet, '_delete_assets')
-def test_save_insert(mock_delete, mock_update, mock_insert, fill_db):
+def test_save_insert(mock_delete, mock_upsert, fill_db):
     aw = AssetsWallet.load(1)
     aw['ADA'] = AssetWalletData(None, Decimal('1.0'), Decimal('2.0'), 'EUR')
-    aw.save()
-    mock_insert.assert_called_once()
-    mock_update.assert_not_called()
+    with patch.object(AssetsWallet, 'load') as mock_load:
+        aw.save()
+        mock_load.assert_not_called()
+    mock_upsert.assert_called_once_with({'ADA': AssetWalletData(None, Decimal('1.0'), Decimal('2.0'), 'EUR')})
     mock_delete.assert_not_called()
 
 
-@patch.object(AssetsWallet, '_insert_assets')
-@patch.object(AssetsWallet, '_update_assets')
+@patch.object(AssetsWallet, '_upsert_assets')
 @patch.object(AssetsWallet, '_delete_assets')
-def test_save_update(mock_delete, mock_update, mock_insert, fill_db):
+def test_save_update(mock_delete, mock_upsert, fill_db):
     aw = AssetsWallet.load(1)
     aw['BTC'].qty = Decimal('12.0')
     aw.save()
-    mock_insert.assert_not_called()
-    mock_update.assert_called_once()
+    mock_upsert.assert_called_once_with({'BTC': aw['BTC']})
     mock_delete.assert_not_called()
 
-@patch.object(AssetsWallet, '_insert_assets')
-@patch.object(AssetsWallet, '_update_assets')
+@patch.object(AssetsWallet, '_upsert_assets')
 @patch.object(AssetsWallet, '_delete_assets')
-def test_save_delete(mock_delete, mock_update, mock_insert, fill_db):
+def test_save_delete(mock_delete, mock_upsert, fill_db):
     aw = AssetsWallet.load(1)
     del aw['BTC']
     aw.save()
-    mock_insert.assert_not_called()
-    mock_update.assert_not_called()
-    mock_delete.assert_called_once()
+    mock_upsert.assert_not_called()
+    mock_delete.assert_called_once_with(['BTC'])
+
+
+@patch.object(AssetsWallet, '_upsert_assets')
+@patch.object(AssetsWallet, '_delete_assets')
+def test_save_no_change(mock_delete, mock_upsert, fill_db):
+    aw = AssetsWallet.load(1)
+    aw.save()
+    mock_upsert.assert_not_called()
+    mock_delete.assert_not_called()
+
+
+def test_save(fill_db):
+    aw = AssetsWallet.load(1)
+    aw['BTC'].qty = Decimal('12.0')
+    aw['ADA'] = AssetWalletData(None, Decimal('1.0'), Decimal('2.0'), 'EUR')
+    del aw['ETH']
+    aw.save()
+    assert aw.get_changes() == ({}, [])
+    aw = AssetsWallet.load(1)
+    assert sorted(aw.get_assets()) == ['ADA', 'BTC']
+    assert aw['BTC'].qty == Decimal('12.0')
+    assert AssetsWallet.load(2) is not None
+
+
+def test_save_not_loaded(fill_db):
+    aw = AssetsWallet(1, {'BTC': AssetWalletData(None, Decimal('3.0'), Decimal('2.0'), 'EUR')})
+    aw.save()
+    aw = AssetsWallet.load(1)
+    # ETH, not in the assets wallet, is deleted
+    assert aw.get_assets() == ['BTC']
+    assert aw['BTC'].id == 1
+    assert aw['BTC'].qty == Decimal('3.0')
+    assert AssetsWallet.load(2) is not None
+
+
+def test_save_not_loaded_empty(fill_db):
+    AssetsWallet(1).save()
+    assert AssetsWallet.load(1) is None
+
+
+def test_save_rollback(fill_db):
+    aw = AssetsWallet.load(1)
+    aw['ADA'] = AssetWalletData(None, Decimal('1.0'), Decimal('2.0'), 'EUR')
+    del aw['BTC']
+    with patch.object(AssetsWallet, '_delete_assets', side_effect=sqlite3.OperationalError):
+        with pytest.raises(sqlite3.OperationalError):
+            aw.save()
+    assert sorted(AssetsWallet.load(1).get_assets()) == ['BTC', 'ETH']
+    assert aw.get_changes() != ({}, [])
 
 def test_delete(fill_db):
     aw = AssetsWallet.load(1)
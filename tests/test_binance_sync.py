@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from moon.db.db import ConnectionDB, to_epoch_ms
+from moon.model.trade import Trade, TradeOrigin, TradeType
+from moon.sync.binance_sync import BinanceSync, RateLimiter
+
+
+@pytest.fixture
+def setup_db():
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ddl = f.read()
+        ConnectionDB.get_cursor().executescript(ddl)
+
+
+def binance_trade(pair: str, id_: int) -> dict:
+    return {'symbol': pair, 'id': id_, 'orderId': id_, 'price': '100.5', 'qty': '0.1', 'quoteQty': '10.05',
+            'commission': '0.0001', 'commissionAsset': 'BNB', 'time': to_epoch_ms(datetime(2021, 5, 1, 0, id_)),
+            'isBuyer': id_ % 2 == 0, 'isMaker': False}
+
+
+class FakeClient:
+    """
+    Binance client with the trades of the account by pair
+    """
+
+    def __init__(self, trades: dict[str, list[dict]]):
+        self.trades = trades
+        self.calls: list[tuple[str, int]] = []
+        self.running = 0
+        self.max_running = 0
+
+    async def get_my_trades(self, symbol: str, fromId: int = 0, limit: int = 500) -> list[dict]:
+        self.calls.append((symbol, fromId))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0)
+        self.running -= 1
+        return [trade for trade in self.trades.get(symbol, []) if trade['id'] >= fromId][:limit]
+
+
+@pytest.fixture
+def client():
+    return FakeClient({'BTCEUR': [binance_trade('BTCEUR', i) for i in range(5)],
+                       'ETHEUR': [binance_trade('ETHEUR', i) for i in range(10, 13)],
+                       'BNBEUR': []})
+
+
+def test_convert_trade():
+    assert BinanceSync.convert_trade(binance_trade('BTCEUR', 2)) == Trade(
+        None, 'BTCEUR', TradeType.BUY, Decimal('0.1'), Decimal('100.5'), Decimal('10.05'), datetime(2021, 5, 1, 0, 2),
+        Decimal('0.0001'), 'BNB', '2', TradeOrigin.BINANCE)
+
+
+def test_sync(setup_db, client):
+    binance_sync = BinanceSync(client, max_concurrency=2, limit=2)
+    assert asyncio.run(binance_sync.sync(1, ['BTCEUR', 'ETHEUR', 'BNBEUR'])) == 8
+    assert client.max_running == 2
+    # pages of 2 trades
+    assert sorted(client.calls) == [('BNBEUR', 0), ('BTCEUR', 0), ('BTCEUR', 2), ('BTCEUR', 4), ('ETHEUR', 0),
+                                    ('ETHEUR', 12)]
+    assert [trade.origin_id for trade in Trade.find(1, 'BTCEUR')] == ['0', '1', '2', '3', '4']
+    assert Trade.get_last_origin_ids(1) == {'BTCEUR': 4, 'ETHEUR': 12}
+
+    # only the new fills are fetched
+    client.trades['BTCEUR'].append(binance_trade('BTCEUR', 5))
+    client.calls.clear()
+    assert asyncio.run(binance_sync.sync(1, ['BTCEUR', 'ETHEUR'])) == 1
+    assert sorted(client.calls) == [('BTCEUR', 5), ('ETHEUR', 13)]
+    assert len(Trade.find(1)) == 9
+
+
+def test_sync_after_csv_import(setup_db, client, tmp_path):
+    # the ETHEUR fills exported in a csv file (no milliseconds) then imported
+    for trade in client.trades['ETHEUR']:
+        trade['time'] += 250
+    filename = tmp_path / 'ETHEUR.csv'
+    filename.write_text(''.join(
+        f"2021-05-01 00:{trade['id']:02}:00;ETHEUR;{'BUY' if trade['isBuyer'] else 'SELL'};{trade['price']};"
+        f"{trade['qty']};{trade['quoteQty']};{trade['commission']};{trade['commissionAsset']}\n"
+        for trade in client.trades['ETHEUR']))
+    assert Trade.import_trades_from_csv_file(1, str(filename)) == 3
+    assert Trade.get_last_origin_ids(1) == {}
+
+    binance_sync = BinanceSync(client)
+    # the fills of the csv file are linked to their Binance id, not imported again
+    assert asyncio.run(binance_sync.sync(1, ['ETHEUR'])) == 0
+    assert [trade.origin_id for trade in Trade.find(1, 'ETHEUR')] == ['10', '11', '12']
+    assert Trade.get_last_origin_ids(1) == {'ETHEUR': 12}
+
+    client.calls.clear()
+    assert asyncio.run(binance_sync.sync(1, ['ETHEUR'])) == 0
+    assert client.calls == [('ETHEUR', 13)]
+    # a new import of the csv file finds the trades linked
+    assert Trade.import_trades_from_csv_file(1, str(filename)) == 0
+    assert len(Trade.find(1)) == 3
+
+
+def test_rate_limiter():
+    now = [0.0]
+    sleeps = []
+
+    async def sleep(duration):
+        sleeps.append(duration)
+        now[0] += duration
+
+    async def acquire_all():
+        rate_limiter = RateLimiter(30, 60.0, lambda: now[0], sleep)
+        for _ in range(3):
+            await rate_limiter.acquire(10)
+            now[0] += 1
+        # the window is full until the first request expires
+        await rate_limiter.acquire(10)
+        # weight used by another client of the account
+        rate_limiter.update_used_weight(40)
+        await rate_limiter.acquire(10)
+        with pytest.raises(ValueError):
+            await rate_limiter.acquire(40)
+
+    asyncio.run(acquire_all())
+    assert sleeps == [57.0, 1.0, 1.0]
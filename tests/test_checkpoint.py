@@ -0,0 +1,105 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from moon.db.db import ConnectionDB
+from moon.model.assets_wallet import AssetsWallet, AssetWalletData
+from moon.model.checkpoint import Checkpoint
+from moon.model.pnl_total import PnlTotal, PnlTotalBook
+from moon.model.trade import Trade, TradeType, TradeOrigin
+
+
+@pytest.fixture
+def setup_db():
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ddl = f.read()
+        ConnectionDB.get_cursor().executescript(ddl)
+
+
+@pytest.fixture
+def checkpoint(setup_db):
+    aw = AssetsWallet(1, {'BTC': AssetWalletData(None, Decimal('0.00000001'), Decimal('1000.123456789'), 'EUR'),
+                          'EUR': AssetWalletData(None, Decimal('-10.5'), Decimal('0.0'), '')})
+    c = Checkpoint(1, datetime.fromisoformat('2021-05-04 14:00:00'), 2, aw,
+                   PnlTotalBook([PnlTotal(None, 'BTC', Decimal('12.5'), 'EUR')]))
+    c.save()
+    return c
+
+
+def make_trade(date: str) -> Trade:
+    return Trade(None, 'BTCEUR', TradeType.BUY, Decimal('1'), Decimal('2'), Decimal('2'),
+                 datetime.fromisoformat(date), Decimal('0'), 'EUR', '', TradeOrigin.BINANCE)
+
+
+def test_load_none(setup_db):
+    assert Checkpoint.load(1) is None
+
+
+def test_save_load(checkpoint):
+    c = Checkpoint.load(1)
+    assert c is not None
+    assert c.last_trade_id == 2
+    assert c.assets_wallet == checkpoint.assets_wallet
+    assert c.assets_wallet['BTC'].qty == Decimal('0.00000001')
+    assert c.assets_wallet['BTC'].pru == Decimal('1000.123456789')
+    assert c.pnl_total_book == checkpoint.pnl_total_book
+
+
+def test_invalidate(checkpoint):
+    Checkpoint.invalidate(1)
+    assert Checkpoint.load(1) is None
+
+
+def test_invalidate_after(checkpoint):
+    Checkpoint.invalidate(1, datetime.fromisoformat('2021-05-05 14:00:00'))
+    assert Checkpoint.load(1) is not None
+    Checkpoint.invalidate(2, datetime.fromisoformat('2021-05-01 14:00:00'))
+    assert Checkpoint.load(1) is not None
+
+
+def test_invalidate_before(checkpoint):
+    Checkpoint.invalidate(1, datetime.fromisoformat('2021-05-03 14:00:00'))
+    assert Checkpoint.load(1) is None
+
+
+def test_trade_save_newer_keeps_checkpoint(checkpoint):
+    make_trade('2021-05-05 14:00:00').save(1)
+    assert Checkpoint.load(1) is not None
+
+
+def test_trade_save_older_invalidates_checkpoint(checkpoint):
+    make_trade('2021-05-01 14:00:00').save(1)
+    assert Checkpoint.load(1) is None
+
+
+def test_trade_save_all_older_invalidates_checkpoint(checkpoint):
+    Trade.save_all(1, [make_trade('2021-05-05 14:00:00'), make_trade('2021-05-01 14:00:00')])
+    assert Checkpoint.load(1) is None
+
+
+def test_trade_update_applied_trade_invalidates_checkpoint(setup_db):
+    trade = make_trade('2021-05-01 14:00:00')
+    trade.save(1)
+    Checkpoint(1, datetime.fromisoformat('2021-05-04 14:00:00'), trade.id).save()
+    # the trade is moved after the checkpoint but was already applied on it
+    trade.date = datetime.fromisoformat('2021-05-10 14:00:00')
+    trade.save(1)
+    assert Checkpoint.load(1) is None
+
+
+def test_trade_delete_invalidates_checkpoint(setup_db):
+    trade = make_trade('2021-05-01 14:00:00')
+    trade.save(1)
+    Checkpoint(1, datetime.fromisoformat('2021-05-04 14:00:00'), trade.id).save()
+    trade.delete()
+    assert Checkpoint.load(1) is None
+
+
+def test_trade_delete_not_applied_keeps_checkpoint(setup_db):
+    trade = make_trade('2021-05-10 14:00:00')
+    trade.save(1)
+    Checkpoint(1, datetime.fromisoformat('2021-05-04 14:00:00'), 1).save()
+    trade.delete()
+    assert Checkpoint.load(1) is not None
@@ -0,0 +1,205 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from moon.db.db import ConnectionDB, DbProfile, DB_PROFILES, from_epoch_ms, to_epoch_ms
+from moon.model.wallet import Wallet
+
+
+@pytest.fixture
+def setup_db():
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ddl = f.read()
+        ConnectionDB.get_cursor().executescript(ddl)
+
+
+@pytest.fixture
+def setup_file_db(tmp_path):
+    ConnectionDB.set_db(str(tmp_path / 'moon.db'))
+    with open('./moon/db/db.sql', 'r') as f:
+        ddl = f.read()
+        ConnectionDB.get_cursor().executescript(ddl)
+    yield
+    ConnectionDB.set_db(':memory:')
+
+
+def run_in_thread(function):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_connection_per_thread(setup_db):
+    conn = ConnectionDB.get_connection()
+    assert ConnectionDB.get_connection() is conn
+    assert run_in_thread(ConnectionDB.get_connection) is not conn
+
+
+def test_memory_db_shared_by_threads(setup_db):
+    Wallet(None, 'wallet1').save()
+    ConnectionDB.commit()
+    assert [w.name for w in run_in_thread(Wallet.find)] == ['wallet1']
+
+
+def test_cursors_not_shared(setup_db):
+    Wallet(None, 'wallet1').save()
+    Wallet(None, 'wallet2').save()
+    cur1 = ConnectionDB.get_cursor().execute("select name from wallet order by id")
+    cur2 = ConnectionDB.get_cursor().execute("select id from wallet order by id")
+    assert cur1.fetchone() == ('wallet1',)
+    assert cur2.fetchall() == [(1,), (2,)]
+    assert cur1.fetchone() == ('wallet2',)
+
+
+def test_set_db_closes_connections(setup_db):
+    conn = ConnectionDB.get_connection()
+    ConnectionDB.set_db(':memory:')
+    assert ConnectionDB.get_connection() is not conn
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("select 1")
+    # a new memory db
+    assert ConnectionDB.get_connection().execute("select name from sqlite_master").fetchall() == []
+
+
+def test_writer_commit(setup_db):
+    with ConnectionDB.writer():
+        Wallet(None, 'wallet1').save()
+    assert not ConnectionDB.get_connection().in_transaction
+    assert len(run_in_thread(Wallet.find)) == 1
+
+
+def test_writer_rollback(setup_db):
+    with pytest.raises(ValueError):
+        with ConnectionDB.writer():
+            Wallet(None, 'wallet1').save()
+            raise ValueError()
+    assert Wallet.find() == []
+
+
+def test_reader(setup_db):
+    Wallet(None, 'wallet1').save()
+    ConnectionDB.commit()
+    with ConnectionDB.reader() as conn:
+        assert ConnectionDB.get_connection() is conn
+        assert [w.name for w in Wallet.find()] == ['wallet1']
+        with pytest.raises(sqlite3.OperationalError):
+            Wallet(None, 'wallet2').save()
+    assert ConnectionDB.get_connection() is not conn
+    # the reader connection is back in the pool
+    with ConnectionDB.reader() as conn2:
+        assert conn2 is conn
+
+
+def test_reader_during_write(setup_file_db):
+    Wallet(None, 'wallet1').save()
+    ConnectionDB.commit()
+    assert ConnectionDB.get_connection().execute("pragma journal_mode").fetchone() == ('wal',)
+    with ConnectionDB.writer():
+        Wallet(None, 'wallet2').save()
+        # the readers of the other threads see the last committed data without waiting for the writer
+        def read():
+            with ConnectionDB.reader():
+                return [w.name for w in Wallet.find()]
+        assert run_in_thread(read) == ['wallet1']
+    assert run_in_thread(read) == ['wallet1', 'wallet2']
+
+
+def test_create_schema_if_empty(tmp_path):
+    ConnectionDB.set_db(str(tmp_path / 'new.db'))
+    try:
+        assert ConnectionDB.create_schema_if_empty()
+        Wallet(None, 'wallet1').save()
+        ConnectionDB.commit()
+        assert not ConnectionDB.create_schema_if_empty()
+        assert len(Wallet.find()) == 1
+    finally:
+        ConnectionDB.set_db(':memory:')
+
+
+def test_profile_from_config():
+    assert DbProfile.from_config(None) == DB_PROFILES['default']
+    assert DbProfile.from_config('fast') == DB_PROFILES['fast']
+    assert DbProfile.from_config({'profile': 'fast', 'synchronous': 'normal', 'mmap-size': 0}) == \
+           DbProfile(synchronous='normal', cache_size=DB_PROFILES['fast'].cache_size, mmap_size=0)
+
+
+@pytest.mark.parametrize('config', ['xxx', {'synchronous': 'always'}, {'cache-size': '1000'}, {'page_size': 4096}])
+def test_profile_from_config_invalid(config):
+    with pytest.raises(ValueError):
+        DbProfile.from_config(config)
+
+
+def test_profile_applied(tmp_path):
+    ConnectionDB.set_db(str(tmp_path / 'moon.db'), DbProfile(journal_mode='truncate', synchronous='off',
+                                                            cache_size=-1000, mmap_size=0, temp_store='file'))
+    try:
+        conn = ConnectionDB.get_connection()
+        assert conn.execute("pragma journal_mode").fetchone() == ('truncate',)
+        assert conn.execute("pragma synchronous").fetchone() == (0,)
+        assert conn.execute("pragma cache_size").fetchone() == (-1000,)
+        assert conn.execute("pragma mmap_size").fetchone() == (0,)
+        assert conn.execute("pragma temp_store").fetchone() == (1,)
+        # the profile of the reader connections too
+        with ConnectionDB.reader() as reader:
+            assert reader.execute("pragma synchronous").fetchone() == (0,)
+    finally:
+        ConnectionDB.set_db(':memory:')
+
+
+def test_transaction(setup_db):
+    with ConnectionDB.transaction() as transaction:
+        Wallet(None, 'wallet1').save()
+        # deferred to the end of the transaction
+        ConnectionDB.commit()
+        assert ConnectionDB.get_connection().in_transaction
+        ConnectionDB.count_writes('wallet', 1)
+    assert not ConnectionDB.get_connection().in_transaction
+    assert transaction.rows_written == {'wallet': 1}
+    assert len(run_in_thread(Wallet.find)) == 1
+
+
+def test_transaction_rollback(setup_db):
+    with pytest.raises(ValueError):
+        with ConnectionDB.transaction():
+            Wallet(None, 'wallet1').save()
+            ConnectionDB.commit()
+            raise ValueError()
+    assert Wallet.find() == []
+
+
+def test_transaction_savepoint(setup_db):
+    with ConnectionDB.transaction() as transaction:
+        Wallet(None, 'wallet1').save()
+        ConnectionDB.count_writes('wallet', 1)
+        with pytest.raises(ValueError):
+            with ConnectionDB.transaction() as savepoint:
+                Wallet(None, 'wallet2').save()
+                ConnectionDB.count_writes('wallet', 1)
+                raise ValueError()
+        assert savepoint.rows_written == {'wallet': 1}
+        # retry
+        with ConnectionDB.transaction():
+            Wallet(None, 'wallet3').save()
+            ConnectionDB.count_writes('wallet', 1)
+    assert [w.name for w in Wallet.find()] == ['wallet1', 'wallet3']
+    assert transaction.rows_written == {'wallet': 2}
+
+
+def test_epoch_ms():
+    date = datetime(2021, 5, 3, 14, 0, 0, 123000)
+    assert to_epoch_ms(date) == 1620050400123
+    assert from_epoch_ms(1620050400123) == date
+    assert to_epoch_ms(datetime(2021, 5, 3, 16, 0, 0, 123000, timezone(timedelta(hours=2)))) == 1620050400123
+
+
+def test_dates_stored_as_epoch_ms(setup_db):
+    conn = ConnectionDB.get_connection()
+    conn.execute("insert into pnl(id_wallet, date, asset, value, currency) values(1, ?, 'BTC', '1', 'EUR')",
+                 (datetime(2021, 5, 3, 14, 0, 0),))
+    assert conn.execute("select date, typeof(date) from pnl").fetchone() == (datetime(2021, 5, 3, 14, 0, 0),
+                                                                            'integer')
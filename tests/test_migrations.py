@@ -0,0 +1,106 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from moon.db.migrations import SCHEMA_VERSION, get_schema_version, migrate
+from moon.model.trade import Trade, TradeType, TradeOrigin
+
+SQL_INSERT_V0 = "insert into trade(id_wallet, pair, type, qty, price, total, date, fee, fee_asset, origin_id, " \
+                "origin) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def get_schema(conn: sqlite3.Connection) -> tuple[set, dict]:
+    indexes = {row[0] for row in
+               conn.execute("select name from sqlite_master where type = 'index' and sql is not null").fetchall()}
+    tables = {row[0]: [col[1:3] for col in conn.execute(f"pragma table_info({row[0]})").fetchall()]
+              for row in conn.execute("select name from sqlite_master where type = 'table'").fetchall()}
+    return indexes, tables
+
+
+@pytest.fixture
+def conn_v0():
+    conn = sqlite3.connect(':memory:')
+    with open('./tests/data/db_v0.sql', 'r') as f:
+        conn.executescript(f.read())
+    trade = (1, 'BTCEUR', 'BUY', 100.0, 2.5, 250.0, '2021-05-03 14:00:00', 0.1, 'EUR', '', 'BINANCE')
+    conn.execute(SQL_INSERT_V0, trade)
+    conn.execute(SQL_INSERT_V0, trade)
+    conn.execute(SQL_INSERT_V0, (2,) + trade[1:])
+    conn.commit()
+    return conn
+
+
+def test_db_sql_version():
+    conn = sqlite3.connect(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        conn.executescript(f.read())
+    assert get_schema_version(conn) == SCHEMA_VERSION
+
+
+def test_migrate_empty_db():
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+    assert get_schema_version(conn) == 0
+
+
+def test_migrate_v0(conn_v0):
+    migrate(conn_v0)
+    assert get_schema_version(conn_v0) == SCHEMA_VERSION
+    conn = sqlite3.connect(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        conn.executescript(f.read())
+    assert get_schema(conn_v0) == get_schema(conn)
+
+
+def test_migrate_v0_fingerprints(conn_v0):
+    migrate(conn_v0)
+    rows = conn_v0.execute("select id, id_wallet, fingerprint from trade order by id").fetchall()
+    # the identical trades of the wallet 1 are kept
+    assert [row[:2] for row in rows] == [(1, 1), (2, 1), (3, 2)]
+    trade = Trade(None, 'BTCEUR', TradeType.BUY, Decimal('100'), Decimal('2.5'), Decimal('250'),
+                  datetime.fromisoformat('2021-05-03 14:00:00'), Decimal('0.10'), 'EUR', '', TradeOrigin.BINANCE)
+    assert [row[2] for row in rows] == [trade.get_fingerprint()] * 3
+
+
+def test_migrate_twice(conn_v0):
+    migrate(conn_v0)
+    migrate(conn_v0)
+    assert get_schema_version(conn_v0) == SCHEMA_VERSION
+
+
+def test_migrate_v0_assets_wallet(conn_v0):
+    conn_v0.execute("insert into asset_wallet(id_wallet, asset, qty, pru, currency) values(1, 'BTC', 1, 2, 'EUR')")
+    conn_v0.execute("insert into asset_wallet(id_wallet, asset, qty, pru, currency) values(1, 'BTC', 3, 4, 'EUR')")
+    conn_v0.execute("insert into asset_wallet(id_wallet, asset, qty, pru, currency) values(2, 'BTC', 5, 6, 'EUR')")
+    conn_v0.commit()
+    migrate(conn_v0)
+    rows = conn_v0.execute("select id, id_wallet, qty from asset_wallet order by id").fetchall()
+    # only the last row of an asset of a wallet is kept
+    assert rows == [(2, 1, '3'), (3, 2, '5')]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn_v0.execute("insert into asset_wallet(id_wallet, asset, qty, pru, currency) values(1, 'BTC', 1, 2, 'EUR')")
+
+
+def test_migrate_v0_amounts_as_text(conn_v0):
+    conn_v0.execute("insert into pnl(id_wallet, date, asset, value, currency) "
+                    "values(1, '2021-05-03 14:00:00', 'BTC', 0.00000001, 'EUR')")
+    conn_v0.commit()
+    migrate(conn_v0)
+    assert conn_v0.execute("select qty, price, total, fee from trade where id = 1").fetchone() == \
+           ('100', '2.5', '250', '0.1')
+    assert conn_v0.execute("select value, typeof(value) from pnl").fetchone() == ('1E-8', 'text')
+
+
+def test_migrate_v0_dates_as_epoch_ms(conn_v0):
+    migrate(conn_v0)
+    # 2021-05-03 14:00:00 UTC
+    assert conn_v0.execute("select date, typeof(date) from trade where id = 1").fetchone() == (1620050400000, 'integer')
+
+
+def test_migrate_v0_db_identity(conn_v0):
+    migrate(conn_v0)
+    rows = conn_v0.execute("select uuid from db_identity").fetchall()
+    assert len(rows) == 1
+    assert len(rows[0][0]) == 32
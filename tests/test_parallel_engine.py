@@ -0,0 +1,85 @@
+import os
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from moon.model import parallel_engine
+from moon.model.trade import Trade, TradeType, TradeOrigin, ASSET_LIST
+from moon.model.wallet import Wallet
+
+
+def csv_trades(*filenames: str) -> list[Trade]:
+    return [trade for filename in filenames
+            for trade in Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests', 'data', filename))]
+
+
+def multi_asset_trades(nb_trades: int, bnb_fees: bool = False) -> list[Trade]:
+    rnd = random.Random(7)
+    pairs = [asset + 'EUR' for asset in ASSET_LIST if asset not in ('EUR', 'USDT')] + ['ETHBTC', 'DOGEUSDT']
+    trades = []
+    date = datetime.fromisoformat('2021-01-01 00:00:00')
+    for _ in range(nb_trades):
+        pair = rnd.choice(pairs)
+        qty = Decimal(rnd.randint(1, 1000)) / 100
+        price = Decimal(rnd.randint(100, 100000)) / 100
+        date += timedelta(minutes=1)
+        if bnb_fees and rnd.random() < 0.7:
+            fee_asset = 'BNB'
+        else:
+            fee_asset = pair[-3:] if pair[-3:] != 'SDT' else 'USDT'
+        trades.append(Trade(None, pair, rnd.choice([TradeType.BUY, TradeType.SELL]), qty, price, qty * price, date,
+                            Decimal(rnd.randint(0, 100)) / 1000, fee_asset, '', TradeOrigin.BINANCE))
+    return trades
+
+
+def make_trade(pair: str, fee_asset: str) -> Trade:
+    return Trade(None, pair, TradeType.BUY, Decimal('1'), Decimal('2'), Decimal('2'), '2021-01-01 00:00:00',
+                 Decimal('0.1'), fee_asset)
+
+
+def test_partition_independent_assets():
+    trades = [make_trade('BTCEUR', 'EUR'), make_trade('ETHEUR', 'EUR'), make_trade('BTCEUR', 'EUR')]
+    assert parallel_engine._partition(trades) == [[0, 2], [1]]
+
+
+def test_partition_linked_assets():
+    # the quote and fee legs on the base asset of another partition don't link the partitions
+    trades = [make_trade('BTCEUR', 'EUR'), make_trade('ETHEUR', 'EUR'), make_trade('ADAEUR', 'EUR'),
+              make_trade('ETHBTC', 'EUR'), make_trade('ADAEUR', 'BNB'), make_trade('BNBEUR', 'BNB')]
+    assert parallel_engine._partition(trades) == [[0], [1, 3], [2, 4], [5]]
+
+
+def test_partition_events():
+    trades = [make_trade('BTCEUR', 'BNB'), make_trade('ETHBTC', 'ETH'), make_trade('BNBEUR', 'BNB')]
+    events = parallel_engine._partition_events(trades, parallel_engine._partition(trades))
+    assert events == [[trades[0], ('BTC', Decimal('-2'))],
+                      [trades[1]],
+                      [('BNB', Decimal('-0.1')), trades[2]]]
+
+
+@pytest.mark.parametrize('filenames', [('trades1.csv',), ('trades1.csv', 'trades2.csv')])
+def test_import_trades_same_as_wallet(filenames):
+    trades = csv_trades(*filenames)
+    assert parallel_engine.import_trades(1, trades, 2) == Wallet.import_trades(1, trades)
+
+
+@pytest.mark.parametrize('bnb_fees', [False, True])
+def test_import_trades_multi_asset_same_as_wallet(bnb_fees):
+    trades = multi_asset_trades(3000, bnb_fees)
+    assert len(parallel_engine._partition(trades)) > 1
+    assets_wallet, pnl, pnl_total = parallel_engine.import_trades(1, trades, 4)
+    expected_assets_wallet, expected_pnl, expected_pnl_total = Wallet.import_trades(1, trades)
+    assert list(assets_wallet.keys()) == list(expected_assets_wallet.keys())
+    assert assets_wallet == expected_assets_wallet
+    assert pnl == expected_pnl
+    assert [(p.asset, p.currency) for p in pnl_total] == [(p.asset, p.currency) for p in expected_pnl_total]
+    assert pnl_total == expected_pnl_total
+
+
+def test_import_trades_empty():
+    assets_wallet, pnl, pnl_total = parallel_engine.import_trades(1, [])
+    assert len(assets_wallet) == 0
+    assert pnl == []
+    assert pnl_total == []
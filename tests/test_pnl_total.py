@@ -2,7 +2,7 @@ from decimal import Decimal
 from unittest.mock import patch, Mock
 
 from moon.exceptions.exceptions import EntityNotFoundError
-from moon.model.pnl_total import PnlTotal
+from moon.model.pnl_total import PnlTotal, PnlTotalBook
 from moon.db.db import ConnectionDB
 
 import pytest
@@ -167,3 +167,52 @@ def test_delete_wallet(fill_db):
     pnl_total_list = PnlTotal.find(1)
     assert len(pnl_total_list) == 0
 
+
+
+def test_book_get():
+    pnl_total_list = [
+        PnlTotal(1, 'BTC', Decimal('12.0'), 'EUR'),
+        PnlTotal(2, 'BTC', Decimal('10.0'), 'USD'),
+        PnlTotal(3, 'BNB', Decimal('-5.0'), 'EUR'),
+        PnlTotal(4, 'CHZ', Decimal('11.0'), 'EUR'),
+        PnlTotal(5, 'ADA', Decimal('-7.0'), 'EUR'),
+    ]
+    book = PnlTotalBook(pnl_total_list)
+    assert len(book) == 5
+    assert book.get('BTC', 'EUR') is pnl_total_list[0]
+    assert book.get('BTC', 'USD') is pnl_total_list[1]
+    assert book.get('ADA', 'EUR') is pnl_total_list[4]
+    assert book.get('XXX', 'USD') is None
+    assert ('CHZ', 'EUR') in book
+    assert book.values() == pnl_total_list
+
+
+def test_book_add():
+    book = PnlTotalBook([PnlTotal(1, 'BTC', Decimal('12.0'), 'EUR')])
+    assert book.add('BTC', Decimal('3.5'), 'EUR') == PnlTotal(1, 'BTC', Decimal('15.5'), 'EUR')
+    assert book.add('BTC', Decimal('-2'), 'USD') == PnlTotal(None, 'BTC', Decimal('-2'), 'USD')
+    assert len(book) == 2
+
+
+def test_book_constructor_same_key():
+    book = PnlTotalBook([PnlTotal(1, 'BTC', Decimal('12.0'), 'EUR'), PnlTotal(None, 'BTC', Decimal('3.0'), 'EUR'),
+                         PnlTotal(2, 'BTC', Decimal('1.0'), 'EUR')])
+    assert book.values() == [PnlTotal(1, 'BTC', Decimal('16.0'), 'EUR')]
+    assert [pnl_total.id for pnl_total in book.merged] == [2]
+
+
+def test_book_merge():
+    book = PnlTotalBook([PnlTotal(1, 'BTC', Decimal('12.0'), 'EUR'), PnlTotal(2, 'ADA', Decimal('-7.0'), 'EUR')])
+    res = book.merge([PnlTotal(None, 'ETH', Decimal('1.0'), 'EUR'), PnlTotal(None, 'BTC', Decimal('3.0'), 'EUR')])
+    assert res == [PnlTotal(None, 'ETH', Decimal('1.0'), 'EUR'), PnlTotal(1, 'BTC', Decimal('15.0'), 'EUR')]
+    assert book.get('ADA', 'EUR').value == Decimal('-7.0')
+    assert len(book) == 3
+
+
+def test_book_diff():
+    book1 = PnlTotalBook([PnlTotal(1, 'BTC', Decimal('12.0'), 'EUR'), PnlTotal(2, 'ADA', Decimal('-7.0'), 'EUR')])
+    book2 = PnlTotalBook([PnlTotal(None, 'BTC', Decimal('10.0'), 'EUR'), PnlTotal(None, 'ADA', Decimal('-7.0'), 'EUR'),
+                          PnlTotal(None, 'ETH', Decimal('1.0'), 'USD')])
+    diff = book1.diff(book2)
+    assert diff.values() == [PnlTotal(None, 'BTC', Decimal('2.0'), 'EUR'), PnlTotal(None, 'ETH', Decimal('-1.0'), 'USD')]
+    assert book1.diff(book1) == PnlTotalBook()
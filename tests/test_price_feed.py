@@ -0,0 +1,55 @@
+import asyncio
+import json
+from decimal import Decimal
+
+from moon.model.assets_wallet import AssetsWallet, AssetWalletData
+from moon.sync.price_feed import PriceFeed, TickerCache, get_wallet_symbols
+
+
+def mini_ticker(symbol: str, price: str) -> dict:
+    return {'e': '24hrMiniTicker', 'E': 1620050400000, 's': symbol, 'c': price, 'o': '1', 'h': '1', 'l': '1',
+            'v': '1', 'q': '1'}
+
+
+async def fake_stream(messages: list):
+    """
+    Local stream of messages as received from the combined mini ticker stream
+    """
+    for message in messages:
+        await asyncio.sleep(0)
+        yield message
+
+
+def test_get_wallet_symbols():
+    assets_wallet = AssetsWallet(1, {'BTC': AssetWalletData(1, Decimal('1'), Decimal('30000'), 'EUR'),
+                                     'HOT': AssetWalletData(2, Decimal('100'), Decimal('0.01'), 'USDT'),
+                                     'EUR': AssetWalletData(3, Decimal('100'), Decimal('1'), 'EUR')})
+    assert get_wallet_symbols(assets_wallet) == ['BTCEUR', 'HOTUSDT']
+
+
+def test_ticker_cache_load_tickers():
+    cache = TickerCache()
+    assert cache.load_tickers([{'symbol': 'BTCEUR', 'price': '41234.56'}, {'symbol': 'ETHEUR', 'price': '2500'}]) == \
+           {'BTCEUR': Decimal('41234.56'), 'ETHEUR': Decimal('2500')}
+    assert cache.load_tickers([{'symbol': 'BTCEUR', 'price': '41234.56'}, {'symbol': 'ETHEUR', 'price': '2600'}]) == \
+           {'ETHEUR': Decimal('2600')}
+    assert cache.get('BTCEUR') == Decimal('41234.56')
+    assert cache.get('HOTEUR') is None
+
+
+def test_price_feed():
+    cache = TickerCache()
+    changes = []
+    feed = PriceFeed(['BTCEUR', 'HOTUSDT'], changes.append, cache)
+    assert feed.streams() == ['btceur@miniTicker', 'hotusdt@miniTicker']
+    feed.handle_tickers([{'symbol': 'BTCEUR', 'price': '40000'}, {'symbol': 'ETHEUR', 'price': '2500'}])
+    messages = [
+        {'stream': 'btceur@miniTicker', 'data': mini_ticker('BTCEUR', '40000')},
+        json.dumps({'stream': 'hotusdt@miniTicker', 'data': mini_ticker('HOTUSDT', '0.0123')}),
+        # all market stream
+        [mini_ticker('BTCEUR', '40100.5'), mini_ticker('ETHEUR', '2600')],
+    ]
+    asyncio.run(feed.run(fake_stream(messages)))
+    # only the changed prices of the followed symbols
+    assert changes == [{'BTCEUR': Decimal('40000')}, {'HOTUSDT': Decimal('0.0123')}, {'BTCEUR': Decimal('40100.5')}]
+    assert cache.prices == {'BTCEUR': Decimal('40100.5'), 'HOTUSDT': Decimal('0.0123')}
@@ -0,0 +1,222 @@
+import os
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from moon.db.db import ConnectionDB
+from moon.db.query_cache import QUERY_CACHE, QueryCache
+from moon.model.assets_wallet import AssetsWallet, AssetWalletData
+from moon.model.pnl import Pnl
+from moon.model.pnl_total import PnlTotal
+from moon.model.trade import Trade, TradeBatch, TradeType
+
+
+@pytest.fixture
+def setup_db():
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ddl = f.read()
+        ConnectionDB.get_cursor().executescript(ddl)
+    QUERY_CACHE.clear()
+
+
+@pytest.fixture
+def trades(setup_db):
+    trades = Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv'))
+    Trade.save_all(1, trades)
+    Trade.save_all(2, Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')))
+    return trades
+
+
+def new_trade(pair: str = 'BTCEUR') -> Trade:
+    return Trade(None, pair, TradeType.BUY, Decimal('1'), Decimal('100'), Decimal('100'),
+                 datetime(2022, 1, 1), Decimal('0'), 'EUR')
+
+
+def test_find_hit(trades):
+    assert Trade.find(1, pair='BTCEUR') == Trade.find(1, pair='BTCEUR')
+    stats = QUERY_CACHE.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+    assert stats.hit_rate == 0.5
+
+
+def test_find_normalized_criteria(trades):
+    Trade.find(1, begin_date='2021-01-01 00:00:00')
+    Trade.find(1, begin_date=datetime(2021, 1, 1))
+    assert QUERY_CACHE.stats().hits == 1
+
+
+def test_find_results_copied(trades):
+    Trade.find(1)[0].qty = Decimal('-1')
+    assert Trade.find(1)[0].qty != Decimal('-1')
+    assert QUERY_CACHE.stats().hits == 1
+
+
+def test_trade_batch_find_shares_results(trades):
+    assert list(TradeBatch.find(1)) == Trade.find(1)
+    assert QUERY_CACHE.stats().hits == 1
+
+
+def test_save_invalidates_wallet(trades):
+    nb_trades = len(Trade.find(1))
+    Trade.find(2)
+    new_trade().save(1)
+    ConnectionDB.commit()
+    assert len(Trade.find(1)) == nb_trades + 1
+    Trade.find(2)
+    assert QUERY_CACHE.stats().hits == 1
+
+
+def test_update_and_delete_invalidate_all_wallets(trades):
+    trade = Trade.find(1)[0]
+    Trade.find(2)
+    trade.save(2)
+    ConnectionDB.commit()
+    assert trade.id not in [t.id for t in Trade.find(1)]
+    assert trade.id in [t.id for t in Trade.find(2)]
+    trade.delete()
+    assert trade.id not in [t.id for t in Trade.find(2)]
+    assert QUERY_CACHE.stats().hits == 0
+
+
+def test_get_pairs(trades):
+    pairs = Trade.get_pairs()
+    assert Trade.get_pairs() == pairs
+    assert QUERY_CACHE.stats().hits == 1
+    new_trade('DOTEUR').save(3)
+    ConnectionDB.commit()
+    assert Trade.get_pairs() == pairs | {'DOTEUR'}
+
+
+def test_count(trades):
+    assert Trade.count(1) == Trade.count(1) == len(trades)
+    new_trade().save(1)
+    ConnectionDB.commit()
+    assert Trade.count(1) == len(trades) + 1
+    assert QUERY_CACHE.stats().hits == 1
+
+
+def test_pnl(setup_db):
+    Pnl.save_all(1, [Pnl(None, '2021-05-01 10:00:00', 'BTC', Decimal('10'), 'EUR')])
+    ConnectionDB.commit()
+    assert len(Pnl.find(1)) == 1
+    Pnl.save_all(1, [Pnl(None, '2021-05-02 10:00:00', 'BTC', Decimal('20'), 'EUR')])
+    ConnectionDB.commit()
+    pnl_list = Pnl.find(1)
+    assert len(pnl_list) == 2
+    pnl_list[0].delete()
+    ConnectionDB.commit()
+    assert len(Pnl.find(1)) == 1
+    assert QUERY_CACHE.stats().hits == 0
+
+
+def test_pnl_total(setup_db):
+    PnlTotal.save_all(1, [PnlTotal(None, 'BTC', Decimal('10'), 'EUR')])
+    ConnectionDB.commit()
+    assert PnlTotal.find(1)[0].value == Decimal('10')
+    pnl_total = PnlTotal.find(1)[0]
+    pnl_total.value = Decimal('30')
+    PnlTotal.save_all(1, [pnl_total])
+    ConnectionDB.commit()
+    assert PnlTotal.find(1)[0].value == Decimal('30')
+    assert QUERY_CACHE.stats().hits == 1
+
+
+def test_assets_wallet(setup_db):
+    assets_wallet = AssetsWallet(1, {'BTC': AssetWalletData(None, Decimal('1'), Decimal('100'), 'EUR')})
+    assets_wallet.save()
+    ConnectionDB.commit()
+    assert AssetsWallet.load(1) == AssetsWallet.load(1)
+    assert QUERY_CACHE.stats().hits == 1
+    assets_wallet['ETH'] = AssetWalletData(None, Decimal('2'), Decimal('10'), 'EUR')
+    assets_wallet.save()
+    ConnectionDB.commit()
+    assert AssetsWallet.load(1).get_assets() == ['BTC', 'ETH']
+
+
+def test_uncommitted_reads_not_cached(trades):
+    with ConnectionDB.transaction():
+        new_trade().save(1)
+        assert len(Trade.find(1)) == len(trades) + 1
+        assert QUERY_CACHE.stats().size == 0
+
+
+def test_rollback(trades):
+    with pytest.raises(ZeroDivisionError):
+        with ConnectionDB.transaction():
+            new_trade().save(1)
+            1 / 0
+    assert len(Trade.find(1)) == len(trades)
+
+
+def test_write_of_another_thread(tmp_path):
+    # the reader of the main thread caches the trades committed while the writer thread writes in a transaction
+    ConnectionDB.set_db(str(tmp_path / 'moon.db'))
+    ConnectionDB.create_schema_if_empty()
+    ConnectionDB.commit()
+    written, read = threading.Event(), threading.Event()
+
+    def write():
+        with ConnectionDB.transaction():
+            new_trade().save(1)
+            written.set()
+            read.wait()
+        ConnectionDB.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    written.wait()
+    assert Trade.find(1) == []
+    read.set()
+    thread.join()
+    assert len(Trade.find(1)) == 1
+    ConnectionDB.close_all()
+
+
+def test_set_db_clears(trades):
+    Trade.find(1)
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ConnectionDB.get_cursor().executescript(f.read())
+    assert Trade.find(1) == []
+
+
+def test_lru(trades):
+    cache = QueryCache(maxsize=2)
+    for id_wallet in (1, 2, 1, 3):
+        cache.fetchall('trade', id_wallet, 'select count(*) from trade where id_wallet = ?', (id_wallet,))
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 3, 2)
+    cache.fetchall('trade', 2, 'select count(*) from trade where id_wallet = ?', (2,))
+    assert cache.stats().misses == 4
+
+
+def test_large_result_not_kept(trades):
+    cache = QueryCache(max_result_rows=5)
+    cache.fetchall('trade', 1, 'select * from trade where id_wallet = ?', (1,))
+    cache.fetchall('trade', 1, 'select * from trade where id_wallet = ?', (1,))
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size, stats.rows) == (0, 2, 0, 0)
+    # a small result is kept
+    cache.fetchall('trade', 1, 'select * from trade where id_wallet = ? and pair = ?', (1, 'BNBBTC'))
+    assert cache.stats().rows == len(Trade.find(1, pair='BNBBTC'))
+
+
+def test_max_rows(trades):
+    cache = QueryCache(max_rows=12)
+    for id_wallet in (1, 2):
+        cache.fetchall('trade', id_wallet, 'select * from trade where id_wallet = ?', (id_wallet,))
+    # the results of the two wallets don't fit : the least recently used is evicted
+    stats = cache.stats()
+    assert (stats.size, stats.rows) == (1, len(trades))
+    cache.fetchall('trade', 2, 'select * from trade where id_wallet = ?', (2,))
+    assert cache.stats().hits == 1
+
+
+def test_disabled(trades):
+    cache = QueryCache(maxsize=0)
+    cache.fetchall('trade', None, 'select count(*) from trade')
+    cache.fetchall('trade', None, 'select count(*) from trade')
+    assert cache.stats().hits == 0
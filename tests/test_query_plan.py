@@ -0,0 +1,77 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from moon.db.db import ConnectionDB
+from moon.model.assets_wallet import AssetsWallet
+from moon.model.checkpoint import Checkpoint
+from moon.model.pnl import Pnl
+from moon.model.pnl_total import PnlTotal
+from moon.model.trade import Trade, TradeBatch, TradeType, TradeOrigin
+
+BEGIN_DATE = datetime.fromisoformat('2021-05-01 00:00:00')
+END_DATE = datetime.fromisoformat('2021-06-01 00:00:00')
+
+
+@pytest.fixture
+def setup_db():
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ddl = f.read()
+        ConnectionDB.get_cursor().executescript(ddl)
+
+
+@pytest.fixture
+def statements(setup_db):
+    """
+    Statements executed on the connection (with the parameters values)
+    """
+    executed: list[str] = []
+    ConnectionDB.get_connection().set_trace_callback(executed.append)
+    yield executed
+    ConnectionDB.get_connection().set_trace_callback(None)
+
+
+FINDERS = {
+    'trade_wallet': lambda: Trade.find(1),
+    'trade_pair': lambda: Trade.find(1, 'BTCEUR'),
+    'trade_pair_like': lambda: Trade.find(1, 'BTC*'),
+    'trade_type': lambda: Trade.find(1, trade_type=TradeType.BUY),
+    'trade_dates': lambda: Trade.find(1, begin_date=BEGIN_DATE, end_date=END_DATE),
+    'trade_all_criteria': lambda: Trade.find(1, 'BTCEUR', TradeType.SELL, BEGIN_DATE, END_DATE, TradeOrigin.BINANCE),
+    'trade_count': lambda: Trade.count(1, 'BTCEUR', begin_date=BEGIN_DATE, end_date=END_DATE),
+    'trade_first_page': lambda: Trade.find_page(1, begin_date=BEGIN_DATE, end_date=END_DATE, limit=100),
+    'trade_next_page': lambda: Trade.find_page(1, 'BTCEUR', after=(BEGIN_DATE, 1), limit=100),
+    'trade_previous_page': lambda: Trade.find_page(1, after=(END_DATE, 1), limit=100, descending=True),
+    'trade_page_by_price': lambda: Trade.find_page(1, 'BTCEUR', after=(Decimal('2'), 1), limit=100, order_by='price'),
+    'trade_batch': lambda: TradeBatch.find(1, 'BTCEUR', begin_date=BEGIN_DATE, end_date=END_DATE),
+    'trade_after': lambda: Trade.find_after(1, BEGIN_DATE, 1),
+    'trade_after_id': lambda: list(Trade.iter_trades_after_id(1, 1)),
+    'trade_last_origin_ids': lambda: Trade.get_last_origin_ids(1),
+    'trade_all_after': lambda: Trade.find_after(1),
+    'trade_filter_new': lambda: Trade.filter_new_trades(1, [
+        Trade(None, 'BTCEUR', TradeType.BUY, Decimal('1'), Decimal('2'), Decimal('2'), BEGIN_DATE)]),
+    'trade_link_origin_ids': lambda: Trade.link_origin_ids(1, [
+        Trade(None, 'BTCEUR', TradeType.BUY, Decimal('1'), Decimal('2'), Decimal('2'), BEGIN_DATE, origin_id='1',
+              origin=TradeOrigin.BINANCE)]),
+    'pnl_wallet': lambda: Pnl.find(1),
+    'pnl_asset': lambda: Pnl.find(1, 'BTC'),
+    'pnl_dates': lambda: Pnl.find(1, begin_date=BEGIN_DATE, end_date=END_DATE),
+    'pnl_all_criteria': lambda: Pnl.find(1, 'BTC', BEGIN_DATE, END_DATE, 'EUR'),
+    'pnl_total_wallet': lambda: PnlTotal.find(1),
+    'pnl_total_asset': lambda: PnlTotal.find(1, 'BTC'),
+    'assets_wallet': lambda: AssetsWallet.load(1),
+    'checkpoint': lambda: Checkpoint.load(1),
+}
+
+
+@pytest.mark.parametrize('finder', FINDERS.values(), ids=FINDERS.keys())
+def test_finder_uses_index(finder, statements):
+    finder()
+    selects = [statement for statement in statements if statement.lstrip().lower().startswith('select')]
+    assert selects
+    for select in selects:
+        plan = ConnectionDB.get_connection().execute('explain query plan ' + select).fetchall()
+        scans = [row[3] for row in plan if row[3].startswith('SCAN')]
+        assert not scans, f"{select} : {scans}"
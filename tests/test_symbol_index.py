@@ -0,0 +1,51 @@
+import json
+
+from moon.model.symbol_index import SymbolIndex
+
+EXCHANGE_INFO = {'symbols': [
+    {'symbol': 'BTCEUR', 'baseAsset': 'BTC', 'quoteAsset': 'EUR'},
+    {'symbol': 'BTCSTUSDT', 'baseAsset': 'BTCST', 'quoteAsset': 'USDT'},
+]}
+
+
+def test_resolve():
+    index = SymbolIndex(('BTC', 'BTT', 'EUR', 'USDT', 'SXP'))
+    assert index.resolve('BTCEUR') == ('BTC', 'EUR')
+    assert index.resolve('BTTBTC') == ('BTT', 'BTC')
+    assert index.resolve('BTCSXP') == ('BTC', 'SXP')
+    assert index.resolve('XXXEUR') == (None, 'EUR')
+    assert index.resolve('BTCXXX') == ('BTC', None)
+
+
+def test_resolve_longest_match():
+    index = SymbolIndex(('HOT', 'HOTEUR', 'EUR', 'USDT', 'BTC', 'BTCST'))
+    assert index.resolve('HOTEUR') == ('HOT', 'EUR')
+    assert index.resolve('HOTEURUSDT') == ('HOTEUR', 'USDT')
+    assert index.resolve('BTCSTUSDT') == ('BTCST', 'USDT')
+    assert index.resolve('BTCUSDT') == ('BTC', 'USDT')
+
+
+def test_resolve_cached():
+    index = SymbolIndex(('BTC', 'EUR'))
+    assert index.resolve('BTCEUR') == ('BTC', 'EUR')
+    index.assets.clear()
+    assert index.resolve('BTCEUR') == ('BTC', 'EUR')
+    index.add_assets(('ETH',))
+    assert index.resolve('BTCEUR') == (None, None)
+
+
+def test_load_exchange_info():
+    index = SymbolIndex(('BTC', 'USDT'))
+    assert index.resolve('BTCSTUSDT') == ('BTC', 'USDT')
+    index.load_exchange_info(EXCHANGE_INFO)
+    assert index.resolve('BTCSTUSDT') == ('BTCST', 'USDT')
+    assert index.resolve('BTCSTEUR') == ('BTCST', 'EUR')
+
+
+def test_load_symbols_file(tmp_path):
+    filename = tmp_path / 'symbols.json'
+    filename.write_text(json.dumps(EXCHANGE_INFO))
+    index = SymbolIndex()
+    index.load_symbols_file(str(filename))
+    assert index.resolve('BTCEUR') == ('BTC', 'EUR')
+    assert index.resolve('BTCSTBTC') == ('BTCST', 'BTC')
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from moon.common.task import TaskCancelled, TaskProgress, error_message
+from moon.db.db import ConnectionDB
+from moon.exceptions.exceptions import BusinessError, Error
+from moon.model.trade import Trade
+from moon.model.wallet import Wallet
+
+
+@pytest.fixture
+def setup_db():
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ddl = f.read()
+        ConnectionDB.get_cursor().executescript(ddl)
+
+
+def test_progress():
+    reports = []
+    progress = TaskProgress(reports.append)
+    progress.report(3)
+    progress(5)
+    assert reports == [3, 5]
+    assert progress.done == 5
+    progress.cancel()
+    assert progress.is_cancelled()
+    with pytest.raises(TaskCancelled):
+        progress.report(6)
+    assert reports == [3, 5]
+
+
+def test_import_progress(setup_db):
+    reports = []
+    filename = os.path.join(os.getcwd(), 'tests/data/trades1.csv')
+    Wallet(1, 'wallet1').import_trades_from_csv_file(filename, 4, TaskProgress(reports.append))
+    assert reports == [4, 8, 10]
+    reports.clear()
+    Wallet.import_trades_from_checkpoint(1, 3, TaskProgress(reports.append))
+    assert reports == [3, 6, 9, 10]
+
+
+def test_import_cancelled(setup_db):
+    filename = os.path.join(os.getcwd(), 'tests/data/trades1.csv')
+
+    def cancel_after_first_chunk(nb_trades):
+        progress.cancel()
+
+    progress = TaskProgress(cancel_after_first_chunk)
+    with pytest.raises(TaskCancelled):
+        Wallet(1, 'wallet1').import_trades_from_csv_file(filename, 4, progress)
+    # the import is rolled back
+    assert Trade.find(1) == []
+
+
+def test_error_message():
+    error = BusinessError([Error('name', "Le nom est obligatoire."), Error('qty', "La quantité est invalide.")])
+    assert error_message(error) == "Le nom est obligatoire.\nLa quantité est invalide."
+    assert error_message(ValueError("Tri invalide")) == "Tri invalide"
+    assert error_message(BusinessError()) == "BusinessError"
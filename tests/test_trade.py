@@ -1,3 +1,4 @@
+import os
 from datetime import datetime
 from decimal import *
 from unittest.mock import patch
@@ -5,7 +6,7 @@ from unittest.mock import patch
 import pytest
 
 from moon.db.db import ConnectionDB
-from moon.model.trade import Trade, TradeType, TradeOrigin
+from moon.model.trade import Trade, TradeBatch, TradeType, TradeOrigin
 from moon.exceptions.exceptions import BusinessError, Error
 
 NB_TRADES = 9
@@ -188,8 +189,7 @@ def test_get_assets():
 
 
 @patch.object(Trade, 'find')
-def test_filter_new_trades_0_new_trade(mock_find, trades):
-    mock_find.return_value = trades
+def test_filter_new_trades_0_new_trade(mock_find, fill_db):
     origin_trades = [
         Trade(None,  'BTCEUR', TradeType.BUY, Decimal('100'), Decimal('2.5'), Decimal('250'),
               datetime.strptime('2021-05-03 14:00:00', '%Y-%m-%d %H:%M:%S'), Decimal('0.10'),
@@ -200,12 +200,11 @@ def test_filter_new_trades_0_new_trade(mock_find, trades):
               'EUR', '', TradeOrigin.BINANCE)]
     new_trades = Trade.filter_new_trades(1, origin_trades)
     assert len(new_trades) == 0
-    assert mock_find.call_count == 1
+    mock_find.assert_not_called()
 
 
 @patch.object(Trade, 'find')
-def test_filter_new_trades_1_new_trade_for_date(mock_find, trades):
-    mock_find.return_value = trades
+def test_filter_new_trades_1_new_trade_for_date(mock_find, fill_db):
     origin_trades = [
         Trade(None,  'BTCEUR', TradeType.BUY, Decimal('100'), Decimal('2.5'), Decimal('250'),
               datetime.strptime('2021-05-03 13:00:00', '%Y-%m-%d %H:%M:%S'), Decimal('0.10'),
@@ -219,12 +218,11 @@ def test_filter_new_trades_1_new_trade_for_date(mock_find, trades):
     assert new_trades[0] == Trade(None,  'BTCEUR', TradeType.BUY, Decimal('100'), Decimal('2.5'), Decimal('250'),
                                   datetime.strptime('2021-05-03 13:00:00', '%Y-%m-%d %H:%M:%S'), Decimal('0.10'),
                                   'EUR', '', TradeOrigin.BINANCE)
-    assert mock_find.call_count == 1
+    mock_find.assert_not_called()
 
 
 @patch.object(Trade, 'find')
-def test_filter_new_trades_1_new_trade_for_qty(mock_find, trades):
-    mock_find.return_value = trades
+def test_filter_new_trades_1_new_trade_for_qty(mock_find, fill_db):
     origin_trades = [
         Trade(None,  'BTCEUR', TradeType.BUY, Decimal('100'), Decimal('2.5'), Decimal('250'),
               datetime.strptime('2021-05-03 14:00:00', '%Y-%m-%d %H:%M:%S'), Decimal('0.10'),
@@ -239,7 +237,7 @@ def test_filter_new_trades_1_new_trade_for_qty(mock_find, trades):
                                   datetime.strptime('2021-05-04 14:00:00', '%Y-%m-%d %H:%M:%S'),
                                   Decimal('0.10'),
                                   'EUR', '', TradeOrigin.BINANCE)
-    assert mock_find.call_count == 1
+    mock_find.assert_not_called()
 
 
 @patch.object(Trade, 'filter_new_trades')
@@ -299,6 +297,84 @@ def test_find_with_wildcards(fill_db):
     assert len(trades) == NB_BNB_TRADES
 
 
+@pytest.mark.parametrize('order_by', ['date', 'qty', 'price', 'pair', 'fee'])
+def test_find_order_by(fill_db, order_by):
+    key = (lambda t: (getattr(t, order_by), t.id))
+    assert Trade.find(order_by=order_by) == sorted(Trade.find(), key=key)
+    assert Trade.find(order_by=order_by, descending=True) == sorted(Trade.find(), key=key, reverse=True)
+
+
+def test_find_order_by_invalid(fill_db):
+    with pytest.raises(ValueError):
+        Trade.find(order_by='qty; drop table trade')
+
+
+def test_find_by_pages(fill_db):
+    pages = [Trade.find(1, order_by='qty', limit=4, offset=offset) for offset in range(0, NB_TRADES + 1, 4)]
+    assert [len(page) for page in pages] == [4, 4, 1]
+    assert [trade for page in pages for trade in page] == Trade.find(1, order_by='qty')
+    assert list(TradeBatch.find(1, order_by='qty', limit=4, offset=4)) == pages[1]
+
+
+def test_count(fill_db):
+    assert Trade.count() == NB_TRADES
+    assert Trade.count(1, 'BTCEUR') == NB_BTCEUR_TRADES
+    assert Trade.count(trade_type=TradeType.SELL) == NB_SELL_TRADES
+    assert Trade.count(2) == 0
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_find_page(fill_db, trades, descending):
+    # trades at the same date : the pages are ordered by (date, id)
+    Trade.save_all(1, trades[:3])
+    expected = Trade.find(1, descending=descending)
+    pages = [Trade.find_page(1, limit=4, descending=descending)]
+    while pages[-1]:
+        pages.append(Trade.find_page(1, after=(pages[-1][-1].date, pages[-1][-1].id), limit=4, descending=descending))
+    assert [len(page) for page in pages] == [4, 4, 4, 0]
+    assert [t.id for page in pages for t in page] == [t.id for t in expected]
+
+
+@pytest.mark.parametrize('order_by', ['id', 'pair', 'type', 'qty', 'price', 'total', 'fee', 'origin'])
+@pytest.mark.parametrize('descending', [False, True])
+def test_find_page_order_by(fill_db, trades, order_by, descending):
+    # same values in the sort column : the pages are ordered by (value, id)
+    Trade.save_all(1, trades[:3])
+    expected = Trade.find(1, order_by=order_by, descending=descending)
+    pages = [Trade.find_page(1, limit=4, descending=descending, order_by=order_by)]
+    while pages[-1]:
+        last = pages[-1][-1]
+        pages.append(Trade.find_page(1, after=(getattr(last, order_by), last.id), limit=4, descending=descending,
+                                     order_by=order_by))
+    assert [t.id for page in pages for t in page] == [t.id for t in expected]
+
+
+def test_find_page_order_by_unknown(fill_db):
+    with pytest.raises(ValueError):
+        Trade.find_page(1, order_by='fingerprint')
+
+
+def test_find_page_criteria(fill_db):
+    first_page = Trade.find_page(1, 'BTCEUR', limit=2)
+    assert first_page + Trade.find_page(1, 'BTCEUR', after=(first_page[-1].date, first_page[-1].id)) == \
+           Trade.find(1, 'BTCEUR')
+
+
+def test_iter_find(fill_db):
+    chunks = list(Trade.iter_find(1, chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 1]
+    assert [t for chunk in chunks for t in chunk] == Trade.find(1)
+
+
+def test_iter_columns(fill_db):
+    assert list(Trade.iter_columns(['pair', 'qty', 'date'], 1, chunk_size=2)) == \
+           [(t.pair, t.qty, t.date) for t in Trade.find(1)]
+    with pytest.raises(ValueError):
+        list(Trade.iter_columns(['pair', 'qty from trade; --']))
+    with pytest.raises(ValueError):
+        list(Trade.iter_columns([]))
+
+
 def test_delete_existing_trade(fill_db):
     trade = Trade.read(1)
     trade.delete()
@@ -352,6 +428,17 @@ def test_read(setup_db):
     assert trade.origin is not None
 
 
+def test_read_exact_amounts(setup_db):
+    # 17 significant digits : not stored exactly by a float
+    t = Trade(None, 'BTCEUR', TradeType.BUY, Decimal('0.12345678912345678'), Decimal('41234.56789012345'),
+              Decimal('5090.7392581402139'), datetime.strptime('2021-05-03 14:00:00', '%Y-%m-%d %H:%M:%S'),
+              Decimal('0.00000001'), 'BTC')
+    Trade.save_all(1, [t])
+    trade = Trade.find(1)[0]
+    assert (trade.qty, trade.price, trade.total, trade.fee) == (t.qty, t.price, t.total, t.fee)
+    assert type(trade.qty) is Decimal
+
+
 def test_save(setup_db, trades):
     found_trades = Trade.find()
     assert len(found_trades) == 0
@@ -376,6 +463,181 @@ def test_get_pairs(fill_db):
     assert 'BNBEUR' in pairs
     assert 'CAKEBNB' in pairs
 
+def test_iter_trades_from_csv_file():
+    filename = os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')
+    chunks = list(Trade.iter_trades_from_csv_file(filename, 4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert [trade for chunk in chunks for trade in chunk] == Trade.get_trades_from_csv_file(filename)
+
+
+def test_import_trades_from_csv_file_by_chunks(setup_db):
+    filename = os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')
+    assert Trade.import_trades_from_csv_file(1, filename, 3) == 10
+    assert len(Trade.find(1)) == 10
+    assert Trade.import_trades_from_csv_file(1, filename, 3) == 0
+
+
+def test_iter_trades_after_id(setup_db):
+    filename = os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')
+    trades = Trade.get_trades_from_csv_file(filename)
+    Trade.save_all(1, trades[:4])
+    last_id = Trade.get_max_id()
+    assert last_id == 4
+    Trade.save_all(1, list(reversed(trades[4:])))
+    Trade.save_all(2, trades[4:])
+    chunks = list(Trade.iter_trades_after_id(1, last_id, 4))
+    assert [len(chunk) for chunk in chunks] == [4, 2]
+    assert [t.date for chunk in chunks for t in chunk] == [t.date for t in trades[4:]]
+
+
+def test_filter_new_trades_empty(setup_db):
+    assert Trade.filter_new_trades(1, []) == []
+
+
+def test_filter_new_trades_other_wallet(fill_db, trades):
+    assert len(Trade.filter_new_trades(2, trades)) == NB_TRADES
+
+
+def test_filter_new_trades_identical_trades(setup_db, trades):
+    # identical fills are legitimate trades
+    assert len(Trade.filter_new_trades(1, trades + trades)) == 2 * NB_TRADES
+    Trade.save_all(1, trades)
+    assert len(Trade.filter_new_trades(1, trades + trades)) == NB_TRADES
+    assert Trade.filter_new_trades(1, trades) == []
+
+
+def test_filter_new_trades_identical_trades_in_chunks(setup_db, trades):
+    seen: dict[str, int] = {}
+    assert Trade.import_trades(1, trades, seen) == trades
+    assert Trade.import_trades(1, trades, seen) == trades
+    # import of the same source again
+    seen = {}
+    assert Trade.import_trades(1, trades, seen) == []
+    assert Trade.import_trades(1, trades, seen) == []
+    assert len(Trade.find(1)) == 2 * NB_TRADES
+
+
+@patch('moon.model.trade.SQL_MAX_FINGERPRINTS', 2)
+def test_filter_new_trades_by_chunks(fill_db, trades):
+    new_trade = Trade(None, 'BTCEUR', TradeType.BUY, Decimal('1'), Decimal('2.5'), Decimal('2.5'),
+                      datetime.strptime('2021-05-03 14:00:00', '%Y-%m-%d %H:%M:%S'), Decimal('0.10'),
+                      'EUR', '', TradeOrigin.BINANCE)
+    assert Trade.filter_new_trades(1, trades + [new_trade]) == [new_trade]
+
+
+def test_fingerprint(trade):
+    other = Trade(None, 'BTCEUR', TradeType.BUY, Decimal('100'), Decimal('2'), Decimal('200.00'),
+                  datetime.fromisoformat('2021-01-01 14:00:00'), Decimal('0.50'),
+                  'EUR', '1', TradeOrigin.BINANCE)
+    assert other.get_fingerprint() == trade.get_fingerprint()
+    other.fee = Decimal('0.6')
+    assert other.get_fingerprint() != trade.get_fingerprint()
+
+
+def test_save_duplicate(fill_db, trades):
+    # identical fills are legitimate trades
+    nb_trades = len(Trade.find(1))
+    Trade.save_all(1, trades[:1])
+    assert len(Trade.find(1)) == nb_trades + 1
+
+
+def test_import_trades_from_csv_file_identical_rows(setup_db, tmp_path):
+    row = '2020-06-01 14:00:01;BTCEUR;BUY;1000;2;2000;0;EUR'
+    filename = tmp_path / 'trades.csv'
+    filename.write_text('\n'.join([row, '2020-06-01 14:00:02;BTCEUR;BUY;1000;1;1000;0;EUR', row, row]))
+    assert Trade.import_trades_from_csv_file(1, str(filename), 2) == 4
+    assert Trade.import_trades_from_csv_file(1, str(filename), 3) == 0
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_import_trades_from_csv_files(setup_db, tmp_path, max_workers):
+    with open(os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv'), 'r') as f:
+        lines = f.read().splitlines()
+    # overlapping exports, the most recent trades first
+    (tmp_path / 'trades-1.csv').write_text('\n'.join(reversed(lines[:6])))
+    (tmp_path / 'trades-2.csv').write_text('\n'.join(reversed(lines[4:])))
+    (tmp_path / 'trades.txt').write_text(lines[0])
+    assert Trade.import_trades_from_csv_files(1, str(tmp_path), 3, max_workers) == 10
+    assert Trade.find(1) == Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv'))
+    assert Trade.import_trades_from_csv_files(1, str(tmp_path / 'trades-*.csv'), 3, max_workers) == 0
+
+
+def test_import_trades_from_csv_files_identical_rows(setup_db, tmp_path):
+    row = '2020-06-01 14:00:01;BTCEUR;BUY;1000;2;2000;0;EUR'
+    (tmp_path / 'trades-1.csv').write_text('\n'.join([row, row]))
+    (tmp_path / 'trades-2.csv').write_text('\n'.join([row, '2020-06-01 14:00:02;BTCEUR;BUY;1000;1;1000;0;EUR']))
+    # the identical rows of a file are distinct trades, the rows in both files are the same trades
+    assert Trade.import_trades_from_csv_files(1, [str(tmp_path / 'trades-1.csv'), str(tmp_path / 'trades-2.csv')]) == 3
+
+
+def test_import_trades_from_csv_files_not_found(setup_db, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Trade.import_trades_from_csv_files(1, str(tmp_path / '*.csv'))
+    with pytest.raises(FileNotFoundError):
+        Trade.import_trades_from_csv_files(1, [str(tmp_path / 'trades.csv')])
+
+
+def test_import_trades_twice(setup_db, trades):
+    assert len(Trade.import_trades(1, trades)) == NB_TRADES
+    assert len(Trade.import_trades(1, trades)) == 0
+    assert len(Trade.find()) == NB_TRADES
+
 # def test_get_trades_from_csv_file():
 #     trades = Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'moon', 'tests', 'data', CSV_FILENAME))
 #     assert len(trades) == NB_TRADES_IN_CSV
+
+
+def test_trade_slots():
+    t = Trade(None, 'BTCEUR', TradeType.BUY, Decimal('1'), Decimal('2'))
+    assert not hasattr(t, '__dict__')
+
+
+def test_trade_batch_from_csv_file():
+    filename = os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')
+    batches = list(TradeBatch.iter_from_csv_file(filename, 4))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    trades = Trade.get_trades_from_csv_file(filename)
+    assert [trade for batch in batches for trade in batch] == trades
+    assert batches[1][0] == trades[4]
+    # the pairs are shared by the trades
+    assert batches[0].pair[0] is batches[0].pair[1]
+
+
+def test_trade_batch_find(setup_db):
+    filename = os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')
+    Trade.save_all(1, Trade.get_trades_from_csv_file(filename))
+    batch = TradeBatch.find(1, pair='BTC*')
+    trades = Trade.find(1, pair='BTC*')
+    assert list(batch) == trades
+    assert batch.id == [trade.id for trade in trades]
+    assert len(TradeBatch.find(2)) == 0
+
+
+def test_trade_batch_find_page(setup_db):
+    filename = os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')
+    Trade.save_all(1, Trade.get_trades_from_csv_file(filename))
+    first_page = TradeBatch.find_page(1, limit=4, descending=True, order_by='price')
+    assert list(first_page) == Trade.find_page(1, limit=4, descending=True, order_by='price')
+    after = (first_page.price[-1], first_page.id[-1])
+    assert list(TradeBatch.find_page(1, after=after, limit=4, descending=True, order_by='price')) == \
+           Trade.find_page(1, after=after, limit=4, descending=True, order_by='price')
+
+
+def test_trade_batch_import_trades(setup_db):
+    filename = os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')
+    batch = TradeBatch(Trade.get_trades_from_csv_file(filename))
+    new_trades = Trade.import_trades(1, batch)
+    assert isinstance(new_trades, TradeBatch)
+    assert list(new_trades) == sorted(batch, key=lambda t: t.date)
+    assert Trade.find(1) == Trade.get_trades_from_csv_file(filename)
+    assert batch.fingerprints() == [trade.get_fingerprint() for trade in batch]
+    assert len(Trade.import_trades(1, batch)) == 0
+
+
+def test_trade_batch_append():
+    trades = [Trade(None, 'BTCEUR', TradeType.BUY, Decimal('1'), Decimal('2')),
+              Trade(None, 'ETHEUR', TradeType.SELL, Decimal('3'), Decimal('4'))]
+    batch = TradeBatch(trades[:1])
+    batch.extend(TradeBatch(trades[1:]))
+    assert batch == TradeBatch(trades)
+    assert batch.qty == [Decimal('1'), Decimal('3')]
@@ -0,0 +1,143 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from moon.db.db import ConnectionDB
+from moon.model.checkpoint import Checkpoint
+from moon.model.trade import Trade, TradeType
+from moon.model.trade_cache import TradeCache
+from moon.model.wallet import Wallet
+
+
+@pytest.fixture
+def setup_db():
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ddl = f.read()
+        ConnectionDB.get_cursor().executescript(ddl)
+
+
+@pytest.fixture
+def trades(setup_db):
+    trades = Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv'))
+    Trade.save_all(1, trades)
+    return trades
+
+
+def test_load(trades, tmp_path):
+    cached_trades = TradeCache(str(tmp_path)).load(1)
+    assert len(cached_trades) == len(trades)
+    assert isinstance(cached_trades.columns['qty'], np.memmap)
+    assert list(cached_trades.to_batch()) == Trade.find(1)
+    assert cached_trades.float_column('total').tolist() == [float(trade.total) for trade in Trade.find(1)]
+
+
+def test_load_empty(setup_db, tmp_path):
+    assert len(TradeCache(str(tmp_path)).load(1)) == 0
+
+
+def test_load_exact_amounts(setup_db, tmp_path):
+    trade = Trade(None, 'BTCEUR', TradeType.BUY, Decimal('0.12345678912345678'), Decimal('41234.56789012345'),
+                  None, datetime(2021, 5, 3, 14, 0, 0, 123000), Decimal('0.00000001'), 'BTC')
+    trade.save(1)
+    assert list(TradeCache(str(tmp_path)).load(1).to_batch()) == [trade]
+
+
+def test_load_rebuilt_after_write(trades, tmp_path):
+    cache = TradeCache(str(tmp_path))
+    generation = cache.load(1).generation
+    # the cache of the wallet is reused while its trades are not written
+    assert cache.load(1).generation == generation
+    Trade.save_all(2, trades[:2])
+    assert cache.load(1).generation == generation
+    trade = Trade.find(1)[0]
+    trade.qty = Decimal('1')
+    trade.save(1)
+    cached_trades = cache.load(1)
+    assert cached_trades.generation != generation
+    assert cached_trades.to_batch()[0].qty == Decimal('1')
+    trade.delete()
+    assert len(cache.load(1)) == len(trades) - 1
+
+
+def test_load_rebuilt_for_another_db(trades, tmp_path):
+    cache = TradeCache(str(tmp_path))
+    generation = cache.load(1).generation
+    # another db with the same generation of the trades of the wallet
+    ConnectionDB.set_db(':memory:')
+    with open('./moon/db/db.sql', 'r') as f:
+        ConnectionDB.get_cursor().executescript(f.read())
+    Trade.save_all(1, trades[:2])
+    assert Trade.get_generation(1) == generation
+    cached_trades = cache.load(1)
+    assert cached_trades.db_identity == ConnectionDB.get_identity()
+    assert list(cached_trades.to_batch()) == Trade.find(1)
+
+
+def test_load_origin_id(setup_db, tmp_path):
+    for origin_id in ('', '1234567890123', '0042'):
+        Trade(None, 'BTCEUR', TradeType.BUY, Decimal('1'), Decimal('2'), origin_id=origin_id).save(1)
+    cached_trades = TradeCache(str(tmp_path)).load(1)
+    assert cached_trades.columns['origin_id'].dtype.kind == 'S'
+    assert set(cached_trades.dictionaries) == {'pair', 'fee_asset'}
+    assert [trade.origin_id for trade in cached_trades.to_batch()] == [trade.origin_id for trade in Trade.find(1)]
+
+
+def test_load_cache_not_readable(trades, tmp_path):
+    with patch.object(TradeCache, '_read', return_value=None):
+        cached_trades = TradeCache(str(tmp_path)).load(1)
+    # the trades read from the db are kept in memory
+    assert list(cached_trades.to_batch()) == Trade.find(1)
+
+
+@pytest.mark.parametrize('criteria', [{}, {'pair': 'BTC*'}, {'pair': 'BNBBTC'}, {'trade_type': TradeType.SELL},
+                                      {'begin_date': datetime(2020, 6, 3), 'end_date': datetime(2020, 6, 6)}])
+def test_find(trades, tmp_path, criteria):
+    assert list(TradeCache(str(tmp_path)).find(1, **criteria)) == Trade.find(1, **criteria)
+
+
+def test_import_trades(trades, tmp_path):
+    batch = TradeCache(str(tmp_path)).load(1).to_batch()
+    assert Wallet.import_trades(1, batch) == Wallet.import_trades(1, Trade.find(1))
+
+
+def test_index_after(trades, tmp_path):
+    cached_trades = TradeCache(str(tmp_path)).load(1)
+    db_trades = Trade.find(1)
+    assert cached_trades.index_after() == 0
+    for i, trade in enumerate(db_trades):
+        assert cached_trades.index_after(trade.date, trade.id) == i + 1
+        assert cached_trades.index_after(trade.date) == i
+
+
+def test_iter_after(trades, tmp_path):
+    db_trades = Trade.find(1)
+    batches = list(TradeCache(str(tmp_path)).iter_after(1, db_trades[2].date, db_trades[2].id, 4))
+    assert [len(batch) for batch in batches] == [4, 3]
+    assert [trade for batch in batches for trade in batch] == Trade.find_after(1, db_trades[2].date, db_trades[2].id)
+
+
+def test_import_trades_from_checkpoint(setup_db, tmp_path):
+    cache = TradeCache(str(tmp_path))
+    trades1 = Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv'))
+    trades2 = Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests', 'data', 'trades2.csv'))
+    Trade.save_all(1, trades1)
+    Wallet.import_trades_from_checkpoint(1, chunk_size=3, trade_cache=cache)
+    assert Checkpoint.load(1).last_trade_id == len(trades1)
+
+    # only the trades after the checkpoint are read from the cache, rebuilt after the write
+    Trade.save_all(1, trades2)
+    progress: list[int] = []
+    with patch.object(Trade, 'find_after') as mock_find_after:
+        assets_wallet, pnl, pnl_total = Wallet.import_trades_from_checkpoint(1, chunk_size=3, progress=progress.append,
+                                                                            trade_cache=cache)
+        mock_find_after.assert_not_called()
+    assert progress == [3, len(trades2)]
+    expected_assets_wallet, expected_pnl, expected_pnl_total = Wallet.import_trades(1, Trade.find(1))
+    assert assets_wallet == expected_assets_wallet
+    assert pnl_total == expected_pnl_total
+    assert Checkpoint.load(1).last_trade_id == len(trades1) + len(trades2)
@@ -0,0 +1,86 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from moon.exceptions.exceptions import BusinessError
+from moon.model.trade import Trade, TradeOrigin, TradeType
+from moon.model.trade_csv import BINANCE_ORDER_HISTORY_FORMAT, BINANCE_TRADE_HISTORY_FORMAT, \
+    BINANCE_TRADE_HISTORY_UNITS_FORMAT, CSV_PARSERS, MOON_CSV_FORMAT, detect_csv_format, iter_csv_file
+
+TRADES_CSV_FILE = os.path.join(os.getcwd(), 'tests', 'data', 'trades1.csv')
+
+
+def read_csv_file(filename: str, parser: str) -> list[Trade]:
+    return [trade for batch in iter_csv_file(filename, 3, parser) for trade in batch]
+
+
+@pytest.mark.parametrize('line, csv_format, delimiter', [
+    ('2020-06-01 14:00:01;BTCEUR;BUY;1000;2;2000;0;EUR\n', MOON_CSV_FORMAT, ';'),
+    ('2020-06-01 14:00:01,BTCEUR,BUY,1000,2,2000,0,EUR\n', MOON_CSV_FORMAT, ','),
+    ('Date(UTC),Market,Type,Price,Amount,Total,Fee,Fee Coin\r\n', BINANCE_TRADE_HISTORY_FORMAT, ','),
+    ('"Date(UTC)";"Market";"Type";"Price";"Amount";"Total";"Fee";"Fee Coin"\n', BINANCE_TRADE_HISTORY_FORMAT, ';'),
+    ('Date(UTC)\tPair\tSide\tPrice\tExecuted\tAmount\tFee\n', BINANCE_TRADE_HISTORY_UNITS_FORMAT, '\t'),
+    ('Date(UTC),Pair,Type,Order Price,Order Amount,AvgTrading Price,Filled,Total,status\n',
+     BINANCE_ORDER_HISTORY_FORMAT, ','),
+])
+def test_detect_csv_format(line, csv_format, delimiter):
+    assert detect_csv_format(line)[:2] == (csv_format, delimiter)
+
+
+def test_detect_csv_format_unknown():
+    with pytest.raises(BusinessError):
+        detect_csv_format('Date,Pair,Qty\n')
+
+
+@pytest.mark.parametrize('parser', CSV_PARSERS)
+def test_iter_csv_file_moon(parser):
+    trades = read_csv_file(TRADES_CSV_FILE, parser)
+    assert len(trades) == 10
+    assert trades[0] == Trade(None, 'BTCEUR', TradeType.BUY, Decimal('2'), Decimal('1000'), Decimal('2000'),
+                              datetime(2020, 6, 1, 14, 0, 1), Decimal('0'), 'EUR', '', TradeOrigin.BINANCE)
+
+
+@pytest.mark.parametrize('parser', CSV_PARSERS)
+def test_iter_csv_file_binance_trade_history(parser, tmp_path):
+    filename = tmp_path / 'trades.csv'
+    filename.write_text('\ufeffDate(UTC),Market,Type,Price,Amount,Total,Fee,Fee Coin\r\n'
+                        '2021-05-03 14:00:00,BTCEUR,SELL,41234.56,0.12345678,5090.68,0.00012,BNB\r\n'
+                        '2021-05-02 14:00:00,ETHBTC,BUY,0.05,2,0.1,0.002,ETH\r\n', encoding='utf-8')
+    assert read_csv_file(str(filename), parser) == [
+        Trade(None, 'BTCEUR', TradeType.SELL, Decimal('0.12345678'), Decimal('41234.56'), Decimal('5090.68'),
+              datetime(2021, 5, 3, 14), Decimal('0.00012'), 'BNB', '', TradeOrigin.BINANCE),
+        Trade(None, 'ETHBTC', TradeType.BUY, Decimal('2'), Decimal('0.05'), Decimal('0.1'),
+              datetime(2021, 5, 2, 14), Decimal('0.002'), 'ETH', '', TradeOrigin.BINANCE)]
+
+
+@pytest.mark.parametrize('parser', CSV_PARSERS)
+def test_iter_csv_file_binance_trade_history_units(parser, tmp_path):
+    filename = tmp_path / 'trades.csv'
+    filename.write_text('Date(UTC),Pair,Side,Price,Executed,Amount,Fee\n'
+                        '2021-05-03 14:00:00,BTCEUR,BUY,"41,234.56",0.1BTC,"4,123.456EUR",0.0001BNB\n'
+                        '2021-05-02 14:00:00,BTCUSDT,SELL,50000,0.2BTC,10000USDT,10USDT\n')
+    assert read_csv_file(str(filename), parser) == [
+        Trade(None, 'BTCEUR', TradeType.BUY, Decimal('0.1'), Decimal('41234.56'), Decimal('4123.456'),
+              datetime(2021, 5, 3, 14), Decimal('0.0001'), 'BNB', '', TradeOrigin.BINANCE),
+        Trade(None, 'BTCUSDT', TradeType.SELL, Decimal('0.2'), Decimal('50000'), Decimal('10000'),
+              datetime(2021, 5, 2, 14), Decimal('10'), 'USDT', '', TradeOrigin.BINANCE)]
+
+
+@pytest.mark.parametrize('parser', CSV_PARSERS)
+def test_iter_csv_file_binance_order_history(parser, tmp_path):
+    filename = tmp_path / 'orders.csv'
+    filename.write_text('Date(UTC),Pair,Type,Order Price,Order Amount,AvgTrading Price,Filled,Total,status\n'
+                        '2021-05-03 14:00:00,BTCEUR,BUY,40000,1,39000,0.5,19500,Partial Fill\n'
+                        '2021-05-02 14:00:00,BTCEUR,SELL,50000,1,0,0,0,Canceled\n')
+    assert read_csv_file(str(filename), parser) == [
+        Trade(None, 'BTCEUR', TradeType.BUY, Decimal('0.5'), Decimal('39000'), Decimal('19500'),
+              datetime(2021, 5, 3, 14), Decimal('0'), '', '', TradeOrigin.BINANCE)]
+
+
+@pytest.mark.parametrize('parser', CSV_PARSERS)
+def test_iter_csv_file_empty(parser, tmp_path):
+    filename = tmp_path / 'trades.csv'
+    filename.write_text('')
+    assert read_csv_file(str(filename), parser) == []
@@ -0,0 +1,128 @@
+import os
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from moon.model import vectorized_engine
+from moon.model.assets_wallet import AssetsWallet
+from moon.model.pnl import Pnl
+from moon.model.pnl_total import PnlTotal
+from moon.model.trade import Trade, TradeType, TradeOrigin
+from moon.model.wallet import Wallet
+
+TOLERANCE = Decimal('1e-6')
+
+
+def csv_trades(*filenames: str) -> list[Trade]:
+    return [trade for filename in filenames
+            for trade in Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests', 'data', filename))]
+
+
+def random_trades(nb_trades: int) -> list[Trade]:
+    rnd = random.Random(42)
+    pairs = ['BTCEUR', 'ETHEUR', 'BNBEUR', 'ETHBTC', 'BNBBTC', 'ADAUSDT']
+    qty = {pair: Decimal('0') for pair in pairs}
+    trades = []
+    date = datetime.fromisoformat('2021-01-01 00:00:00')
+    for _ in range(nb_trades):
+        pair = rnd.choice(pairs)
+        # sell all the qty bought from time to time to close the position
+        if qty[pair] > 0 and rnd.random() < 0.4:
+            type_ = TradeType.SELL
+            trade_qty = qty[pair] if rnd.random() < 0.3 else (qty[pair] * Decimal(rnd.randint(1, 9)) / 10)
+        else:
+            type_ = TradeType.BUY
+            trade_qty = Decimal(rnd.randint(1, 1000)) / 100
+        price = Decimal(rnd.randint(100, 100000)) / 100
+        qty[pair] += trade_qty if type_ == TradeType.BUY else -trade_qty
+        date += timedelta(minutes=1)
+        fee_asset = rnd.choice(['BNB', pair[-3:], pair[:3]])
+        trades.append(Trade(None, pair, type_, trade_qty, price, trade_qty * price, date,
+                            Decimal(rnd.randint(0, 100)) / 1000, fee_asset, '', TradeOrigin.BINANCE))
+    return trades
+
+
+def partial_sell_trades(nb_cycles: int) -> list[Trade]:
+    """
+    Buy 1 then sell 99% of the position, the position is never fully closed
+    """
+    trades = []
+    qty = Decimal('0')
+    date = datetime.fromisoformat('2021-01-01 00:00:00')
+    for i in range(nb_cycles):
+        price = Decimal(100 + i % 50)
+        qty += 1
+        date += timedelta(minutes=1)
+        trades.append(Trade(None, 'BTCEUR', TradeType.BUY, Decimal('1'), price, price, date, Decimal('0'), 'EUR', '',
+                            TradeOrigin.BINANCE))
+        sell_qty = qty * Decimal('0.99')
+        qty -= sell_qty
+        date += timedelta(minutes=1)
+        trades.append(Trade(None, 'BTCEUR', TradeType.SELL, sell_qty, price + 1, sell_qty * (price + 1), date,
+                            Decimal('0'), 'EUR', '', TradeOrigin.BINANCE))
+    return trades
+
+
+def assert_close(expected: tuple[AssetsWallet, list[Pnl], list[PnlTotal]],
+                 actual: tuple[AssetsWallet, list[Pnl], list[PnlTotal]]):
+    expected_assets_wallet, expected_pnl, expected_pnl_total = expected
+    assets_wallet, pnl, pnl_total = actual
+    assert list(assets_wallet.keys()) == list(expected_assets_wallet.keys())
+    for asset, data in expected_assets_wallet.items():
+        assert abs(assets_wallet[asset].qty - data.qty) <= TOLERANCE
+        assert abs(assets_wallet[asset].pru - data.pru) <= TOLERANCE * max(1, abs(data.pru))
+        assert assets_wallet[asset].currency == data.currency
+    assert [(p.date, p.asset, p.currency) for p in pnl] == [(p.date, p.asset, p.currency) for p in expected_pnl]
+    for p, expected_p in zip(pnl, expected_pnl):
+        assert abs(p.value - expected_p.value) <= TOLERANCE * max(1, abs(expected_p.value))
+    assert [(p.asset, p.currency) for p in pnl_total] == [(p.asset, p.currency) for p in expected_pnl_total]
+    for p, expected_p in zip(pnl_total, expected_pnl_total):
+        assert abs(p.value - expected_p.value) <= TOLERANCE * max(1, abs(expected_p.value))
+
+
+def test_import_trades_empty():
+    assets_wallet, pnl, pnl_total = vectorized_engine.import_trades(1, [])
+    assert len(assets_wallet) == 0
+    assert pnl == []
+    assert pnl_total == []
+
+
+def test_import_trades_res1():
+    assets_wallet, pnl, pnl_total = vectorized_engine.import_trades(1, csv_trades('trades1.csv'))
+    assert assets_wallet == Wallet.import_trades(1, csv_trades('trades1.csv'))[0]
+    assert [(p.asset, p.value, p.currency) for p in pnl] == [('BTC', 100, 'EUR'), ('BTC', 200, 'EUR'),
+                                                             ('BTC', -4200, 'EUR'), ('BNB', Decimal('3.125'), 'BTC')]
+    assert pnl_total == [PnlTotal(None, 'BNB', Decimal('3.125'), 'BTC'), PnlTotal(None, 'BTC', -3900, 'EUR')]
+
+
+@pytest.mark.parametrize('filenames', [('trades1.csv',), ('trades1.csv', 'trades2.csv')])
+def test_import_trades_same_as_wallet(filenames):
+    trades = csv_trades(*filenames)
+    assert_close(Wallet.import_trades(1, trades), vectorized_engine.import_trades(1, trades))
+
+
+def test_import_trades_random_same_as_wallet():
+    trades = random_trades(2000)
+    assert_close(Wallet.import_trades(1, trades), vectorized_engine.import_trades(1, trades))
+
+
+@pytest.mark.parametrize('nb_cycles', [100, 3000])
+def test_import_trades_long_open_position_same_as_wallet(nb_cycles):
+    trades = partial_sell_trades(nb_cycles)
+    assert_close(Wallet.import_trades(1, trades), vectorized_engine.import_trades(1, trades))
+
+
+def test_import_trades_tolerance():
+    trades = [
+        Trade(None, 'BTCEUR', TradeType.BUY, Decimal('0.1'), Decimal('10'), Decimal('1'), '2021-01-01 00:00:01'),
+        Trade(None, 'BTCEUR', TradeType.BUY, Decimal('0.2'), Decimal('10'), Decimal('2'), '2021-01-01 00:00:02'),
+        Trade(None, 'BTCEUR', TradeType.SELL, Decimal('0.3'), Decimal('20'), Decimal('6'), '2021-01-01 00:00:03'),
+    ]
+    # 0.1 + 0.2 - 0.3 is not 0 in float
+    assets_wallet, pnl, pnl_total = vectorized_engine.import_trades(1, trades)
+    assert 'BTC' not in assets_wallet.keys()
+    assert pnl[0].value == Decimal('3')
+    assets_wallet, pnl, pnl_total = vectorized_engine.import_trades(1, trades, tolerance=1e-20)
+    assert 'BTC' in assets_wallet.keys()
@@ -7,9 +7,10 @@ import pytest
 from moon.db.db import ConnectionDB
 from moon.exceptions.exceptions import EntityNotFoundError
 from moon.model.assets_wallet import AssetsWallet, AssetWalletData
+from moon.model.checkpoint import Checkpoint
 from moon.model.pnl import Pnl
-from moon.model.pnl_total import PnlTotal
-from moon.model.trade import Trade, TradeType, TradeOrigin
+from moon.model.pnl_total import PnlTotal, PnlTotalBook
+from moon.model.trade import Trade, TradeBatch, TradeType, TradeOrigin
 from moon.model.wallet import Wallet
 
 import os
@@ -146,26 +147,147 @@ def test_import_trades_from_csv_file_no_db():
     assets_wallet, pnl, pnl_total = Wallet.import_trades(1, csv_trades)
     control_import_trades(assets_wallet, pnl, pnl_total)
 
-def test_import_trades_from_csv_file_with_db():
+
+def test_import_trades_batch():
+    filename = os.path.join(os.getcwd(), 'tests/data/trades1.csv')
+    batch = TradeBatch()
+    for trades in TradeBatch.iter_from_csv_file(filename, 3):
+        batch.extend(trades)
+    with patch.object(TradeBatch, '__iter__') as mock_iter:
+        assets_wallet, pnl, pnl_total = Wallet.import_trades(1, batch)
+        # no trade created
+        mock_iter.assert_not_called()
+    control_import_trades(assets_wallet, pnl, pnl_total)
+
+def test_import_trades_from_csv_file_with_db(setup_db):
     wallet = Wallet(1, 'wallet1')
     filename = os.path.join(os.getcwd(), 'tests/data/trades1.csv')
-    wallet.import_trades_from_csv_file(filename)
+    rows_written = wallet.import_trades_from_csv_file(filename)
     pnl = wallet.load_pnl()
     pnl_total = wallet.load_pnl_total()
     control_import_trades(wallet.assets_wallet, pnl, pnl_total)
+    assert rows_written == {'trade': 10, 'pnl': 4, 'asset_wallet': 3, 'pnl_total': 2}
 
-@patch.object(AssetsWallet, 'load')
-def test_find_empty(mock_load: Mock, setup_db):
+
+def test_import_trades_from_csv_file_atomic(setup_db):
+    wallet = Wallet(1, 'wallet1')
+    filename = os.path.join(os.getcwd(), 'tests/data/trades1.csv')
+    with patch.object(PnlTotal, 'save_all', side_effect=ValueError()):
+        with pytest.raises(ValueError):
+            wallet.import_trades_from_csv_file(filename)
+    assert Trade.find(1) == []
+    assert wallet.load_pnl() == []
+    assert AssetsWallet.load(1) is None
+
+
+def test_import_trades_from_csv_file_by_chunks(setup_db):
+    wallet = Wallet(1, 'wallet1')
+    filename = os.path.join(os.getcwd(), 'tests/data/trades1.csv')
+    wallet.import_trades_from_csv_file(filename, chunk_size=3)
+    pnl = wallet.load_pnl()
+    pnl_total = wallet.load_pnl_total()
+    control_import_trades(wallet.assets_wallet, pnl, pnl_total)
+    assert len(Trade.find(1)) == 10
+
+
+@pytest.mark.parametrize('chunk_size', [3, 10000])
+def test_import_trades_from_csv_file_reversed(setup_db, tmp_path, chunk_size):
+    # the Binance exports are the most recent trades first
+    with open(os.path.join(os.getcwd(), 'tests/data/trades1.csv'), 'r') as f:
+        lines = f.read().splitlines()
+    filename = tmp_path / 'trades1_reversed.csv'
+    filename.write_text('\n'.join(reversed(lines)))
+    wallet = Wallet(1, 'wallet1')
+    wallet.import_trades_from_csv_file(str(filename), chunk_size=chunk_size)
+    pnl = wallet.load_pnl()
+    pnl_total = wallet.load_pnl_total()
+    control_import_trades(wallet.assets_wallet, pnl, pnl_total)
+
+
+def test_import_trades_from_csv_files(setup_db, tmp_path):
+    with open(os.path.join(os.getcwd(), 'tests/data/trades1.csv'), 'r') as f:
+        lines = f.read().splitlines()
+    (tmp_path / 'trades-1.csv').write_text('\n'.join(reversed(lines[:7])))
+    (tmp_path / 'trades-2.csv').write_text('\n'.join(reversed(lines[3:])))
+    wallet = Wallet(1, 'wallet1')
+    rows_written = wallet.import_trades_from_csv_files(str(tmp_path), chunk_size=3, max_workers=2)
+    control_import_trades(wallet.assets_wallet, wallet.load_pnl(), wallet.load_pnl_total())
+    assert rows_written == {'trade': 10, 'pnl': 4, 'asset_wallet': 3, 'pnl_total': 2}
+
+
+def test_import_trades_chunks_same_as_all_trades():
+    filename = os.path.join(os.getcwd(), 'tests/data/trades1.csv')
+    assets_wallet = AssetsWallet(1)
+    pnl = []
+    pnl_total = PnlTotalBook()
+    for trades in Trade.iter_trades_from_csv_file(filename, 4):
+        Wallet._apply_trades(assets_wallet, pnl, pnl_total, trades)
+    expected_assets_wallet, expected_pnl, expected_pnl_total = Wallet.import_trades(
+        1, Trade.get_trades_from_csv_file(filename))
+    assert Wallet._get_final_assets_wallet(assets_wallet) == expected_assets_wallet
+    assert pnl == expected_pnl
+    assert sorted(pnl_total, key=lambda x: x.asset) == expected_pnl_total
+
+def test_import_trades_from_checkpoint(setup_db):
+    trades1 = Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests/data/trades1.csv'))
+    trades2 = Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests/data/trades2.csv'))
+    Trade.save_all(1, trades1)
+    assets_wallet, pnl, pnl_total = Wallet.import_trades_from_checkpoint(1)
+    control_import_trades(assets_wallet, pnl, pnl_total)
+    assert Checkpoint.load(1).last_trade_id == 10
+
+    # only the new trades are applied on the checkpoint
+    Trade.save_all(1, trades2)
+    with patch.object(Wallet, '_apply_trades', wraps=Wallet._apply_trades) as mock_apply:
+        assets_wallet, pnl, pnl_total = Wallet.import_trades_from_checkpoint(1)
+        assert len(mock_apply.call_args.args[3]) == len(trades2)
+    expected_assets_wallet, expected_pnl, expected_pnl_total = Wallet.import_trades(1, trades1 + trades2)
+    assert assets_wallet == expected_assets_wallet
+    assert [(p.date, p.asset, p.value, p.currency) for p in pnl] == \
+           [(p.date, p.asset, p.value, p.currency) for p in expected_pnl if p.date > trades1[-1].date]
+    assert pnl_total == expected_pnl_total
+    assert Checkpoint.load(1).last_trade_id == len(trades1) + len(trades2)
+
+
+def test_import_trades_from_checkpoint_invalidated(setup_db):
+    trades1 = Trade.get_trades_from_csv_file(os.path.join(os.getcwd(), 'tests/data/trades1.csv'))
+    Trade.save_all(1, trades1[1:])
+    Wallet.import_trades_from_checkpoint(1)
+    # an older trade invalidates the checkpoint : all the trades are replayed
+    Trade.save_all(1, trades1[:1])
+    assert Checkpoint.load(1) is None
+    assets_wallet, pnl, pnl_total = Wallet.import_trades_from_checkpoint(1)
+    control_import_trades(assets_wallet, pnl, pnl_total)
+
+
+@patch.object(AssetsWallet, 'load_all')
+def test_find_empty(mock_load_all: Mock, setup_db):
     wallets = Wallet.find()
     assert len(wallets) == 0
-    mock_load.assert_not_called()
+    mock_load_all.assert_not_called()
 
 
 @patch.object(AssetsWallet, 'load')
 def test_find(mock_load: Mock, fill_db):
-    wallets = Wallet.find()
+    with patch.object(AssetsWallet, 'load_all', wraps=AssetsWallet.load_all) as mock_load_all:
+        wallets = Wallet.find()
+        mock_load_all.assert_called_once()
+    mock_load.assert_not_called()
+    assert [w.id for w in wallets] == [1, 2, 3, 4]
+    assert wallets[0].assets_wallet == AssetsWallet(1, {
+        'BTC': AssetWalletData(1, Decimal('12.0'), Decimal('2.0'), 'EUR'),
+        'ADA': AssetWalletData(2, Decimal('5.0'), Decimal('2.5'), 'EUR')})
+    assert wallets[1].assets_wallet.get_assets() == ['BNB', 'DOT']
+    assert wallets[2].assets_wallet is None
+    assert wallets[3].assets_wallet is None
+
+
+@patch.object(AssetsWallet, 'load_all')
+def test_find_without_assets(mock_load_all: Mock, fill_db):
+    wallets = Wallet.find(load_assets=False)
     assert len(wallets) == 4
-    assert mock_load.call_count == 4
+    assert all(w.assets_wallet is None for w in wallets)
+    mock_load_all.assert_not_called()
 
 
 @patch.object(AssetsWallet, 'load')
@@ -174,13 +296,23 @@ def test_read(mock_load: Mock, fill_db):
     assert wallet.id == 1
     assert wallet.name == 'wallet1'
     assert wallet.description == 'desc1'
-    mock_load.assert_called()
+    assert wallet.assets_wallet.get_assets() == ['BTC', 'ADA']
+    assert wallet.assets_wallet['ADA'] == AssetWalletData(2, Decimal('5.0'), Decimal('2.5'), 'EUR')
 
     wallet = Wallet.read(4)
     assert wallet.id == 4
     assert wallet.name == 'wallet4'
     assert wallet.description == 'desc4'
-    mock_load.assert_called()
+    assert wallet.assets_wallet is None
+    mock_load.assert_not_called()
+
+
+def test_read_without_assets(fill_db):
+    wallet = Wallet.read(1, load_assets=False)
+    assert wallet.name == 'wallet1'
+    assert wallet.assets_wallet is None
+    with pytest.raises(EntityNotFoundError):
+        Wallet.read(99, load_assets=False)
 
 
 @patch.object(AssetsWallet, 'save')
@@ -288,21 +420,6 @@ def test_load_pnl_total(mock_find: Mock):
     mock_find.assert_called_with(w.id, 'BTC')
 
 
-def test_get_existant_asset():
-    pnl_total_list = [
-        PnlTotal(1, 'BTC', Decimal('12.0'), 'EUR'),
-        PnlTotal(2, 'BTC', Decimal('10.0'), 'USD'),
-        PnlTotal(3, 'BNB', Decimal('-5.0'), 'EUR'),
-        PnlTotal(4, 'CHZ', Decimal('11.0'), 'EUR'),
-        PnlTotal(5, 'ADA', Decimal('-7.0'), 'EUR'),
-    ]
-
-    assert Wallet._get_existant_asset(pnl_total_list, 'BTC', 'EUR') == pnl_total_list[0]
-    assert Wallet._get_existant_asset(pnl_total_list, 'BTC', 'USD') == pnl_total_list[1]
-    assert Wallet._get_existant_asset(pnl_total_list, 'ADA', 'EUR') == pnl_total_list[4]
-    assert Wallet._get_existant_asset(pnl_total_list, 'XXX', 'USD') is None
-
-
 @patch.object(Wallet, 'load_pnl_total')
 def test_get_pnl_total_to_save_positive(mock_load_pnl_total: Mock):
     mock_load_pnl_total.return_value = [
@@ -367,3 +484,21 @@ def test_get_pnl_total_to_save_multi(mock_load_pnl_total: Mock):
     assert res[2].asset == 'ADA'
     assert res[2].currency == 'EUR'
     assert res[2].value == Decimal('-12.0')
+
+
+def test_merge_pnl_total_duplicate_rows(fill_db):
+    ConnectionDB.get_connection().execute(
+        "insert into pnl_total(id, id_wallet, asset, value, currency) values(5, 1, 'BTC', 2.0, 'EUR')")
+    w = Wallet(1, 'wallet1')
+    res = w._merge_pnl_total([PnlTotal(None, 'BTC', Decimal('3.0'), 'EUR')])
+    PnlTotal.save_all(w.id, res)
+    pnl_total = w.load_pnl_total('BTC')
+    assert [(pnl_total.id, pnl_total.value) for pnl_total in pnl_total] == [(1, Decimal('15.0'))]
+
+
+def test_merge_pnl_total_duplicate_rows_not_modified(fill_db):
+    ConnectionDB.get_connection().execute(
+        "insert into pnl_total(id, id_wallet, asset, value, currency) values(5, 1, 'BTC', 2.0, 'EUR')")
+    w = Wallet(1, 'wallet1')
+    res = w._merge_pnl_total([PnlTotal(None, 'ETH', Decimal('3.0'), 'EUR'), PnlTotal(None, 'ADA', Decimal('0'), 'EUR')])
+    assert res == [PnlTotal(1, 'BTC', Decimal('12.0'), 'EUR'), PnlTotal(None, 'ETH', Decimal('3.0'), 'EUR')]